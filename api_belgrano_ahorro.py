@@ -5,19 +5,34 @@ API REST para Belgrano Ahorro
 Expone endpoints para que Belgrano Tickets pueda consumir datos
 """
 
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, render_template, request
 from datetime import datetime
 import sqlite3
 import json
 import logging
 from functools import wraps
 
+from catalogo import catalogo
+from consultas import (TAMANO_PAGINA, TAMANO_PAGINA_MAXIMO, consultar_catalogo,
+                       decodificar_cursor, parsear_filtros)
+from ofertas import ofertas_vigentes
+from inventario import inventario
+import conexiones
+import db as database
+from reportes import reportes
+
 # Configurar logging
 logger = logging.getLogger(__name__)
 
 # Crear blueprint para la API
 api_bp = Blueprint('api', __name__, url_prefix='/api/v1')
 
+# Tarjetas de producto disponibles para /catalogo?formato=html
+PLANTILLAS_TARJETA = ('carrusel', 'negocio', 'categoria')
+
+# Estados de pedido que liberan la reserva de stock (ver inventario.py)
+ESTADOS_CANCELACION = ('cancelado', 'cancelada')
+
 # ==========================================
 # UTILIDADES Y DECORADORES
 # ==========================================
@@ -33,11 +48,56 @@ def require_api_key(f):
     return decorated_function
 
 def get_db_connection():
-    """Obtener conexión a la base de datos"""
-    conn = sqlite3.connect('belgrano_ahorro.db')
+    """Obtener conexión a la base de datos (del pool de conexiones.py; close() la devuelve)"""
+    conn = conexiones.conectar()
     conn.row_factory = sqlite3.Row
     return conn
 
+def respuesta_catalogo(clave, construir, variante=None):
+    """
+    Respuesta JSON de datos del catálogo con ETag e If-None-Match
+
+    PARÁMETROS:
+    - clave: identifica la consulta (endpoint + parámetros)
+    - construir: función que recibe el snapshot del catálogo y arma el payload;
+      el payload no debe incluir nada que cambie entre requests (ej: la hora),
+      porque se sirve el mismo cuerpo con el mismo etag fuerte
+    - variante: otro dato del que depende el payload (ej: la versión del stock)
+
+    El cuerpo se serializa una sola vez por versión del catálogo y de la
+    variante; si el cliente envía un If-None-Match que coincide se responde
+    304 sin cuerpo.
+    """
+    indice = catalogo.obtener()
+    cuerpo, etag = indice.respuesta(clave, construir, variante)
+
+    response = Response(cuerpo, status=200, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['X-Catalogo-Version'] = str(indice.version)
+    # Los clientes pueden guardar la respuesta pero deben revalidarla siempre
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+def _producto_api(indice, producto, stock):
+    """Formato público de un producto del catálogo (stock: unidades disponibles por ID, ver inventario.py)"""
+    negocio = indice.negocios.get(producto.get('negocio'), {})
+    return {
+        'id': producto.get('id'),
+        'nombre': producto.get('nombre'),
+        'descripcion': producto.get('descripcion', ''),
+        'precio': producto.get('precio'),
+        'categoria': producto.get('categoria'),
+        'stock': stock.get(producto.get('id'), producto.get('stock')),
+        'imagen': producto.get('imagen'),
+        'comerciante': {
+            'id': producto.get('negocio'),
+            'nombre': negocio.get('nombre'),
+            'direccion': negocio.get('direccion')
+        },
+        'activo': bool(producto.get('activo', True)),
+        'fecha_creacion': producto.get('fecha_creacion')
+    }
+
 # ==========================================
 # ENDPOINTS DE PRODUCTOS
 # ==========================================
@@ -45,50 +105,20 @@ def get_db_connection():
 @api_bp.route('/productos', methods=['GET'])
 @require_api_key
 def get_productos():
-    """Obtener todos los productos disponibles"""
+    """Obtener todos los productos disponibles (responde 304 si el catálogo y el stock no cambiaron)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Obtener productos con información de comerciantes
-        query = """
-        SELECT p.*, c.nombre as comerciante_nombre, c.direccion as comerciante_direccion
-        FROM productos p
-        LEFT JOIN comerciantes c ON p.comerciante_id = c.id
-        WHERE p.activo = 1
-        ORDER BY p.nombre
-        """
-        
-        cursor.execute(query)
-        productos = cursor.fetchall()
-        
-        productos_list = []
-        for producto in productos:
-            productos_list.append({
-                'id': producto['id'],
-                'nombre': producto['nombre'],
-                'descripcion': producto['descripcion'],
-                'precio': producto['precio'],
-                'categoria': producto['categoria'],
-                'stock': producto['stock'],
-                'imagen': producto['imagen'],
-                'comerciante': {
-                    'id': producto['comerciante_id'],
-                    'nombre': producto['comerciante_nombre'],
-                    'direccion': producto['comerciante_direccion']
-                },
-                'activo': bool(producto['activo']),
-                'fecha_creacion': producto['fecha_creacion']
-            })
-        
-        conn.close()
-        
-        return jsonify({
-            'status': 'success',
-            'total': len(productos_list),
-            'productos': productos_list,
-            'timestamp': datetime.now().isoformat()
-        }), 200
+        version_stock, stock = inventario.foto_stock()
+
+        def construir(indice):
+            productos_list = [_producto_api(indice, producto, stock)
+                              for producto in sorted(indice.activos, key=lambda p: p.get('nombre', ''))]
+            return {
+                'status': 'success',
+                'total': len(productos_list),
+                'productos': productos_list
+            }
+
+        return respuesta_catalogo(('productos',), construir, version_stock)
         
     except Exception as e:
         logger.error(f"Error obteniendo productos: {e}")
@@ -103,47 +133,18 @@ def get_productos():
 def get_producto(producto_id):
     """Obtener un producto específico"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT p.*, c.nombre as comerciante_nombre, c.direccion as comerciante_direccion
-        FROM productos p
-        LEFT JOIN comerciantes c ON p.comerciante_id = c.id
-        WHERE p.id = ? AND p.activo = 1
-        """
+        indice = catalogo.obtener()
+        producto = indice.producto(producto_id)
         
-        cursor.execute(query, (producto_id,))
-        producto = cursor.fetchone()
-        
-        if not producto:
+        if not producto or not producto.get('activo', True):
             return jsonify({
                 'status': 'error',
                 'error': 'Producto no encontrado'
             }), 404
         
-        producto_data = {
-            'id': producto['id'],
-            'nombre': producto['nombre'],
-            'descripcion': producto['descripcion'],
-            'precio': producto['precio'],
-            'categoria': producto['categoria'],
-            'stock': producto['stock'],
-            'imagen': producto['imagen'],
-            'comerciante': {
-                'id': producto['comerciante_id'],
-                'nombre': producto['comerciante_nombre'],
-                'direccion': producto['comerciante_direccion']
-            },
-            'activo': bool(producto['activo']),
-            'fecha_creacion': producto['fecha_creacion']
-        }
-        
-        conn.close()
-        
         return jsonify({
             'status': 'success',
-            'producto': producto_data,
+            'producto': _producto_api(indice, producto, inventario.stock_por_producto()),
             'timestamp': datetime.now().isoformat()
         }), 200
         
@@ -158,44 +159,150 @@ def get_producto(producto_id):
 @api_bp.route('/productos/categoria/<categoria>', methods=['GET'])
 @require_api_key
 def get_productos_por_categoria(categoria):
-    """Obtener productos por categoría"""
+    """Obtener productos por categoría (responde 304 si el catálogo y el stock no cambiaron)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        query = """
-        SELECT p.*, c.nombre as comerciante_nombre
-        FROM productos p
-        LEFT JOIN comerciantes c ON p.comerciante_id = c.id
-        WHERE p.categoria = ? AND p.activo = 1
-        ORDER BY p.nombre
-        """
-        
-        cursor.execute(query, (categoria,))
-        productos = cursor.fetchall()
-        
-        productos_list = []
-        for producto in productos:
-            productos_list.append({
-                'id': producto['id'],
-                'nombre': producto['nombre'],
-                'precio': producto['precio'],
-                'stock': producto['stock'],
-                'comerciante': producto['comerciante_nombre']
-            })
-        
-        conn.close()
+        version_stock, stock = inventario.foto_stock()
+
+        def construir(indice):
+            productos_list = []
+            for producto in sorted(indice.por_categoria.get(categoria, []), key=lambda p: p.get('nombre', '')):
+                negocio = indice.negocios.get(producto.get('negocio'), {})
+                productos_list.append({
+                    'id': producto.get('id'),
+                    'nombre': producto.get('nombre'),
+                    'precio': producto.get('precio'),
+                    'stock': stock.get(producto.get('id'), producto.get('stock')),
+                    'comerciante': negocio.get('nombre')
+                })
+            return {
+                'status': 'success',
+                'categoria': categoria,
+                'total': len(productos_list),
+                'productos': productos_list
+            }
+
+        return respuesta_catalogo(('productos_categoria', categoria), construir, version_stock)
         
+    except Exception as e:
+        logger.error(f"Error obteniendo productos por categoría {categoria}: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': 'Error interno del servidor',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+# ==========================================
+# ENDPOINTS DE BÚSQUEDA
+# ==========================================
+
+@api_bp.route('/search', methods=['GET'])
+def search_productos():
+    """
+    Buscar productos en el catálogo (público: solo expone datos del catálogo)
+
+    PARÁMETROS (query string):
+    - q: texto a buscar (sin acentos, por prefijo y tolerante a errores)
+    - limit: cantidad máxima de resultados (1-100, por defecto 20)
+    - offset: desplazamiento para paginar (por defecto 0)
+    """
+    try:
+        consulta = request.args.get('q', '').strip()
+        try:
+            limite = min(max(int(request.args.get('limit', 20)), 1), 100)
+            desplazamiento = max(int(request.args.get('offset', 0)), 0)
+        except ValueError:
+            return jsonify({
+                'status': 'error',
+                'error': 'limit y offset deben ser números enteros'
+            }), 400
+
+        total, resultados = catalogo.obtener().busqueda.buscar(consulta, limite, desplazamiento)
+        stock = inventario.disponibles([producto for producto, _ in resultados])
+
         return jsonify({
             'status': 'success',
-            'categoria': categoria,
-            'total': len(productos_list),
-            'productos': productos_list,
+            'query': consulta,
+            'total': total,
+            'limit': limite,
+            'offset': desplazamiento,
+            'productos': [dict(producto, stock=stock[producto.get('id')], score=puntaje)
+                          for producto, puntaje in resultados],
             'timestamp': datetime.now().isoformat()
         }), 200
-        
+
     except Exception as e:
-        logger.error(f"Error obteniendo productos por categoría {categoria}: {e}")
+        logger.error(f"Error buscando productos: {e}")
+        return jsonify({
+            'status': 'error',
+            'error': 'Error interno del servidor',
+            'timestamp': datetime.now().isoformat()
+        }), 500
+
+@api_bp.route('/catalogo', methods=['GET'])
+def consultar_catalogo_api():
+    """
+    Consultar el catálogo con filtros, facetas y paginación por cursor
+    (público: solo expone datos del catálogo)
+
+    PARÁMETROS (query string):
+    - negocio, categoria, sucursal, precio_min, precio_max,
+      destacado, en_stock, con_oferta: filtros (ver consultas.py)
+    - cursor: valor 'siguiente' de la respuesta anterior
+    - limit: tamaño de página (1-100, por defecto 24)
+    - formato: 'json' (por defecto) o 'html' para recibir las tarjetas ya renderizadas
+    - plantilla: con formato=html, 'carrusel', 'negocio' o 'categoria'
+    """
+    try:
+        try:
+            filtros = parsear_filtros(request.args)
+            limite = min(max(int(request.args.get('limit', TAMANO_PAGINA)), 1), TAMANO_PAGINA_MAXIMO)
+            cursor = request.args.get('cursor') or None
+            if cursor:
+                decodificar_cursor(cursor)
+        except ValueError as e:
+            return jsonify({
+                'status': 'error',
+                'error': f'Parámetros inválidos: {e}'
+            }), 400
+
+        formato = request.args.get('formato', 'json')
+        plantilla = request.args.get('plantilla', 'carrusel')
+        if formato == 'html' and plantilla not in PLANTILLAS_TARJETA:
+            return jsonify({
+                'status': 'error',
+                'error': f'Plantilla desconocida: {plantilla}'
+            }), 400
+
+        indice = catalogo.obtener()
+        # Las facetas solo se calculan para la primera página
+        pagina = consultar_catalogo(indice, filtros, cursor, limite,
+                                    ofertas_por_producto=ofertas_vigentes.obtener().por_producto,
+                                    stock_por_producto=inventario.stock_por_producto(),
+                                    facetas=cursor is None)
+
+        respuesta = {
+            'status': 'success',
+            'total': pagina['total'],
+            'limit': limite,
+            'siguiente': pagina['siguiente'],
+            'timestamp': datetime.now().isoformat()
+        }
+        if 'facetas' in pagina:
+            respuesta['facetas'] = pagina['facetas']
+
+        if formato == 'html':
+            respuesta['html'] = render_template('partials/tarjetas_catalogo.html',
+                                                productos=pagina['productos'],
+                                                plantilla=plantilla,
+                                                categorias=indice.categorias,
+                                                negocios=indice.negocios)
+        else:
+            respuesta['productos'] = inventario.con_stock(pagina['productos'])
+
+        return jsonify(respuesta), 200
+
+    except Exception as e:
+        logger.error(f"Error consultando catálogo: {e}")
         return jsonify({
             'status': 'error',
             'error': 'Error interno del servidor',
@@ -206,10 +313,20 @@ def get_productos_por_categoria(categoria):
 # ENDPOINTS DE PEDIDOS
 # ==========================================
 
+def _item_api(item):
+    """Formato público de un item de pedido (ver db.obtener_items_pedidos)"""
+    return {
+        'producto_id': item['producto_id'],
+        'producto_nombre': item['nombre'],
+        'cantidad': item['cantidad'],
+        'precio_unitario': item['precio_unitario'],
+        'subtotal': item['subtotal']
+    }
+
 @api_bp.route('/pedidos', methods=['GET'])
 @require_api_key
 def get_pedidos():
-    """Obtener todos los pedidos"""
+    """Obtener todos los pedidos (items de los 100 pedidos en una consulta)"""
     try:
         conn = get_db_connection()
         cursor = conn.cursor()
@@ -218,34 +335,16 @@ def get_pedidos():
         SELECT p.*, u.nombre as cliente_nombre, u.email as cliente_email
         FROM pedidos p
         LEFT JOIN usuarios u ON p.usuario_id = u.id
-        ORDER BY p.fecha_pedido DESC
+        ORDER BY p.fecha DESC, p.id DESC
         LIMIT 100
         """
         
         cursor.execute(query)
         pedidos = cursor.fetchall()
+        items = database.obtener_items_pedidos([pedido['id'] for pedido in pedidos], conn)
         
         pedidos_list = []
         for pedido in pedidos:
-            # Obtener items del pedido
-            cursor.execute("""
-                SELECT pi.*, p.nombre as producto_nombre
-                FROM pedido_items pi
-                LEFT JOIN productos p ON pi.producto_id = p.id
-                WHERE pi.pedido_id = ?
-            """, (pedido['id'],))
-            
-            items = cursor.fetchall()
-            items_list = []
-            for item in items:
-                items_list.append({
-                    'producto_id': item['producto_id'],
-                    'producto_nombre': item['producto_nombre'],
-                    'cantidad': item['cantidad'],
-                    'precio_unitario': item['precio_unitario'],
-                    'subtotal': item['subtotal']
-                })
-            
             pedidos_list.append({
                 'id': pedido['id'],
                 'numero_pedido': pedido['numero_pedido'],
@@ -257,10 +356,10 @@ def get_pedidos():
                 'total': pedido['total'],
                 'estado': pedido['estado'],
                 'metodo_pago': pedido['metodo_pago'],
-                'direccion': pedido['direccion'],
+                'direccion': pedido['direccion_entrega'],
                 'notas': pedido['notas'],
-                'fecha_pedido': pedido['fecha_pedido'],
-                'items': items_list
+                'fecha_pedido': pedido['fecha'],
+                'items': [_item_api(item) for item in items.get(pedido['id'], [])]
             })
         
         conn.close()
@@ -300,29 +399,14 @@ def get_pedido(numero_pedido):
         pedido = cursor.fetchone()
         
         if not pedido:
+            conn.close()
             return jsonify({
                 'status': 'error',
                 'error': 'Pedido no encontrado'
             }), 404
         
         # Obtener items del pedido
-        cursor.execute("""
-            SELECT pi.*, p.nombre as producto_nombre
-            FROM pedido_items pi
-            LEFT JOIN productos p ON pi.producto_id = p.id
-            WHERE pi.pedido_id = ?
-        """, (pedido['id'],))
-        
-        items = cursor.fetchall()
-        items_list = []
-        for item in items:
-            items_list.append({
-                'producto_id': item['producto_id'],
-                'producto_nombre': item['producto_nombre'],
-                'cantidad': item['cantidad'],
-                'precio_unitario': item['precio_unitario'],
-                'subtotal': item['subtotal']
-            })
+        items = database.obtener_items_pedidos([pedido['id']], conn)
         
         pedido_data = {
             'id': pedido['id'],
@@ -336,10 +420,10 @@ def get_pedido(numero_pedido):
             'total': pedido['total'],
             'estado': pedido['estado'],
             'metodo_pago': pedido['metodo_pago'],
-            'direccion': pedido['direccion'],
+            'direccion': pedido['direccion_entrega'],
             'notas': pedido['notas'],
-            'fecha_pedido': pedido['fecha_pedido'],
-            'items': items_list
+            'fecha_pedido': pedido['fecha'],
+            'items': [_item_api(item) for item in items.get(pedido['id'], [])]
         }
         
         conn.close()
@@ -392,6 +476,10 @@ def actualizar_estado_pedido(numero_pedido):
         conn.commit()
         conn.close()
         
+        # Un pedido cancelado devuelve su stock reservado
+        if nuevo_estado.lower() in ESTADOS_CANCELACION:
+            inventario.liberar(numero_pedido, 'cancelacion')
+        
         return jsonify({
             'status': 'success',
             'message': f'Estado actualizado a {nuevo_estado}',
@@ -468,36 +556,22 @@ def get_usuario(usuario_id):
 @api_bp.route('/stats', methods=['GET'])
 @require_api_key
 def get_stats():
-    """Obtener estadísticas generales"""
+    """Obtener estadísticas generales (conexión de solo lectura, ver reportes.py)"""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Contar usuarios
-        cursor.execute("SELECT COUNT(*) as total FROM usuarios WHERE activo = 1")
-        total_usuarios = cursor.fetchone()['total']
-        
-        # Contar productos
-        cursor.execute("SELECT COUNT(*) as total FROM productos WHERE activo = 1")
-        total_productos = cursor.fetchone()['total']
-        
-        # Contar pedidos
-        cursor.execute("SELECT COUNT(*) as total FROM pedidos")
-        total_pedidos = cursor.fetchone()['total']
-        
-        # Pedidos por estado
-        cursor.execute("""
-            SELECT estado, COUNT(*) as total
-            FROM pedidos
-            GROUP BY estado
-        """)
-        pedidos_por_estado = {row['estado']: row['total'] for row in cursor.fetchall()}
-        
-        # Total de ventas
-        cursor.execute("SELECT SUM(total) as total_ventas FROM pedidos WHERE estado = 'completado'")
-        total_ventas = cursor.fetchone()['total_ventas'] or 0
-        
-        conn.close()
+        with reportes.lectura() as conn:
+            total_usuarios = conn.execute("SELECT COUNT(*) FROM usuarios").fetchone()[0]
+            total_productos = conn.execute("SELECT COUNT(*) FROM productos WHERE activo = 1").fetchone()[0]
+            
+            # Pedidos y ventas por estado en una sola pasada
+            por_estado = conn.execute("""
+                SELECT estado, COUNT(*), SUM(total)
+                FROM pedidos
+                GROUP BY estado
+            """).fetchall()
+        
+        pedidos_por_estado = {estado: cantidad for estado, cantidad, _ventas in por_estado}
+        total_pedidos = sum(pedidos_por_estado.values())
+        total_ventas = next((ventas for estado, _cantidad, ventas in por_estado if estado == 'completado'), None) or 0
         
         return jsonify({
             'status': 'success',
@@ -47,11 +47,30 @@ except Exception as e:
     print(f"❌ Error importando db: {e}")
     raise  # Detén la app si el import falla
 
+# Esquema de la base al día (migraciones/, ver esquema.py) antes de que
+# cualquier módulo la use; con la base actualizada es una sola lectura de
+# PRAGMA user_version
+import esquema
+esquema.migrar()
+
+# Catálogo de productos indexado en memoria (productos.json)
+from catalogo import catalogo
+from ofertas import ofertas_vigentes
+from api_belgrano_ahorro import respuesta_catalogo
+from consultas import consultar_catalogo
+from carritos import carritos, clave_usuario, clave_anonima, nuevo_sesion_id
+from precios import cotizador, cotizar_items, resumen_cotizacion
+from despacho_tickets import despachador_tickets, construir_ticket, encolar_ticket
+from inventario import inventario
+from idempotencia import claves_idempotencia, nueva_clave
+from reportes import reportes
+import conexiones
+
 # Función para obtener conexión a la base de datos
 def get_db_connection():
-    """Obtener conexión a la base de datos"""
+    """Obtener conexión a la base de datos (del pool de conexiones.py; close() la devuelve)"""
     import sqlite3
-    conn = sqlite3.connect('belgrano_ahorro.db')
+    conn = conexiones.conectar()
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -78,6 +97,10 @@ app.config['ENV'] = os.environ.get('FLASK_ENV', 'development')
 # Registrar manejadores de errores
 register_error_handlers(app)
 
+# Cache de fragmentos del catálogo para los templates
+from fragmentos import register_fragment_cache
+register_fragment_cache(app)
+
 # ==========================================
 # CONFIGURACIÓN DE COMUNICACIÓN API
 # ==========================================
@@ -94,37 +117,57 @@ print(f"🔗 Configuración API:")
 print(f"   TICKETERA_URL: {TICKETERA_URL}")
 print(f"   API_KEY: {BELGRANO_AHORRO_API_KEY[:10]}...")
 
+def iniciar_servicios():
+    """
+    Arrancar los hilos de segundo plano del servidor
+
+    - Despachador de tickets (outbox, ver despacho_tickets.py): solo arranca
+      con TICKETERA_URL definida en el entorno; DESPACHO_TICKETS=0 lo
+      desactiva (por ejemplo, si otro proceso despacha)
+    - Checkpoints del WAL y réplica de reportes (ver reportes.py):
+      MANTENIMIENTO_REPORTES=0 lo desactiva (por ejemplo, si otro proceso lo hace)
+
+    MANTENIMIENTO:
+    - Importar app.py no arranca ningún hilo (tests, scripts, benchmarks).
+      La llama el arranque con `python app.py`; un servidor WSGI debe
+      llamarla al iniciar cada worker
+    """
+    if os.environ.get('DESPACHO_TICKETS', '1') != '0':
+        despachador_tickets.iniciar()
+    if os.environ.get('MANTENIMIENTO_REPORTES', '1') != '0':
+        reportes.iniciar()
+
+# Operaciones máximas por request en /api/carrito/lote (pedidos mayoristas)
+MAX_OPERACIONES_CARRITO = 1000
+
 # =================================================================
 # FUNCIONES DE BÚSQUEDA Y FILTRADO DE PRODUCTOS
 # =================================================================
 
 def buscar_productos(productos, busqueda):
     """
-    Buscar productos por nombre, descripción o categoría
+    Buscar productos por nombre, categoría o negocio usando el índice del catálogo
     
     PARÁMETROS:
-    - productos: lista de productos a buscar
+    - productos: lista de productos a buscar (None para buscar en todo el catálogo)
     - busqueda: texto de búsqueda ingresado por el usuario
     
     RETORNA:
-    - Lista de productos que coinciden con la búsqueda
+    - Lista de productos que coinciden con la búsqueda, ordenados por relevancia
     
     MANTENIMIENTO:
-    - Para agregar más campos de búsqueda: agregar condiciones en el bucle
-    - Para cambiar la lógica de búsqueda: modificar las comparaciones
+    - Para agregar más campos de búsqueda o cambiar pesos: ver busqueda.py
+    - La búsqueda ignora acentos, acepta prefijos y tolera errores de tipeo
     """
     if not busqueda:
-        return productos
+        return productos if productos is not None else cargar_productos()
     
-    busqueda = busqueda.lower()
-    resultados = []
+    _, resultados = catalogo.obtener().busqueda.buscar(busqueda)
+    if productos is None:
+        return [producto for producto, _ in resultados]
     
-    for producto in productos:
-        nombre = producto.get('nombre', '').lower()
-        if busqueda in nombre:
-            resultados.append(producto)
-    
-    return resultados
+    ids_permitidos = {str(p.get('id')) for p in productos}
+    return [producto for producto, _ in resultados if str(producto.get('id')) in ids_permitidos]
 
 # =================================================================
 # FUNCIONES DE CARGA DE DATOS DESDE JSON
@@ -132,44 +175,29 @@ def buscar_productos(productos, busqueda):
 
 def cargar_productos():
     """
-    Cargar productos desde el archivo productos.json
+    Cargar productos desde el catálogo en memoria (productos.json)
     
     RETORNA:
-    - Lista de productos activos
+    - Lista de productos (compartida, no modificar)
     
     MANTENIMIENTO:
     - Para agregar productos: editar productos.json (ver GUIA_MANTENIMIENTO.md)
-    - Para cambiar estructura: modificar el acceso a data.get('productos', [])
-    - Para agregar validaciones: agregar condiciones antes del return
+    - El catálogo se recarga solo cuando cambia el archivo (ver catalogo.py)
     """
-    try:
-        with open('productos.json', 'r', encoding='utf-8') as f:
-            data = json.load(f)
-            productos = data.get('productos', [])
-            logger.info(f"Productos cargados correctamente: {len(productos)} productos")
-            return productos
-    except Exception as e:
-        logger.error(f"Error al cargar productos: {e}")
-        return []
+    return catalogo.obtener().productos
 
 def cargar_datos_completos():
     """
-    Cargar todos los datos del JSON incluyendo negocios, categorías y ofertas
+    Obtener todos los datos del catálogo incluyendo negocios, categorías y ofertas
     
     RETORNA:
-    - Diccionario completo con todos los datos del sistema
+    - Diccionario completo con todos los datos del sistema (compartido, no modificar)
     
     MANTENIMIENTO:
     - Para agregar nuevas secciones: agregar en productos.json
     - Para cambiar estructura: modificar el acceso a los datos
     """
-    try:
-        with open('productos.json', 'r', encoding='utf-8') as file:
-            datos = json.load(file)
-        return datos
-    except Exception as e:
-        logger.error(f"Error al cargar datos completos: {e}")
-        return {}
+    return catalogo.obtener().datos
 
 def obtener_negocios():
     """
@@ -182,8 +210,7 @@ def obtener_negocios():
     - Para agregar negocios: editar sección "negocios" en productos.json
     - Para cambiar estado: modificar "activo": true/false en el negocio
     """
-    datos = cargar_datos_completos()
-    return datos.get('negocios', {})
+    return catalogo.obtener().negocios
 
 def obtener_categorias():
     """
@@ -196,8 +223,7 @@ def obtener_categorias():
     - Para agregar categorías: editar sección "categorias" en productos.json
     - Para cambiar iconos: modificar campo "icono" en la categoría
     """
-    datos = cargar_datos_completos()
-    return datos.get('categorias', {})
+    return catalogo.obtener().categorias
 
 def obtener_ofertas():
     """
@@ -210,8 +236,7 @@ def obtener_ofertas():
     - Para agregar ofertas: editar sección "ofertas" en productos.json
     - Para cambiar estado: modificar "activa": true/false en la oferta
     """
-    datos = cargar_datos_completos()
-    return datos.get('ofertas', {})
+    return catalogo.obtener().ofertas
 
 def obtener_sucursales():
     """
@@ -224,8 +249,7 @@ def obtener_sucursales():
     - Para agregar sucursales: editar sección "sucursales" en productos.json
     - Para cambiar estado: modificar "activo": true/false en la sucursal
     """
-    datos = cargar_datos_completos()
-    return datos.get('sucursales', {})
+    return catalogo.obtener().sucursales
 
 def obtener_sucursales_por_negocio(negocio_id):
     """
@@ -251,54 +275,34 @@ def obtener_productos_por_sucursal(negocio_id, sucursal_id):
     - sucursal_id: ID de la sucursal
     
     RETORNA:
-    - Lista de productos disponibles en la sucursal
+    - Lista de productos activos disponibles en la sucursal
     """
-    datos = cargar_datos_completos()
-    productos = datos.get('productos', [])
-    
-    productos_sucursal = []
-    for producto in productos:
-        if (producto.get('negocio') == negocio_id and 
-            producto.get('activo', True) and
-            'sucursales' in producto and
-            sucursal_id in producto['sucursales']):
-            productos_sucursal.append(producto)
-    
-    return productos_sucursal
+    return catalogo.obtener().por_sucursal.get((negocio_id, sucursal_id), [])
 
 def obtener_productos_por_negocio(negocio_id):
-    """Obtener productos de un negocio específico"""
-    datos = cargar_datos_completos()
-    productos = datos.get('productos', [])
-    return [p for p in productos if p.get('negocio') == negocio_id and p.get('activo', True)]
+    """Obtener productos activos de un negocio específico"""
+    return catalogo.obtener().por_negocio.get(negocio_id, [])
+
+def obtener_productos_por_categoria(categoria_id):
+    """Obtener productos activos de una categoría específica"""
+    return catalogo.obtener().por_categoria.get(categoria_id, [])
 
 def obtener_productos_destacados():
     """Obtener productos destacados de todos los negocios"""
-    datos = cargar_datos_completos()
-    productos = datos.get('productos', [])
-    return [p for p in productos if p.get('destacado', False) and p.get('activo', True)]
+    return catalogo.obtener().destacados
 
 def obtener_ofertas_activas():
-    """Obtener ofertas activas con información de productos"""
-    datos = cargar_datos_completos()
-    ofertas = datos.get('ofertas', {})
-    productos = datos.get('productos', [])
-    
-    ofertas_activas = {}
-    for negocio, ofertas_negocio in ofertas.items():
-        ofertas_activas[negocio] = []
-        for oferta in ofertas_negocio:
-            # Agregar información de productos a la oferta
-            productos_oferta = []
-            for producto_id in oferta.get('productos', []):
-                producto = next((p for p in productos if p['id'] == producto_id), None)
-                if producto:
-                    productos_oferta.append(producto)
-            
-            oferta['productos_info'] = productos_oferta
-            ofertas_activas[negocio].append(oferta)
+    """
+    Obtener ofertas vigentes con información de productos y precio con descuento
     
-    return ofertas_activas
+    RETORNA:
+    - Diccionario {negocio: [ofertas vigentes]} precalculado (ver ofertas.py)
+    
+    MANTENIMIENTO:
+    - Las fechas fecha_inicio / fecha_fin de productos.json se respetan
+      automáticamente: la vista se actualiza al empezar o terminar cada oferta
+    """
+    return ofertas_vigentes.obtener().por_negocio
 
 # ==========================================
 # BASE DE DATOS SIMPLE (USUARIOS Y PEDIDOS)
@@ -321,15 +325,9 @@ def obtener_ofertas_activas():
 # ==========================================
 # CARGA DE DATOS
 # ==========================================
-# Esta sección carga los productos desde el archivo JSON
-# Si hay algún error, crea una lista vacía para evitar que la app falle
-try:
-    with open("productos.json", "r", encoding="utf-8") as f:
-        productos = json.load(f)
-    logger.info(f"Productos cargados correctamente: {len(productos['productos'])} productos")
-except Exception as e:
-    logger.error(f"Error al cargar productos.json: {e}")
-    productos = {"productos": []}  # Lista vacía para evitar fallos
+# El catálogo (productos.json) se carga una vez y queda indexado en memoria.
+# Si hay algún error, el catálogo queda vacío para evitar que la app falle
+logger.info(f"Productos cargados correctamente: {len(catalogo.obtener().productos)} productos")
 
 # ==========================================
 # FUNCIONES AUXILIARES
@@ -337,24 +335,100 @@ except Exception as e:
 
 def obtener_producto_por_id(producto_id):
     """
-    Busca un producto por su ID en la lista de productos
+    Busca un producto por su ID en el índice del catálogo
+    """
+    return catalogo.obtener().producto(producto_id)
+
+def clave_carrito(crear=False):
+    """
+    Clave del carrito del request actual en el almacén de carritos
+
+    PARÁMETROS:
+    - crear: si el visitante no tiene carrito, asignarle un identificador nuevo
+
+    RETORNA:
+    - Clave del carrito, o None si es un visitante sin carrito y crear=False
+    """
+    if 'usuario_id' in session:
+        clave = clave_usuario(session['usuario_id'])
+    elif session.get('carrito_id'):
+        clave = clave_anonima(session['carrito_id'])
+    elif crear or session.get('carrito'):
+        session['carrito_id'] = nuevo_sesion_id()
+        clave = clave_anonima(session['carrito_id'])
+    else:
+        return None
+
+    # Carrito guardado en la cookie por versiones anteriores: pasarlo al almacén
+    carrito_sesion = session.pop('carrito', None)
+    if carrito_sesion:
+        for producto_id, cantidad in carrito_sesion.items():
+            carritos.agregar(clave, producto_id, cantidad)
+    return clave
+
+def cotizar_carrito():
+    """
+    Cotización del carrito actual con ofertas aplicadas (ver precios.py)
+
+    RETORNA:
+    - Diccionario con lineas (producto, cantidad, precio_unitario, subtotal...),
+      subtotal, ahorro y total; memoizado mientras no cambien el carrito,
+      el catálogo ni las ofertas
     """
-    for producto in productos['productos']:
-        if str(producto['id']) == str(producto_id):
-            return producto
-    return None
+    clave = clave_carrito()
+    if not clave:
+        return cotizar_items({}, catalogo.obtener(), {})
+    items, version = carritos.obtener_con_version(clave)
+    return cotizador.cotizar(clave, items, version)
+
+def asociar_carrito_al_usuario():
+    """
+    Al iniciar sesión, sumar el carrito anónimo del visitante al del usuario
+    """
+    carrito_id = session.pop('carrito_id', None)
+    if carrito_id:
+        carritos.fusionar(clave_anonima(carrito_id), clave_usuario(session['usuario_id']))
+    carrito_sesion = session.pop('carrito', None)
+    if carrito_sesion:
+        for producto_id, cantidad in carrito_sesion.items():
+            carritos.agregar(clave_usuario(session['usuario_id']), producto_id, cantidad)
 
 def calcular_total_carrito():
     """
     Calcula el total del carrito de compras
     """
-    total = 0
-    if 'carrito' in session:
-        for producto_id, cantidad in session['carrito'].items():
-            producto = obtener_producto_por_id(producto_id)
-            if producto:
-                total += producto['precio'] * cantidad
-    return total
+    return cotizar_carrito()['total']
+
+def avisar_no_disponibles(no_disponibles):
+    """
+    Avisar qué productos de un pedido repetido ya no están a la venta
+    """
+    if no_disponibles:
+        nombres = ', '.join(item['nombre'] or f"Producto {item['producto_id']}" for item in no_disponibles)
+        flash(f'Ya no están a la venta y no se repitieron: {nombres}', 'warning')
+
+@app.context_processor
+def inyectar_carrito():
+    """
+    Cantidad de productos del carrito para el badge de base.html
+    """
+    clave = clave_carrito()
+    return {'carrito_count': carritos.cantidad_productos(clave) if clave else 0}
+
+@app.template_global()
+def stock_disponible(producto):
+    """
+    Unidades disponibles de un producto para las tarjetas (ver inventario.py)
+    """
+    return inventario.disponible(producto)
+
+@app.template_global()
+def stock_vigente(productos):
+    """
+    Unidades disponibles {producto_id: unidades} para actualizar las
+    tarjetas de un fragmento cacheado (ver partials/stock_vigente.html)
+    """
+    return inventario.disponibles(productos)
 
 def usuario_logueado():
     """
@@ -472,6 +546,7 @@ def login():
             session['usuario_nombre'] = usuario.get('nombre')
             session['usuario_email'] = usuario.get('email')
             session['usuario_rol'] = usuario.get('rol', 'cliente')
+            asociar_carrito_al_usuario()
             
             logger.info(f"Login exitoso - Usuario: {usuario.get('nombre')}, ID: {usuario.get('id')}")
             flash(f'¡Bienvenido, {usuario.get("nombre", "Usuario")}!', 'success')
@@ -604,23 +679,16 @@ def perfil():
         'fecha_registro': usuario.get('fecha_registro')
     }
     
-    # Obtener pedidos del usuario
-    if database is None:
-        pedidos = []
-        total_gastado = 0
+    # Resumen de pedidos del usuario (una fila, ver db.obtener_resumen_pedidos)
+    if database is None or not usuario.get('id'):
+        resumen = {'cantidad_pedidos': 0, 'total_gastado': 0, 'ultimo_pedido': None}
     else:
-        usuario_id = usuario.get('id')
-        if usuario_id:
-            pedidos = database.obtener_pedidos_usuario(usuario_id)
-            total_gastado = sum(pedido.get('total', 0) for pedido in pedidos)
-        else:
-            pedidos = []
-            total_gastado = 0
+        resumen = database.obtener_resumen_pedidos(usuario['id'])
     
     return render_template('perfil.html', 
                          usuario=usuario, 
-                         pedidos=pedidos,
-                         total_gastado=total_gastado,
+                         resumen=resumen,
+                         total_gastado=resumen['total_gastado'],
                          sesiones=[])
 
 @app.route("/editar-perfil", methods=['POST'])
@@ -860,6 +928,9 @@ def contacto_soporte():
 def index():
     """
     RUTA PRINCIPAL - Página de inicio con productos organizados por negocios
+    
+    Cada carrusel recibe solo la primera página de productos; el resto se pide
+    a /api/v1/catalogo al deslizarlo (ver static/js/catalogo-scroll.js)
     """
     # Obtener parámetro de búsqueda
     busqueda = request.args.get('busqueda', '').strip()
@@ -872,19 +943,19 @@ def index():
     ofertas_activas = obtener_ofertas_activas()
     productos_destacados = obtener_productos_destacados()
     
-    # Obtener productos por negocio
+    # Primera página de productos por negocio
+    indice = catalogo.obtener()
     productos_por_negocio = {}
+    cursores_por_negocio = {}
     for negocio_id in negocios.keys():
-        productos_por_negocio[negocio_id] = obtener_productos_por_negocio(negocio_id)
+        pagina = consultar_catalogo(indice, {'negocio': negocio_id}, facetas=False)
+        productos_por_negocio[negocio_id] = pagina['productos']
+        cursores_por_negocio[negocio_id] = pagina['siguiente']
     
-    # Filtrar productos si hay búsqueda
+    # Filtrar productos si hay búsqueda (índice invertido del catálogo)
     productos_filtrados = []
     if busqueda:
-        todos_productos = datos.get('productos', [])
-        productos_filtrados = [
-            p for p in todos_productos 
-            if busqueda.lower() in p['nombre'].lower() and p.get('activo', True)
-        ]
+        productos_filtrados = buscar_productos(None, busqueda)
     
     return render_template("index.html", 
                          negocios=negocios,
@@ -893,6 +964,7 @@ def index():
                          ofertas=ofertas_activas,
                          productos_destacados=productos_destacados,
                          productos_por_negocio=productos_por_negocio,
+                         cursores_por_negocio=cursores_por_negocio,
                          busqueda=busqueda,
                          productos_filtrados=productos_filtrados)
 
@@ -908,6 +980,7 @@ def ver_negocio(negocio_id):
     - Para agregar nuevos negocios: editar productos.json sección "negocios"
     - Para cambiar información del negocio: modificar datos en productos.json
     - Para agregar productos al negocio: agregar en productos.json con negocio correcto
+    - Cada categoría muestra la primera página; el resto se carga al hacer scroll
     """
     datos = cargar_datos_completos()
     negocios = datos.get('negocios', {})
@@ -919,12 +992,18 @@ def ver_negocio(negocio_id):
         return redirect(url_for('index'))
     
     negocio = negocios[negocio_id]
-    productos = obtener_productos_por_negocio(negocio_id)
+    indice = catalogo.obtener()
+    paginas_por_categoria = {}
+    for categoria_id in categorias.keys():
+        paginas_por_categoria[categoria_id] = consultar_catalogo(
+            indice, {'negocio': negocio_id, 'categoria': categoria_id}, facetas=False)
     sucursales_negocio = sucursales.get(negocio_id, {})
     
     return render_template("negocio.html", 
                          negocio=negocio,
-                         productos=productos,
+                         negocio_id=negocio_id,
+                         paginas_por_categoria=paginas_por_categoria,
+                         total_productos=len(obtener_productos_por_negocio(negocio_id)),
                          categorias=categorias,
                          sucursales=sucursales_negocio)
 
@@ -935,11 +1014,13 @@ def ver_categoria(categoria_id):
     
     PARÁMETROS:
     - categoria_id: ID de la categoría a mostrar
+    - negocio (query string, opcional): filtrar por negocio
     
     MANTENIMIENTO:
     - Para agregar categorías: editar productos.json sección "categorias"
     - Para cambiar iconos: modificar campo "icono" en la categoría
     - Para agregar productos a categoría: asignar categoria_id correcto en productos.json
+    - Se muestra la primera página; el resto se carga al hacer scroll
     """
     datos = cargar_datos_completos()
     categorias = datos.get('categorias', {})
@@ -950,12 +1031,23 @@ def ver_categoria(categoria_id):
         return redirect(url_for('index'))
     
     categoria = categorias[categoria_id]
-    productos = datos.get('productos', [])
-    productos_categoria = [p for p in productos if p.get('categoria') == categoria_id and p.get('activo', True)]
+    filtros = {'categoria': categoria_id}
+    negocio_filtro = request.args.get('negocio', '').strip()
+    if negocio_filtro in negocios:
+        filtros['negocio'] = negocio_filtro
+    
+    pagina = consultar_catalogo(catalogo.obtener(), filtros,
+                                ofertas_por_producto=ofertas_vigentes.obtener().por_producto,
+                                stock_por_producto=inventario.stock_por_producto())
     
     return render_template("categoria.html", 
                          categoria=categoria,
-                         productos=productos_categoria,
+                         categoria_id=categoria_id,
+                         negocio_filtro=filtros.get('negocio', ''),
+                         productos=pagina['productos'],
+                         siguiente=pagina['siguiente'],
+                         total_productos=pagina['total'],
+                         facetas=pagina['facetas'],
                          negocios=negocios)
 
 @app.route("/agregar_al_carrito", methods=['POST'])
@@ -972,18 +1064,8 @@ def agregar_al_carrito():
         flash('Producto no especificado', 'danger')
         return redirect(url_for('index'))
     
-    # Inicializar carrito si no existe
-    if 'carrito' not in session:
-        session['carrito'] = {}
-    
-    # Agregar o actualizar cantidad
-    if producto_id in session['carrito']:
-        session['carrito'][producto_id] += cantidad
-    else:
-        session['carrito'][producto_id] = cantidad
-    
-    # Guardar cambios en la sesión
-    session.modified = True
+    # Agregar o actualizar cantidad en el almacén de carritos
+    carrito_count = carritos.agregar(clave_carrito(crear=True), producto_id, cantidad)
     
     logger.info(f"Producto agregado al carrito: {producto_id} x{cantidad}")
     
@@ -992,7 +1074,7 @@ def agregar_al_carrito():
         return jsonify({
             'success': True,
             'mensaje': f'¡Producto agregado al carrito!',
-            'carrito_count': len(session['carrito']),
+            'carrito_count': carrito_count,
             'producto_id': producto_id,
             'cantidad': cantidad
         })
@@ -1007,22 +1089,10 @@ def carrito():
     RUTA PARA VER EL CARRITO DE COMPRAS
     Muestra todos los productos en el carrito con sus cantidades
     """
-    carrito_items = []
-    total = 0
+    cotizacion = cotizar_carrito()
     
-    if 'carrito' in session:
-        for producto_id, cantidad in session['carrito'].items():
-            producto = obtener_producto_por_id(producto_id)
-            if producto:
-                subtotal = producto['precio'] * cantidad
-                carrito_items.append({
-                    'producto': producto,
-                    'cantidad': cantidad,
-                    'subtotal': subtotal
-                })
-                total += subtotal
-    
-    return render_template("carrito.html", carrito_items=carrito_items, total=total)
+    return render_template("carrito.html", carrito_items=cotizacion['lineas'], total=cotizacion['total'],
+                           cotizacion=cotizacion)
 
 @app.route("/actualizar_cantidad", methods=['POST'])
 def actualizar_cantidad():
@@ -1032,17 +1102,16 @@ def actualizar_cantidad():
     producto_id = request.form.get('producto_id')
     nueva_cantidad = int(request.form.get('cantidad', 0))
     
+    clave = clave_carrito()
+    
     if nueva_cantidad <= 0:
         # Eliminar producto del carrito
-        if 'carrito' in session and producto_id in session['carrito']:
-            del session['carrito'][producto_id]
-            session.modified = True
+        if clave and carritos.actualizar(clave, producto_id, 0):
             flash(f'{producto_id} eliminado del carrito', 'info')
     else:
         # Actualizar cantidad
-        if 'carrito' in session:
-            session['carrito'][producto_id] = nueva_cantidad
-            session.modified = True
+        if clave:
+            carritos.actualizar(clave, producto_id, nueva_cantidad)
             flash(f'Cantidad de {producto_id} actualizada', 'success')
     
     return redirect(url_for('carrito'))
@@ -1052,10 +1121,69 @@ def vaciar_carrito():
     """
     RUTA PARA VACIAR EL CARRITO DE COMPRAS
     """
-    session.pop('carrito', None)
+    clave = clave_carrito()
+    if clave:
+        carritos.vaciar(clave)
     flash('Carrito vaciado', 'info')
     return redirect(url_for('carrito'))
 
+@app.route("/api/carrito/lote", methods=['POST'])
+def api_carrito_lote():
+    """
+    API PARA MODIFICAR EL CARRITO EN LOTE (compras mayoristas)
+    
+    PARÁMETROS (JSON):
+    - operaciones: [{accion: 'agregar' | 'fijar' | 'quitar', producto_id, cantidad}]
+    
+    Se validan todas las operaciones (los productos con una sola búsqueda en
+    el índice) y se aplican todas o ninguna. La respuesta trae el carrito
+    recotizado, así la página no necesita otra consulta.
+    """
+    data = request.get_json(silent=True) or {}
+    operaciones = data.get('operaciones')
+    if not isinstance(operaciones, list) or not operaciones:
+        return jsonify({'exito': False, 'mensaje': 'Operaciones no especificadas'}), 400
+    if len(operaciones) > MAX_OPERACIONES_CARRITO:
+        return jsonify({'exito': False,
+                        'mensaje': f'Máximo {MAX_OPERACIONES_CARRITO} operaciones por lote'}), 400
+    
+    errores = []
+    validas = []
+    for posicion, operacion in enumerate(operaciones):
+        if not isinstance(operacion, dict):
+            errores.append({'operacion': posicion, 'mensaje': 'Operación inválida'})
+            continue
+        accion = operacion.get('accion')
+        cantidad = operacion.get('cantidad', 1 if accion == 'agregar' else 0)
+        if accion not in ('agregar', 'fijar', 'quitar'):
+            errores.append({'operacion': posicion, 'mensaje': f'Acción inválida: {accion}'})
+        elif isinstance(cantidad, bool) or not isinstance(cantidad, int):
+            errores.append({'operacion': posicion, 'mensaje': 'La cantidad debe ser un número entero'})
+        else:
+            validas.append((posicion, accion, operacion.get('producto_id'), cantidad))
+    
+    # Todos los productos en una sola búsqueda; quitar no exige que el producto siga en el catálogo
+    productos = catalogo.obtener().productos_por_ids([producto_id for _, _, producto_id, _ in validas])
+    for (posicion, accion, producto_id, _), producto in zip(validas, productos):
+        if accion != 'quitar' and (producto is None or not producto.get('activo', True)):
+            errores.append({'operacion': posicion, 'mensaje': f'Producto no disponible: {producto_id}'})
+    
+    if errores:
+        return jsonify({'exito': False, 'mensaje': 'El lote tiene errores, no se aplicó ningún cambio',
+                        'errores': sorted(errores, key=lambda error: error['operacion'])}), 400
+    
+    clave = clave_carrito(crear=True)
+    carrito_count = carritos.aplicar(clave, [(accion, producto_id, cantidad)
+                                             for _, accion, producto_id, cantidad in validas])
+    logger.info(f"Carrito modificado en lote: {len(validas)} operaciones")
+    
+    return jsonify({
+        'exito': True,
+        'mensaje': f'{len(validas)} cambios aplicados al carrito',
+        'carrito_count': carrito_count,
+        'carrito': resumen_cotizacion(cotizar_carrito())
+    })
+
 # ==========================================
 # RUTAS DEL SISTEMA DE PAGO
 # ==========================================
@@ -1069,102 +1197,162 @@ def checkout():
         flash('Debes iniciar sesión para realizar una compra', 'warning')
         return redirect(url_for('login'))
     
-    if not session.get('carrito'):
+    cotizacion = cotizar_carrito()
+    if not cotizacion['lineas']:
         flash('Tu carrito está vacío', 'warning')
         return redirect(url_for('carrito'))
     
-    carrito_items = []
-    total = 0
-    
-    for producto_id, cantidad in session['carrito'].items():
-        producto = obtener_producto_por_id(producto_id)
-        if producto:
-            subtotal = producto['precio'] * cantidad
-            carrito_items.append({
-                'producto': producto,
-                'cantidad': cantidad,
-                'subtotal': subtotal
-            })
-            total += subtotal
-    
-    return render_template("checkout.html", carrito_items=carrito_items, total=total)
+    # Clave de idempotencia del formulario (ver procesar_pago)
+    return render_template("checkout.html", carrito_items=cotizacion['lineas'], total=cotizacion['total'],
+                           cotizacion=cotizacion, idempotency_key=nueva_clave())
 
 @app.route("/procesar_pago", methods=['POST'])
 def procesar_pago():
     """
     RUTA PARA PROCESAR EL PAGO
+    
+    El formulario de checkout lleva una clave de idempotencia: un reenvío
+    (doble clic, reintento del navegador) redirige al pedido original sin
+    volver a cotizar, guardar ni despachar.
     """
     if not usuario_logueado():
         flash('Debes iniciar sesión para realizar una compra', 'warning')
         return redirect(url_for('login'))
     
-    if not session.get('carrito'):
-        flash('Tu carrito está vacío', 'warning')
-        return redirect(url_for('carrito'))
+    usuario_id = session['usuario_id']
+    clave = request.form.get('idempotency_key')
+    if clave:
+        previa = claves_idempotencia.reclamar('checkout', clave, usuario_id)
+        if previa is not None:
+            return respuesta_checkout_repetido(clave, previa, usuario_id)
+    
+    def fallar(mensaje, categoria, destino):
+        # El mismo formulario puede reenviarse después de un error
+        if clave:
+            claves_idempotencia.liberar('checkout', clave)
+        flash(mensaje, categoria)
+        return redirect(url_for(destino))
+    
+    try:
+        cotizacion = cotizar_carrito()
+        if not cotizacion['lineas']:
+            return fallar('Tu carrito está vacío', 'warning', 'carrito')
+    
+        # Obtener datos del formulario
+        metodo_pago = request.form.get('metodo_pago')
+        direccion = request.form.get('direccion')
+        notas = request.form.get('notas')
+    
+        # Validaciones básicas
+        if not direccion:
+            return fallar('Por favor ingresa una dirección de entrega', 'danger', 'checkout')
+    
+        resultado = registrar_pedido(obtener_usuario_actual(), cotizacion, metodo_pago, direccion, notas)
+        if not resultado['exito']:
+            if resultado['sin_stock']:
+                return fallar(resultado['mensaje'], 'warning', 'carrito')
+            return fallar(resultado['mensaje'], 'danger', 'checkout')
+    
+        numero_pedido = resultado['numero_pedido']
+    except Exception:
+        # Error inesperado (ej: la base bloqueada): la clave queda libre para reintentar
+        if clave:
+            claves_idempotencia.liberar('checkout', clave)
+        raise
     
-    # Obtener datos del formulario
-    metodo_pago = request.form.get('metodo_pago')
-    direccion = request.form.get('direccion')
-    notas = request.form.get('notas')
+    if clave:
+        claves_idempotencia.completar('checkout', clave, {'numero_pedido': numero_pedido})
     
-    # Validaciones básicas
-    if not direccion:
-        flash('Por favor ingresa una dirección de entrega', 'danger')
-        return redirect(url_for('checkout'))
+    # Limpiar carrito (si el pedido falló, el carrito queda para reintentar)
+    carritos.vaciar(clave_carrito())
     
-    # Crear el pedido
+    flash(f'¡Pedido confirmado! Número: {numero_pedido}', 'success')
+    return redirect(url_for('confirmacion_pedido', numero_pedido=numero_pedido))
+
+def registrar_pedido(usuario, cotizacion, metodo_pago, direccion, notas):
+    """
+    Reservar el stock, guardar el pedido con su ticket y despacharlo
+    
+    Es el camino de todo pedido de un cliente (checkout y repetir pedido).
+    
+    PARÁMETROS:
+    - usuario: usuario actual (obtener_usuario_actual)
+    - cotizacion: resultado de cotizar_items/cotizar_carrito, con 'lineas' no vacías
+    
+    RETORNA:
+    - {'exito': True, 'mensaje', 'numero_pedido'}
+    - {'exito': False, 'mensaje', 'sin_stock': True si faltó stock}
+    """
     numero_pedido = generar_numero_pedido()
-    usuario = obtener_usuario_actual()
+    carrito_items = cotizacion['lineas']
+    total = cotizacion['total']
+    
+    # Reservar el stock antes de guardar: todo el pedido o nada
+    reserva = inventario.reservar(numero_pedido, [(item['producto'], item['cantidad']) for item in carrito_items])
+    if not reserva['exito']:
+        faltantes = ', '.join(f"{f['nombre']} (quedan {f['disponible']})" for f in reserva['faltantes'])
+        return {'exito': False, 'mensaje': f'Stock insuficiente: {faltantes}', 'sin_stock': True}
+    
+    # Ticket para la Ticketera: se guarda en el outbox junto con el pedido
+    ticket = construir_ticket(numero_pedido, usuario, carrito_items, total, metodo_pago, direccion, notas,
+                              cargar_datos_completos())
+    
+    # Guardar pedido, items y ticket en una sola transacción
+    items_db = []
+    for item in carrito_items:
+        items_db.append({
+            'producto_id': item['producto']['id'],
+            'nombre': item['producto']['nombre'],
+            'cantidad': item['cantidad'],
+            'precio_unitario': item['precio_unitario'],
+            'subtotal': item['subtotal']
+        })
     
-    carrito_items = []
-    total = 0
-    
-    for producto_id, cantidad in session['carrito'].items():
-        producto = obtener_producto_por_id(producto_id)
-        if producto:
-            subtotal = producto['precio'] * cantidad
-            carrito_items.append({
-                'producto': producto,
-                'cantidad': cantidad,
-                'subtotal': subtotal
-            })
-            total += subtotal
-    
-    # Guardar pedido en la base de datos
-    pedido_id = database.guardar_pedido(
-        usuario_id=usuario['id'],
-        numero_pedido=numero_pedido,
-        total=total,
-        metodo_pago=metodo_pago,
-        direccion_entrega=direccion,
-        notas=notas
-    )
+    pedido_id = database.crear_pedido_con_items({
+        'usuario_id': usuario['id'],
+        'numero_pedido': numero_pedido,
+        'total': total,
+        'metodo_pago': metodo_pago,
+        'direccion_entrega': direccion,
+        'notas': notas,
+        'confirmar_reserva': True
+    }, items_db, ticket=ticket)
     
-    if pedido_id:
-        # Guardar items del pedido
-        items_db = []
-        for item in carrito_items:
-            items_db.append({
-                'producto_id': item['producto']['id'],
-                'cantidad': item['cantidad'],
-                'precio_unitario': item['producto']['precio'],
-                'subtotal': item['subtotal']
-            })
-        
-        database.guardar_items_pedido(pedido_id, items_db)
+    if not pedido_id:
+        # Devolver el stock apartado para este intento
+        inventario.liberar(numero_pedido, 'pedido_fallido')
+        return {'exito': False, 'mensaje': 'Error al procesar el pedido. Intenta nuevamente.', 'sin_stock': False}
     
-    # Limpiar carrito
-    session.pop('carrito', None)
+    # El despachador entrega el ticket a la Ticketera en segundo plano
+    despachador_tickets.despertar()
+    return {'exito': True, 'mensaje': f'Pedido {numero_pedido} registrado', 'numero_pedido': numero_pedido}
+
+def respuesta_checkout_repetido(clave, previa, usuario_id, ambito='checkout', destino='checkout'):
+    """
+    Respuesta a un reenvío del formulario de checkout con una clave ya usada
     
-    if pedido_id:
-        # ENVIAR PEDIDO AUTOMÁTICAMENTE A LA TICKETERA
-        enviar_pedido_a_ticketera(numero_pedido, usuario, carrito_items, total, metodo_pago, direccion, notas)
-        
-        flash(f'¡Pedido confirmado! Número: {numero_pedido}', 'success')
+    PARÁMETROS:
+    - ambito: ámbito de la clave ('checkout' o 'repetir_pedido')
+    - destino: ruta a la que volver si el primer envío falló
+    """
+    if str(previa['usuario_id']) != str(usuario_id):
+        flash('El formulario de pago no es válido. Intenta nuevamente.', 'danger')
+        return redirect(url_for(destino))
+    
+    # El primer envío puede seguir en curso (doble clic): esperar su resultado
+    if previa['estado'] == 'en_curso':
+        previa = claves_idempotencia.esperar(ambito, clave)
+    
+    if previa is None:
+        # El primer envío falló y ya mostró su error
+        return redirect(url_for(destino))
+    if previa['estado'] == 'completada':
+        numero_pedido = previa['resultado']['numero_pedido']
+        logger.info(f"Envío repetido ({ambito}), se devuelve el pedido {numero_pedido}")
         return redirect(url_for('confirmacion_pedido', numero_pedido=numero_pedido))
-    else:
-        flash('Error al procesar el pedido. Intenta nuevamente.', 'danger')
-        return redirect(url_for('checkout'))
+    
+    flash('Tu pedido se está procesando. Revisá Mis Pedidos en unos segundos.', 'info')
+    return redirect(url_for('mis_pedidos'))
 
 @app.route("/confirmacion/<numero_pedido>")
 def confirmacion_pedido(numero_pedido):
@@ -1202,15 +1390,25 @@ def mis_pedidos():
         flash('Error al cargar información del usuario', 'danger')
         return redirect(url_for('login'))
     
-    # Obtener pedidos del usuario desde la base de datos
-    pedidos = database.obtener_pedidos_usuario(usuario['id'])
+    # Una página del historial (?cursor= para las siguientes) y el resumen del usuario
+    try:
+        pagina = database.obtener_pagina_pedidos_usuario(usuario['id'], request.args.get('cursor'))
+    except ValueError:
+        return redirect(url_for('mis_pedidos'))
+    resumen = database.obtener_resumen_pedidos(usuario['id'])
     
-    return render_template("mis_pedidos.html", pedidos=pedidos, usuario=usuario)
+    return render_template("mis_pedidos.html", pedidos=pagina['pedidos'], siguiente=pagina['siguiente'],
+                           resumen=resumen, usuario=usuario, idempotency_key=nueva_clave())
 
-@app.route("/repetir_pedido/<int:pedido_id>")
+@app.route("/repetir_pedido/<int:pedido_id>", methods=['POST'])
 def repetir_pedido(pedido_id):
     """
     RUTA PARA REPETIR UN PEDIDO ANTERIOR
+    
+    Vuelve a cotizar los productos con los precios y ofertas vigentes y los
+    registra como en el checkout (reserva de stock, ticket, despacho). El
+    formulario lleva una clave de idempotencia por página: un reenvío
+    devuelve el pedido ya creado.
     """
     if not usuario_logueado():
         flash('Debes iniciar sesión para repetir pedidos', 'warning')
@@ -1221,15 +1419,70 @@ def repetir_pedido(pedido_id):
         flash('Error al cargar información del usuario', 'danger')
         return redirect(url_for('login'))
     
-    # Repetir pedido
-    exito, resultado = database.repetir_pedido(pedido_id, usuario['id'])
+    # La misma página ofrece repetir varios pedidos: la clave incluye el pedido
+    clave = request.form.get('idempotency_key')
+    if clave:
+        clave = f"{clave}:{pedido_id}"
+        previa = claves_idempotencia.reclamar('repetir_pedido', clave, usuario['id'])
+        if previa is not None:
+            return respuesta_checkout_repetido(clave, previa, usuario['id'], 'repetir_pedido', 'mis_pedidos')
+    
+    def fallar(mensaje, categoria='danger'):
+        if clave:
+            claves_idempotencia.liberar('repetir_pedido', clave)
+        flash(mensaje, categoria)
+        return redirect(url_for('mis_pedidos'))
     
-    if exito:
-        flash(f'Pedido repetido exitosamente. Nuevo número: {resultado}', 'success')
-        return redirect(url_for('confirmacion_pedido', numero_pedido=resultado))
-    else:
-        flash(f'Error al repetir pedido: {resultado}', 'danger')
+    try:
+        anterior = database.productos_para_repetir(pedido_id, usuario['id'])
+        if not anterior['exito']:
+            return fallar(f'Error al repetir pedido: {anterior["mensaje"]}')
+    
+        # Repetir pedido con los precios y ofertas vigentes
+        avisar_no_disponibles(anterior['no_disponibles'])
+        cotizacion = cotizar_items(anterior['items'], catalogo.obtener(), ofertas_vigentes.obtener().por_producto)
+        if not cotizacion['lineas']:
+            return fallar('Error al repetir pedido: ningún producto del pedido sigue disponible')
+    
+        original = anterior['pedido']
+        resultado = registrar_pedido(usuario, cotizacion, original['metodo_pago'], original['direccion_entrega'],
+                                     f"Pedido repetido del {original['numero_pedido']}")
+        if not resultado['exito']:
+            return fallar(f'Error al repetir pedido: {resultado["mensaje"]}',
+                          'warning' if resultado['sin_stock'] else 'danger')
+    
+        numero_pedido = resultado['numero_pedido']
+    except Exception:
+        # Error inesperado (ej: la base bloqueada): la clave queda libre para reintentar
+        if clave:
+            claves_idempotencia.liberar('repetir_pedido', clave)
+        raise
+    
+    if clave:
+        claves_idempotencia.completar('repetir_pedido', clave, {'numero_pedido': numero_pedido})
+    flash(f'Pedido repetido exitosamente. Nuevo número: {numero_pedido}', 'success')
+    return redirect(url_for('confirmacion_pedido', numero_pedido=numero_pedido))
+
+@app.route("/repetir_pedido/<int:pedido_id>/carrito")
+def repetir_pedido_carrito(pedido_id):
+    """
+    RUTA PARA CARGAR UN PEDIDO ANTERIOR EN EL CARRITO (para editarlo antes de pagar)
+    """
+    if not usuario_logueado():
+        flash('Debes iniciar sesión para repetir pedidos', 'warning')
+        return redirect(url_for('login'))
+    
+    resultado = database.productos_para_repetir(pedido_id, session['usuario_id'])
+    if not resultado['exito']:
+        flash(f'Error al repetir pedido: {resultado["mensaje"]}', 'danger')
         return redirect(url_for('mis_pedidos'))
+    
+    avisar_no_disponibles(resultado['no_disponibles'])
+    if resultado['items']:
+        carritos.aplicar(clave_carrito(crear=True),
+                         [('agregar', producto_id, cantidad) for producto_id, cantidad in resultado['items'].items()])
+        flash('Productos del pedido agregados al carrito', 'success')
+    return redirect(url_for('carrito'))
 
 @app.route("/ver_pedido/<int:pedido_id>")
 def ver_pedido(pedido_id):
@@ -1256,7 +1509,8 @@ def ver_pedido(pedido_id):
     if 'items' not in pedido or not isinstance(pedido['items'], list):
         pedido['items'] = []
     
-    return render_template("ver_pedido.html", pedido=pedido, usuario=usuario, pedido_id=pedido_id)
+    return render_template("ver_pedido.html", pedido=pedido, usuario=usuario, pedido_id=pedido_id,
+                           idempotency_key=nueva_clave())
 
 @app.route("/test")
 def test():
@@ -1299,34 +1553,13 @@ def actualizar_base_datos_produccion():
         if api_key != 'belgrano_ahorro_api_key_2025':
             return jsonify({'error': 'API key inválida'}), 401
         
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Verificar columnas existentes
-        cursor.execute("PRAGMA table_info(pedidos)")
-        columns = [col[1] for col in cursor.fetchall()]
-        
-        # Agregar columnas si no existen
-        columnas_a_agregar = [
-            ('ticket_confirmado', 'INTEGER DEFAULT 0'),
-            ('ticket_estado', 'VARCHAR(20) DEFAULT "pendiente"'),
-            ('fecha_confirmacion', 'DATETIME')
-        ]
-        
-        columnas_agregadas = []
-        for columna, tipo in columnas_a_agregar:
-            if columna not in columns:
-                cursor.execute(f'ALTER TABLE pedidos ADD COLUMN {columna} {tipo}')
-                columnas_agregadas.append(columna)
-        
-        conn.commit()
-        conn.close()
+        aplicadas = esquema.migrar()
         
         return jsonify({
             'success': True,
             'message': 'Base de datos actualizada exitosamente',
-            'columnas_agregadas': columnas_agregadas,
-            'columnas_existentes': columns
+            'migraciones_aplicadas': [f"{version:04d}_{nombre}" for version, nombre in aplicadas],
+            'version': esquema.estado()['version']
         })
         
     except Exception as e:
@@ -1421,8 +1654,11 @@ def comerciantes_pedidos():
 
 @app.route("/comerciantes/carrito")
 def comerciantes_carrito():
-    """Atajo al carrito normal desde el panel de comerciantes."""
-    return redirect(url_for('carrito'))
+    """
+    Carrito mayorista: las cantidades y las altas por ID se guardan en lote
+    con /api/carrito/lote y el resumen se actualiza con la respuesta.
+    """
+    return render_template("comerciantes/carrito.html", carrito=resumen_cotizacion(cotizar_carrito()))
 
 @app.route("/comerciantes/checkout")
 def comerciantes_checkout():
@@ -1517,6 +1753,7 @@ def login_comerciante():
                 session['usuario_rol'] = 'comerciante'
                 session['comerciante_id'] = comerciante['id']
                 session['nombre_negocio'] = comerciante['nombre_negocio']
+                asociar_carrito_al_usuario()
                 
                 flash(f'¡Bienvenido, {comerciante["nombre_negocio"]}!', 'success')
                 return redirect(url_for('comerciantes_home'))
@@ -1611,25 +1848,39 @@ def agregar_producto_paquete(paquete_id):
     resultado = database.agregar_producto_a_paquete(paquete_id, producto_id, cantidad)
     return jsonify(resultado)
 
-@app.route("/api/productos_por_sucursal", methods=['POST'])
+@app.route("/api/productos_por_sucursal", methods=['GET', 'POST'])
 def api_productos_por_sucursal():
-    """API para obtener productos de una sucursal específica"""
+    """
+    API para obtener productos de una sucursal específica
+    
+    PARÁMETROS:
+    - negocio_id, sucursal_id: en el JSON (POST) o en la query string (GET)
+    
+    Con GET la respuesta lleva ETag y devuelve 304 si el catálogo y el stock no cambiaron
+    """
     if not usuario_logueado():
         return jsonify({'exito': False, 'mensaje': 'No autorizado'})
     
-    data = request.get_json()
+    if request.method == 'POST':
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.args
     negocio_id = data.get('negocio_id')
     sucursal_id = data.get('sucursal_id')
     
     if not negocio_id or not sucursal_id:
         return jsonify({'exito': False, 'mensaje': 'Datos incompletos'})
     
-    productos = obtener_productos_por_sucursal(negocio_id, sucursal_id)
+    version_stock, stock = inventario.foto_stock()
     
-    return jsonify({
-        'exito': True,
-        'productos': productos
-    })
+    def construir(indice):
+        return {
+            'exito': True,
+            'productos': [dict(producto, stock=stock.get(producto.get('id'), producto.get('stock')))
+                          for producto in indice.por_sucursal.get((negocio_id, sucursal_id), [])]
+        }
+    
+    return respuesta_catalogo(('productos_por_sucursal', negocio_id, sucursal_id), construir, version_stock)
 
 @app.route("/comerciantes/paquetes/<int:paquete_id>/procesar", methods=['POST'])
 def procesar_paquete(paquete_id):
@@ -1673,8 +1924,11 @@ def admin():
 
 def enviar_pedido_a_ticketera(numero_pedido, usuario, carrito_items, total, metodo_pago, direccion, notas):
     """
-    Enviar pedido automáticamente a la Ticketera vía API con conexión sólida
-    Usa la versión mejorada para mayor confiabilidad
+    Encolar un pedido para la Ticketera
+    El ticket se guarda en el outbox y el despachador lo entrega en segundo
+    plano con reintentos (ver despacho_tickets.py). procesar_pago encola el
+    ticket en la misma transacción que el pedido; esta función es para
+    pedidos ya guardados.
     
     PARÁMETROS:
     - numero_pedido: número único del pedido
@@ -1686,283 +1940,23 @@ def enviar_pedido_a_ticketera(numero_pedido, usuario, carrito_items, total, meto
     - notas: notas adicionales del pedido
     
     RETORNA:
-    - dict con datos del ticket creado si se envió exitosamente, None en caso contrario
-    """
-    # Usar la versión mejorada para mayor confiabilidad
-    return enviar_pedido_a_ticketera_mejorado(numero_pedido, usuario, carrito_items, total, metodo_pago, direccion, notas)
-
-def actualizar_pedido_con_ticket(numero_pedido, ticket_response):
-    """
-    Actualizar la base de datos de Ahorro con la información del ticket creado
+    - dict con los datos del ticket encolado, None si no se pudo encolar
     """
     try:
+        ticket = construir_ticket(numero_pedido, usuario, carrito_items, total, metodo_pago, direccion, notas,
+                                  cargar_datos_completos())
         conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Actualizar pedido con información del ticket
-        cursor.execute("""
-            UPDATE pedidos 
-            SET ticket_id = ?, 
-                ticket_estado = ?, 
-                ticket_fecha_creacion = ?,
-                fecha_actualizacion = CURRENT_TIMESTAMP
-            WHERE numero = ?
-        """, (
-            ticket_response.get('ticket_id'),
-            ticket_response.get('estado', 'pendiente'),
-            ticket_response.get('fecha_creacion'),
-            numero_pedido
-        ))
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"✅ Pedido {numero_pedido} actualizado con información del ticket")
-        
-    except Exception as e:
-        print(f"⚠️ Error actualizando pedido con ticket: {e}")
-
-def enviar_pedido_a_ticketera_mejorado(numero_pedido, usuario, carrito_items, total, metodo_pago, direccion, notas=None):
-    """
-    Enviar pedido a la Ticketera con conexión sólida y sin pérdida
-    Versión mejorada con mejor manejo de errores y reintentos
-    """
-    try:
-        # Obtener URL de la API desde variables de entorno
-        api_url = os.environ.get('TICKETERA_URL', 'https://ticketerabelgrano.onrender.com')
-        if not api_url.endswith('/api/tickets'):
-            api_url = f"{api_url}/api/tickets"
-        
-        # Obtener datos del usuario con validación
-        nombre_completo = f"{usuario.get('nombre', '')} {usuario.get('apellido', '')}".strip()
-        if not nombre_completo:
-            nombre_completo = usuario.get('email', 'Cliente')
-        
-        # Preparar lista de productos con estructura completa para la Ticketera
-        productos_lista = []
-        for item in carrito_items:
-            producto = item['producto']
-            
-            # Obtener información del negocio
-            negocio_nombre = "Negocio no especificado"
-            if producto.get('negocio'):
-                negocio_data = productos.get('negocios', {}).get(producto['negocio'])
-                if negocio_data:
-                    negocio_nombre = negocio_data.get('nombre', producto['negocio'])
-            
-            # Obtener información de la sucursal (usar la primera disponible)
-            sucursal_nombre = "Sucursal no especificada"
-            if producto.get('sucursales') and len(producto['sucursales']) > 0:
-                sucursal_id = producto['sucursales'][0]
-                if producto['negocio'] in productos.get('sucursales', {}):
-                    sucursal_data = productos['sucursales'][producto['negocio']].get(sucursal_id)
-                    if sucursal_data:
-                        sucursal_nombre = sucursal_data.get('nombre', sucursal_id)
-            
-            # Obtener información de la categoría
-            categoria_nombre = "Sin categoría"
-            if producto.get('categoria'):
-                categoria_data = productos.get('categorias', {}).get(producto['categoria'])
-                if categoria_data:
-                    categoria_nombre = categoria_data.get('nombre', producto['categoria'])
-            
-            productos_lista.append({
-                'id': producto.get('id', 'N/A'),
-                'nombre': producto.get('nombre', 'Producto sin nombre'),
-                'precio': float(producto.get('precio', 0)),
-                'cantidad': int(item['cantidad']),
-                'subtotal': float(item['subtotal']),
-                'sucursal': sucursal_nombre,
-                'negocio': negocio_nombre,
-                'categoria': categoria_nombre,
-                'descripcion': producto.get('descripcion', 'Sin descripción'),
-                'stock': producto.get('stock', 0),
-                'destacado': producto.get('destacado', False)
-            })
-        
-        # Preparar datos para enviar a la API con validación
-        ticket_data = {
-            "numero": numero_pedido,
-            "cliente_nombre": nombre_completo,
-            "cliente_direccion": direccion or "Dirección no especificada",
-            "cliente_telefono": usuario.get('telefono', ''),
-            "cliente_email": usuario['email'],
-            "productos": productos_lista,
-            "total": float(total),  # Asegurar que sea float
-            "metodo_pago": metodo_pago,
-            "indicaciones": notas or 'Sin indicaciones especiales',
-            "estado": "pendiente",
-            "prioridad": "normal",
-            "tipo_cliente": "cliente",
-            "fecha_creacion": datetime.now().isoformat(),
-            "origen": "belgrano_ahorro"
-        }
-        
-        # Validar datos antes de enviar
-        if not ticket_data["cliente_nombre"] or not ticket_data["cliente_email"]:
-            print("❌ Datos de cliente incompletos")
-            return None
-        
-        if not productos_lista:
-            print("❌ No hay productos en el carrito")
-            return None
-        
-        # Log de datos que se van a enviar
-        print(f"📤 Enviando pedido a Ticketera:")
-        print(f"   URL: {api_url}")
-        print(f"   Pedido: {numero_pedido}")
-        print(f"   Cliente: {nombre_completo}")
-        print(f"   Total: ${total}")
-        print(f"   Productos: {len(productos_lista)} items")
-        
-        # Headers mejorados
-        headers = {
-            'Content-Type': 'application/json',
-            'X-API-Key': BELGRANO_AHORRO_API_KEY,
-            'User-Agent': 'BelgranoAhorro/1.0.0',
-            'X-Request-ID': f"{numero_pedido}-{int(time.time())}",
-            'X-Origin': 'belgrano_ahorro'
-        }
-
-        # Configuración de reintentos mejorada
-        max_retries = 5
-        backoff_seconds = [1, 2, 4, 8, 16]  # Backoff exponencial más agresivo
-        last_response = None
-        last_error = None
-        
-        for attempt in range(max_retries):
-            try:
-                print(f"🔄 Intento {attempt + 1}/{max_retries} enviando a Ticketera...")
-                
-                # Verificar conectividad antes de enviar
-                if attempt > 0:
-                    try:
-                        health_check = requests.get(f"{api_url.replace('/api/tickets', '/healthz')}", timeout=5)
-                        if health_check.status_code != 200:
-                            print(f"⚠️ Health check falló en intento {attempt + 1}")
-                    except:
-                        print(f"⚠️ No se pudo verificar health check en intento {attempt + 1}")
-                
-                response = requests.post(
-                    api_url,
-                    json=ticket_data,
-                    headers=headers,
-                    timeout=20  # Timeout aumentado
-                )
-                last_response = response
-                
-                if response.status_code in (200, 201):
-                    print(f"✅ Petición exitosa en intento {attempt + 1}")
-                    break
-                elif response.status_code == 401:
-                    print(f"❌ Error de autenticación (API Key inválida)")
-                    return None
-                elif response.status_code == 400:
-                    print(f"❌ Error en datos enviados: {response.text}")
-                    return None
-                else:
-                    print(f"⚠️ Status {response.status_code} en intento {attempt + 1}")
-                    print(f"   Response: {response.text[:200]}...")
-                    
-            except requests.exceptions.Timeout:
-                last_error = f"Timeout en intento {attempt + 1}"
-                print(f"⏰ {last_error}")
-            except requests.exceptions.ConnectionError:
-                last_error = f"Error de conexión en intento {attempt + 1}"
-                print(f"🔌 {last_error}")
-            except requests.exceptions.RequestException as e:
-                last_error = f"Error de request en intento {attempt + 1}: {str(e)}"
-                print(f"🌐 {last_error}")
-            except Exception as e:
-                last_error = f"Error inesperado en intento {attempt + 1}: {str(e)}"
-                print(f"❌ {last_error}")
-            
-            # Backoff exponencial
-            if attempt < max_retries - 1:
-                wait_time = backoff_seconds[attempt]
-                print(f"⏳ Esperando {wait_time}s antes del siguiente intento...")
-                time.sleep(wait_time)
-        
-        # Procesar resultado final
-        if last_response is not None and last_response.status_code in (200, 201):
-            try:
-                ticket_response = last_response.json()
-                print(f"🎉 Pedido enviado exitosamente a Ticketera!")
-                print(f"   Ticket ID: {ticket_response.get('ticket_id', 'N/A')}")
-                print(f"   Número: {ticket_response.get('numero', 'N/A')}")
-                print(f"   Estado: {ticket_response.get('estado', 'N/A')}")
-                print(f"   Repartidor: {ticket_response.get('repartidor_asignado', 'N/A')}")
-                
-                # Actualizar base de datos de Ahorro con información del ticket
-                actualizar_pedido_con_ticket(numero_pedido, ticket_response)
-                
-                # Log de éxito
-                print(f"✅ Comunicación completada: Pedido {numero_pedido} → Ticket {ticket_response.get('ticket_id')}")
-                
-                return ticket_response
-                
-            except json.JSONDecodeError as e:
-                print(f"⚠️ Error parseando respuesta JSON: {e}")
-                print(f"   Respuesta recibida: {last_response.text}")
-                return None
-        else:
-            # Error final después de todos los reintentos
-            status = last_response.status_code if last_response is not None else 'no_response'
-            body = last_response.text if last_response is not None else 'no_body'
-            error_msg = last_error if last_error else f"Status {status}"
-            
-            print(f"💥 Error final enviando pedido a Ticketera después de {max_retries} intentos")
-            print(f"   Error: {error_msg}")
-            if last_response:
-                print(f"   Status: {status}")
-                print(f"   Respuesta: {body[:500]}...")
-            
-            # Guardar pedido pendiente para reintento posterior
-            guardar_pedido_pendiente(numero_pedido, ticket_data, error_msg)
-            
-            return None
-            
+        try:
+            with conn:
+                encolar_ticket(conn, ticket)
+        finally:
+            conn.close()
+        despachador_tickets.despertar()
+        return ticket
     except Exception as e:
-        print(f"💥 Error crítico enviando pedido a Ticketera: {e}")
-        import traceback
-        print(f"   Traceback: {traceback.format_exc()}")
+        logger.error(f"Error encolando pedido {numero_pedido} para la Ticketera: {e}")
         return None
 
-def guardar_pedido_pendiente(numero_pedido, ticket_data, error_msg):
-    """
-    Guardar pedido pendiente para reintento posterior
-    """
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        
-        # Crear tabla si no existe
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS pedidos_pendientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero_pedido VARCHAR(50) UNIQUE NOT NULL,
-                datos_ticket TEXT NOT NULL,
-                error_ultimo_intento TEXT,
-                fecha_ultimo_intento DATETIME DEFAULT CURRENT_TIMESTAMP,
-                intentos INTEGER DEFAULT 1,
-                fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
-        cursor.execute("""
-            INSERT OR REPLACE INTO pedidos_pendientes 
-            (numero_pedido, datos_ticket, error_ultimo_intento, fecha_ultimo_intento, intentos)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP, 1)
-        """, (numero_pedido, json.dumps(ticket_data), error_msg))
-        
-        conn.commit()
-        conn.close()
-        
-        print(f"💾 Pedido {numero_pedido} guardado para reintento posterior")
-        
-    except Exception as e:
-        print(f"⚠️ Error guardando pedido pendiente: {e}")
-
 # ==========================================
 # REGISTRAR API BLUEPRINT
 # ==========================================
@@ -2148,4 +2142,9 @@ if __name__ == "__main__":
     print("🚀 Iniciando Belgrano Ahorro...")
     print("📱 Abre tu navegador en: http://localhost:5000")
     print("⏹️  Presiona Ctrl+C para detener")
-    app.run(debug=True, host="0.0.0.0", port=5000)
\ No newline at end of file
+    modo_debug = True
+    # Con el reloader de debug este archivo vuelve a correr en un proceso
+    # hijo, que es el que atiende los requests: los hilos arrancan solo ahí
+    if not modo_debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_servicios()
+    app.run(debug=modo_debug, host="0.0.0.0", port=5000)
\ No newline at end of file
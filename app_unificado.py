@@ -28,6 +28,9 @@ app.secret_key = 'belgrano_ahorro_unificado_secret_2025'
 try:
     import db as database
     print("✅ Módulo db importado correctamente")
+    # Esquema de la base al día (migraciones/, ver esquema.py)
+    import esquema
+    esquema.migrar()
 except Exception as e:
     print(f"❌ Error importando db: {e}")
     raise
@@ -561,7 +564,8 @@ def ticketera_gestion_flota():
     stats_repartidores = {}
     for rep in repartidores:
         try:
-            tickets_rep = database.obtener_tickets_por_repartidor(rep)
+            # Solo hace falta el estado para contar
+            tickets_rep = database.obtener_tickets_por_repartidor(rep, columnas=('estado',))
         except Exception:
             tickets_rep = []
         stats_repartidores[rep] = {
@@ -22,6 +22,8 @@ class BelgranoAhorroAPIClient:
         self.api_key = api_key
         self.timeout = 30
         self.session = requests.Session()
+        # Respuestas GET con ETag: (url, params) -> (etag, cuerpo)
+        self._cache_etag = {}
         
         self.session.headers.update({
             'Content-Type': 'application/json',
@@ -34,6 +36,12 @@ class BelgranoAhorroAPIClient:
     def _make_request(self, method, endpoint, data=None, params=None):
         url = f"{self.base_url}/api/v1{endpoint}"
         
+        clave_cache = (url, tuple(sorted((params or {}).items())))
+        headers = {}
+        en_cache = self._cache_etag.get(clave_cache) if method == 'GET' else None
+        if en_cache:
+            headers['If-None-Match'] = en_cache[0]
+        
         try:
             logger.debug(f"Realizando {method} a {url}")
             
@@ -42,13 +50,23 @@ class BelgranoAhorroAPIClient:
                 url=url,
                 json=data,
                 params=params,
+                headers=headers,
                 timeout=self.timeout
             )
             
+            # 304: el recurso no cambió, se reutiliza el cuerpo guardado
+            if response.status_code == 304 and en_cache:
+                logger.debug(f"Sin cambios en {url} (ETag {en_cache[0]})")
+                return en_cache[1]
+            
             response.raise_for_status()
             
             if response.content:
-                return response.json()
+                cuerpo = response.json()
+                etag = response.headers.get('ETag')
+                if method == 'GET' and etag:
+                    self._cache_etag[clave_cache] = (etag, cuerpo)
+                return cuerpo
             else:
                 return {'status': 'success'}
                 
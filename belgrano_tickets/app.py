@@ -24,6 +24,23 @@ app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
 # Importar db desde models
 from models import db, User, Ticket
+from sqlalchemy import event, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+import sqlite3
+
+@event.listens_for(Engine, 'connect')
+def configurar_sqlite(conexion_dbapi, _registro):
+    """
+    SQLite en modo WAL: los conteos de panel y reportes leen una foto de la
+    base y no bloquean la recepción de tickets (/api/tickets), ni al revés
+    """
+    if isinstance(conexion_dbapi, sqlite3.Connection):
+        cursor = conexion_dbapi.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=10000')
+        cursor.close()
 
 # ==========================================
 # CONFIGURACIÓN DE COMUNICACIÓN API
@@ -373,6 +390,10 @@ def reparar_credenciales_debug():
             'error': str(e)
         }), 500
 
+def contar_tickets_por(columna):
+    """Cantidad de tickets por valor de `columna` en una sola consulta agrupada"""
+    return dict(db.session.query(columna, func.count(Ticket.id)).group_by(columna).all())
+
 @app.route('/panel')
 @login_required
 def panel():
@@ -404,11 +425,12 @@ def panel():
         # Ordenar por fecha de creación (más reciente primero)
         tickets = query.order_by(Ticket.fecha_creacion.desc()).all()
         
-        # Estadísticas
-        total_tickets = Ticket.query.count()
-        tickets_pendientes = Ticket.query.filter_by(estado='pendiente').count()
-        tickets_en_camino = Ticket.query.filter_by(estado='en-camino').count()
-        tickets_entregados = Ticket.query.filter_by(estado='entregado').count()
+        # Estadísticas (una consulta agrupada)
+        por_estado = contar_tickets_por(Ticket.estado)
+        total_tickets = sum(por_estado.values())
+        tickets_pendientes = por_estado.get('pendiente', 0)
+        tickets_en_camino = por_estado.get('en-camino', 0)
+        tickets_entregados = por_estado.get('entregado', 0)
         
         return render_template('admin_panel.html', 
                              tickets=tickets, 
@@ -461,23 +483,15 @@ def recibir_ticket_externo():
         if tipo_cliente == 'comerciante' and prioridad != 'alta':
             prioridad = 'alta'
         
-        # Idempotencia: si ya existe un ticket con el mismo numero, devolverlo
+        # Idempotencia por numero (único): los reintentos del despachador
+        # (Idempotency-Key = numero) y el mismo pedido enviado por otra vía
+        # devuelven el ticket existente
         numero_ticket = data.get('numero', data.get('numero_pedido'))
         if numero_ticket:
             existente = Ticket.query.filter_by(numero=numero_ticket).first()
             if existente:
                 print(f"✅ Ticket existente encontrado: {numero_ticket} (ID: {existente.id})")
-                return jsonify({
-                    'exito': True, 
-                    'ticket_id': existente.id, 
-                    'idempotent': True,
-                    'numero': existente.numero,
-                    'estado': existente.estado,
-                    'repartidor_asignado': existente.repartidor_nombre,
-                    'fecha_creacion': existente.fecha_creacion.isoformat() if existente.fecha_creacion else None,
-                    'cliente_nombre': existente.cliente_nombre,
-                    'total': existente.total
-                }), 200
+                return jsonify(respuesta_ticket(existente, idempotent=True)), 200
         
         # Crear el ticket con los datos recibidos
         ticket = Ticket(
@@ -493,8 +507,17 @@ def recibir_ticket_externo():
             indicaciones=data.get('indicaciones', data.get('notas', ''))
         )
         
+        # Dos envíos simultáneos chocan contra numero único y el segundo recibe el primero
         db.session.add(ticket)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            existente = Ticket.query.filter_by(numero=ticket.numero).first()
+            if not existente:
+                raise
+            print(f"✅ Ticket creado por un envío simultáneo: {existente.numero} (ID: {existente.id})")
+            return jsonify(respuesta_ticket(existente, idempotent=True)), 200
         
         # Asignar automáticamente a un repartidor aleatorio
         repartidor_asignado = asignar_repartidor_automatico(ticket)
@@ -522,16 +545,7 @@ def recibir_ticket_externo():
         tipo_cliente_str = "COMERCIANTE" if tipo_cliente == 'comerciante' else "CLIENTE"
         print(f"✅ Ticket recibido exitosamente: {ticket.numero} - {ticket.cliente_nombre} ({tipo_cliente_str}) - Prioridad: {ticket.prioridad}")
         
-        return jsonify({
-            'exito': True, 
-            'ticket_id': ticket.id, 
-            'numero': ticket.numero,
-            'estado': ticket.estado,
-            'repartidor_asignado': ticket.repartidor_nombre,
-            'fecha_creacion': ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
-            'cliente_nombre': ticket.cliente_nombre,
-            'total': ticket.total
-        })
+        return jsonify(respuesta_ticket(ticket))
         
     except Exception as e:
         print(f"❌ Error al procesar ticket: {e}")
@@ -540,6 +554,22 @@ def recibir_ticket_externo():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+def respuesta_ticket(ticket, idempotent=False):
+    """Respuesta JSON de /api/tickets para un ticket creado o repetido"""
+    respuesta = {
+        'exito': True,
+        'ticket_id': ticket.id,
+        'numero': ticket.numero,
+        'estado': ticket.estado,
+        'repartidor_asignado': ticket.repartidor_nombre,
+        'fecha_creacion': ticket.fecha_creacion.isoformat() if ticket.fecha_creacion else None,
+        'cliente_nombre': ticket.cliente_nombre,
+        'total': ticket.total
+    }
+    if idempotent:
+        respuesta['idempotent'] = True
+    return respuesta
+
 def asignar_repartidor_automatico(ticket):
     """
     Asigna automáticamente un repartidor aleatorio que no tenga tickets de prioridad máxima
@@ -686,16 +716,16 @@ def reportes():
         return 'Acceso no permitido', 403
     
     # Estadísticas generales
-    total_tickets = Ticket.query.count()
-    tickets_pendientes = Ticket.query.filter_by(estado='pendiente').count()
-    tickets_en_camino = Ticket.query.filter_by(estado='en-camino').count()
-    tickets_entregados = Ticket.query.filter_by(estado='entregado').count()
+    por_estado = contar_tickets_por(Ticket.estado)
+    total_tickets = sum(por_estado.values())
+    tickets_pendientes = por_estado.get('pendiente', 0)
+    tickets_en_camino = por_estado.get('en-camino', 0)
+    tickets_entregados = por_estado.get('entregado', 0)
     
     # Tickets por repartidor
-    tickets_por_repartidor = {}
+    por_repartidor = contar_tickets_por(Ticket.repartidor_nombre)
     repartidores = ['Repartidor1', 'Repartidor2', 'Repartidor3', 'Repartidor4', 'Repartidor5']
-    for rep in repartidores:
-        tickets_por_repartidor[rep] = Ticket.query.filter_by(repartidor_nombre=rep).count()
+    tickets_por_repartidor = {rep: por_repartidor.get(rep, 0) for rep in repartidores}
     
     return render_template('reportes.html',
                          total_tickets=total_tickets,
@@ -25,6 +25,8 @@ class BelgranoAhorroClient:
         self.base_url = base_url or os.environ.get('BELGRANO_AHORRO_URL', 'http://localhost:5000')
         self.timeout = timeout
         self.session = requests.Session()
+        # Respuestas GET con ETag: url -> (etag, cuerpo)
+        self._cache_etag: Dict[str, Any] = {}
         
         # Configurar headers por defecto
         self.session.headers.update({
@@ -48,6 +50,11 @@ class BelgranoAhorroClient:
         """
         url = f"{self.base_url}{endpoint}"
         
+        # Revalidar con If-None-Match si ya tenemos una copia del recurso
+        en_cache = self._cache_etag.get(url) if method == 'GET' and 'params' not in kwargs else None
+        if en_cache:
+            kwargs['headers'] = dict(kwargs.get('headers') or {}, **{'If-None-Match': en_cache[0]})
+        
         try:
             response = self.session.request(
                 method=method,
@@ -56,8 +63,15 @@ class BelgranoAhorroClient:
                 **kwargs
             )
             
+            if response.status_code == 304 and en_cache:
+                return en_cache[1]
+            
             response.raise_for_status()
-            return response.json()
+            cuerpo = response.json()
+            etag = response.headers.get('ETag')
+            if method == 'GET' and etag and 'params' not in kwargs:
+                self._cache_etag[url] = (etag, cuerpo)
+            return cuerpo
             
         except requests.exceptions.RequestException as e:
             logger.error(f"❌ Error en request a {url}: {e}")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Índice de búsqueda de productos para Belgrano Ahorro
+Índice invertido sobre nombre, categoría y negocio con tokens sin acentos,
+coincidencia por prefijo, tolerancia a errores por trigramas y ranking
+"""
+
+import bisect
+import re
+import unicodedata
+from collections.abc import Sequence
+
+# ==========================================
+# CONFIGURACIÓN DEL RANKING
+# ==========================================
+
+# Peso de cada campo indexado
+PESO_NOMBRE = 3.0
+PESO_CATEGORIA = 2.0
+PESO_NEGOCIO = 1.0
+
+# Factor aplicado según el tipo de coincidencia del token
+FACTOR_EXACTO = 1.0
+FACTOR_PREFIJO = 0.7
+FACTOR_APROXIMADO = 0.5
+
+# Similitud mínima (Jaccard de trigramas) para aceptar un token aproximado
+SIMILITUD_MINIMA = 0.35
+
+# Longitud mínima del token para intentar búsqueda aproximada
+LONGITUD_MINIMA_APROXIMADA = 4
+
+_PATRON_TOKEN = re.compile(r'[a-z0-9]+')
+
+# ==========================================
+# NORMALIZACIÓN DE TEXTO
+# ==========================================
+
+def normalizar(texto):
+    """Pasar a minúsculas y quitar acentos ("Lácteos" -> "lacteos")"""
+    if not texto:
+        return ''
+    descompuesto = unicodedata.normalize('NFKD', str(texto).lower())
+    return ''.join(c for c in descompuesto if not unicodedata.combining(c))
+
+def tokenizar(texto):
+    """Separar un texto normalizado en tokens alfanuméricos"""
+    return _PATRON_TOKEN.findall(normalizar(texto))
+
+def trigramas(token):
+    """Trigramas de un token con bordes marcados (ej: "  l", " le", "lec", ...)"""
+    relleno = f"  {token} "
+    return {relleno[i:i + 3] for i in range(len(relleno) - 2)}
+
+# ==========================================
+# ÍNDICE INVERTIDO
+# ==========================================
+
+class IndiceBusqueda:
+    """
+    Índice invertido construido una vez por snapshot del catálogo
+
+    PARÁMETROS:
+    - productos: lista de productos activos a indexar
+    - negocios: diccionario de negocios (para indexar el nombre del negocio)
+    - categorias: diccionario de categorías (para indexar el nombre de la categoría)
+    """
+
+    def __init__(self, productos, negocios=None, categorias=None):
+        negocios = negocios or {}
+        categorias = categorias or {}
+
+        # Las secuencias (ej: SeleccionProductos) se guardan tal cual, sin copiar
+        self.productos = productos if isinstance(productos, Sequence) else list(productos)
+        # token -> {posición del producto: peso acumulado}
+        self._postings = {}
+
+        for posicion, producto in enumerate(self.productos):
+            negocio = negocios.get(producto.get('negocio'), {})
+            categoria = categorias.get(producto.get('categoria'), {})
+            campos = (
+                (producto.get('nombre', ''), PESO_NOMBRE),
+                (categoria.get('nombre', producto.get('categoria', '')), PESO_CATEGORIA),
+                (negocio.get('nombre', producto.get('negocio', '')), PESO_NEGOCIO),
+            )
+            for texto, peso in campos:
+                for token in set(tokenizar(texto)):
+                    postings = self._postings.setdefault(token, {})
+                    postings[posicion] = postings.get(posicion, 0.0) + peso
+
+        # Vocabulario ordenado para búsquedas por prefijo con bisect
+        self._vocabulario = sorted(self._postings)
+
+        # Trigrama -> tokens del vocabulario que lo contienen
+        self._trigramas = {}
+        for token in self._vocabulario:
+            for trigrama in trigramas(token):
+                self._trigramas.setdefault(trigrama, []).append(token)
+
+    def _por_prefijo(self, prefijo):
+        inicio = bisect.bisect_left(self._vocabulario, prefijo)
+        tokens = []
+        for token in self._vocabulario[inicio:]:
+            if not token.startswith(prefijo):
+                break
+            tokens.append(token)
+        return tokens
+
+    def _aproximados(self, token):
+        if len(token) < LONGITUD_MINIMA_APROXIMADA:
+            return []
+        propios = trigramas(token)
+        compartidos = {}
+        for trigrama in propios:
+            for candidato in self._trigramas.get(trigrama, ()):
+                compartidos[candidato] = compartidos.get(candidato, 0) + 1
+
+        resultado = []
+        for candidato, comunes in compartidos.items():
+            similitud = comunes / (len(propios) + len(trigramas(candidato)) - comunes)
+            if similitud >= SIMILITUD_MINIMA:
+                resultado.append((candidato, similitud))
+        return resultado
+
+    def _puntajes_token(self, token):
+        """Puntaje por producto para un token de la consulta"""
+        puntajes = {}
+
+        def acumular(postings, factor):
+            for posicion, peso in postings.items():
+                valor = peso * factor
+                if valor > puntajes.get(posicion, 0.0):
+                    puntajes[posicion] = valor
+
+        for candidato in self._por_prefijo(token):
+            factor = FACTOR_EXACTO if candidato == token else FACTOR_PREFIJO
+            acumular(self._postings[candidato], factor)
+
+        # Tolerancia a errores: sólo si no hubo coincidencias exactas ni por prefijo
+        if not puntajes:
+            for candidato, similitud in self._aproximados(token):
+                acumular(self._postings[candidato], FACTOR_APROXIMADO * similitud)
+
+        return puntajes
+
+    def buscar(self, consulta, limite=None, desplazamiento=0):
+        """
+        Buscar productos que coincidan con todos los términos de la consulta
+
+        RETORNA:
+        - (total, [(producto, puntaje), ...]) ordenado por relevancia
+        """
+        tokens = tokenizar(consulta)
+        if not tokens:
+            return 0, []
+
+        acumulado = None
+        for token in dict.fromkeys(tokens):
+            puntajes = self._puntajes_token(token)
+            if acumulado is None:
+                acumulado = puntajes
+            else:
+                acumulado = {pos: acumulado[pos] + valor for pos, valor in puntajes.items() if pos in acumulado}
+            if not acumulado:
+                return 0, []
+
+        ordenados = sorted(
+            acumulado.items(),
+            key=lambda item: (-item[1], not self.productos[item[0]].get('destacado', False), item[0])
+        )
+        total = len(ordenados)
+        fin = None if limite is None else desplazamiento + limite
+        return total, [(self.productos[pos], round(puntaje, 4)) for pos, puntaje in ordenados[desplazamiento:fin]]
@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Carritos de compra del lado del servidor para Belgrano Ahorro
+Los carritos se guardan en la tabla carrito y los más usados se mantienen
+en una caché LRU en memoria
+
+Cada carrito se identifica con una clave (usuario_id, sesion_id):
+- usuarios logueados: (usuario_id, '')
+- visitantes: (0, identificador aleatorio guardado en la sesión)
+
+Hay dos modos de escritura:
+- Por defecto (varios procesos): cada cambio se escribe dentro del request,
+  solo las filas de los productos que cambiaron (INSERT ... ON CONFLICT), y
+  sube la versión del carrito en carrito_versiones. Antes de usar la copia
+  en caché se compara su versión con la de la base, así un proceso nunca
+  sirve ni pisa un carrito que otro proceso cambió.
+- Escritura diferida (CARRITOS_UN_PROCESO=1): los requests modifican la
+  caché y un temporizador vuelca los cambios a la base por lotes. La caché
+  no se compara con la base.
+
+MANTENIMIENTO:
+- CARRITOS_UN_PROCESO=1 solo si la aplicación corre en un único proceso
+  (ej: python app.py). Con varios workers la copia vieja de un proceso
+  reemplazaría los cambios más nuevos de otro (ej: un carrito vaciado al
+  confirmar el pedido volvería a aparecer), aun con demora_escritura=0
+"""
+
+import atexit
+import itertools
+import logging
+import os
+import secrets
+import sqlite3
+import threading
+from collections import OrderedDict
+
+import conexiones
+
+logger = logging.getLogger(__name__)
+
+# Carritos que se mantienen en memoria
+CAPACIDAD_CACHE = 5000
+# Escritura diferida: solo con un único proceso (ver MANTENIMIENTO)
+UN_PROCESO = os.environ.get('CARRITOS_UN_PROCESO', '0') == '1'
+# Segundos entre un cambio y su escritura en la base (escritura diferida)
+DEMORA_ESCRITURA = 2.0
+
+def clave_usuario(usuario_id):
+    """Clave del carrito de un usuario logueado"""
+    return (int(usuario_id), '')
+
+def clave_anonima(sesion_id):
+    """Clave del carrito de un visitante sin cuenta"""
+    return (0, sesion_id)
+
+def nuevo_sesion_id():
+    """Identificador aleatorio para el carrito de un visitante"""
+    return secrets.token_urlsafe(16)
+
+# ==========================================
+# ALMACÉN DE CARRITOS
+# ==========================================
+
+class AlmacenCarritos:
+    """
+    Carritos de la tabla carrito con caché LRU en memoria
+
+    Los carritos son diccionarios {producto_id (str): cantidad}. Las lecturas
+    devuelven copias. Cada carrito tiene una versión que cambia con cada
+    modificación, para memoizar cálculos sobre el carrito.
+
+    PARÁMETROS:
+    - pool: pool de la base (conexiones.pool)
+    - un_proceso: escritura diferida; la versión es la del proceso y la
+      caché no se compara con la base. Un carrito pendiente que sale de la
+      caché se conserva aparte hasta que se escribe, así nunca se pierde un
+      cambio.
+    - demora_escritura: segundos hasta la escritura diferida (0: en el momento)
+    """
+
+    def __init__(self, pool=conexiones.pool, capacidad=CAPACIDAD_CACHE, un_proceso=UN_PROCESO,
+                 demora_escritura=DEMORA_ESCRITURA):
+        self.pool = pool
+        self.capacidad = capacidad
+        self.un_proceso = un_proceso
+        self.demora_escritura = demora_escritura
+        self._lock = threading.Lock()
+        # Serializa las escrituras diferidas para que se apliquen en orden
+        self._lock_escritura = threading.Lock()
+        self._cache = OrderedDict()
+        self._versiones = {}
+        self._contador_versiones = itertools.count(1)
+        self._pendientes = set()
+        self._desalojados = {}
+        self._temporizador = None
+
+    # ------------------------------------------
+    # Base de datos
+    # ------------------------------------------
+
+    def _leer(self, conn, clave):
+        filas = conn.execute(
+            "SELECT producto_id, cantidad FROM carrito WHERE usuario_id = ? AND sesion_id = ? ORDER BY id",
+            clave).fetchall()
+        return {str(producto_id): cantidad for producto_id, cantidad in filas}
+
+    def _version(self, conn, clave):
+        fila = conn.execute("SELECT version FROM carrito_versiones WHERE usuario_id = ? AND sesion_id = ?",
+                            clave).fetchone()
+        return fila[0] if fila else 0
+
+    def _escribir_cambios(self, conn, clave, anteriores, items, version):
+        """Escribir solo los productos que cambiaron y la versión nueva del carrito"""
+        usuario_id, sesion_id = clave
+        conn.executemany(
+            "INSERT INTO carrito (usuario_id, sesion_id, producto_id, cantidad) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (usuario_id, sesion_id, producto_id) DO UPDATE SET cantidad = excluded.cantidad",
+            [(usuario_id, sesion_id, producto_id, cantidad) for producto_id, cantidad in items.items()
+             if anteriores.get(producto_id) != cantidad])
+        conn.executemany(
+            "DELETE FROM carrito WHERE usuario_id = ? AND sesion_id = ? AND producto_id = ?",
+            [(usuario_id, sesion_id, producto_id) for producto_id in anteriores if producto_id not in items])
+        conn.execute(
+            "INSERT INTO carrito_versiones (usuario_id, sesion_id, version) VALUES (?, ?, ?) "
+            "ON CONFLICT (usuario_id, sesion_id) DO UPDATE SET version = excluded.version",
+            (usuario_id, sesion_id, version))
+
+    def guardar_pendientes(self):
+        """
+        Escribir en la base los carritos modificados (escritura diferida)
+
+        RETORNA:
+        - Cantidad de carritos escritos
+        """
+        with self._lock_escritura:
+            with self._lock:
+                if self._temporizador is not None:
+                    self._temporizador.cancel()
+                    self._temporizador = None
+                lote = {}
+                for clave in self._pendientes:
+                    items = self._cache.get(clave)
+                    lote[clave] = dict(items) if items is not None else self._desalojados.pop(clave, {})
+                self._pendientes.clear()
+            if not lote:
+                return 0
+
+            try:
+                with self.pool.transaccion() as conn:
+                    for clave, items in lote.items():
+                        self._escribir_cambios(conn, clave, self._leer(conn, clave), items,
+                                               self._version(conn, clave) + 1)
+            except sqlite3.Error as e:
+                logger.error(f"Error guardando carritos: {e}")
+                # Reintentar en la próxima escritura sin pisar cambios más nuevos
+                with self._lock:
+                    for clave, items in lote.items():
+                        if clave not in self._pendientes and clave not in self._cache:
+                            self._desalojados[clave] = items
+                        self._pendientes.add(clave)
+                    self._programar()
+                return 0
+
+        logger.debug(f"Carritos guardados: {len(lote)}")
+        return len(lote)
+
+    def _programar(self):
+        """Programar la escritura diferida (llamar con self._lock tomado)"""
+        if self._temporizador is not None:
+            return
+        self._temporizador = threading.Timer(self.demora_escritura, self._al_vencer_temporizador)
+        self._temporizador.daemon = True
+        self._temporizador.start()
+
+    def _al_vencer_temporizador(self):
+        try:
+            with self._lock:
+                self._temporizador = None
+            self.guardar_pendientes()
+        except Exception as e:
+            logger.error(f"Error en la escritura diferida de carritos: {e}")
+
+    # ------------------------------------------
+    # Caché
+    # ------------------------------------------
+
+    def _items(self, clave):
+        """(items, versión) del carrito; llamar sin self._lock. No modificar los items."""
+        if not self.un_proceso:
+            return self._items_de_la_base(clave)
+
+        with self._lock:
+            items = self._cache.get(clave)
+            if items is not None:
+                self._cache.move_to_end(clave)
+                return items, self._versiones[clave]
+            if clave in self._desalojados:
+                items = self._guardar_en_cache(clave, self._desalojados.pop(clave))
+                return items, self._versiones[clave]
+
+        try:
+            with self.pool.conexion() as conn:
+                leidos = self._leer(conn, clave)
+        except sqlite3.Error as e:
+            logger.error(f"Error leyendo carrito {clave}: {e}")
+            leidos = {}
+
+        with self._lock:
+            # Otro request pudo cargarlo mientras se leía la base
+            items = self._cache.get(clave)
+            if items is None:
+                if clave in self._desalojados:
+                    leidos = self._desalojados.pop(clave)
+                items = self._guardar_en_cache(clave, leidos)
+            return items, self._versiones[clave]
+
+    def _items_de_la_base(self, clave):
+        """Carrito de la caché si su versión sigue siendo la de la base; si no, leído de la base"""
+        try:
+            with self.pool.lectura() as conn:
+                version = self._version(conn, clave)
+                with self._lock:
+                    if self._versiones.get(clave) == version:
+                        self._cache.move_to_end(clave)
+                        return self._cache[clave], version
+                items = self._leer(conn, clave)
+        except sqlite3.Error as e:
+            logger.error(f"Error leyendo carrito {clave}: {e}")
+            return {}, None
+        with self._lock:
+            self._guardar_en_cache(clave, items, version)
+        return items, version
+
+    def _guardar_en_cache(self, clave, items, version=None):
+        """Guardar el carrito en la caché (llamar con self._lock tomado)"""
+        if version is None:
+            version = next(self._contador_versiones)
+        elif self._versiones.get(clave, -1) > version:
+            # Otro request ya dejó una versión más nueva
+            return items
+        self._cache[clave] = items
+        self._cache.move_to_end(clave)
+        self._versiones[clave] = version
+        while len(self._cache) > self.capacidad:
+            desalojada, contenido = self._cache.popitem(last=False)
+            del self._versiones[desalojada]
+            if desalojada in self._pendientes:
+                self._desalojados[desalojada] = contenido
+        return items
+
+    def _modificar(self, clave, cambio):
+        """Aplicar cambio(items) sobre el carrito y escribirlo (o programar su escritura)"""
+        if not self.un_proceso:
+            return self._modificar_en_la_base(clave, cambio)
+
+        self._items(clave)
+        with self._lock:
+            items = self._cache.get(clave)
+            if items is None:
+                items = self._guardar_en_cache(clave, self._desalojados.pop(clave, {}))
+            resultado = cambio(items)
+            self._versiones[clave] = next(self._contador_versiones)
+            self._pendientes.add(clave)
+            if self.demora_escritura > 0:
+                self._programar()
+        if self.demora_escritura <= 0:
+            self.guardar_pendientes()
+        return resultado
+
+    def _modificar_en_la_base(self, clave, cambio):
+        """
+        Aplicar cambio(items) dentro de una transacción de escritura
+
+        El lock de escritura (BEGIN IMMEDIATE) hace que el carrito no cambie
+        entre la lectura de su versión y la escritura de la siguiente.
+        """
+        try:
+            with self.pool.transaccion() as conn:
+                version = self._version(conn, clave)
+                with self._lock:
+                    anteriores = self._cache.get(clave) if self._versiones.get(clave) == version else None
+                if anteriores is None:
+                    anteriores = self._leer(conn, clave)
+                items = dict(anteriores)
+                resultado = cambio(items)
+                if items != anteriores:
+                    version += 1
+                    self._escribir_cambios(conn, clave, anteriores, items, version)
+        except sqlite3.Error as e:
+            logger.error(f"Error guardando carrito {clave}: {e}")
+            raise
+        with self._lock:
+            self._guardar_en_cache(clave, items, version)
+        return resultado
+
+    # ------------------------------------------
+    # Operaciones
+    # ------------------------------------------
+
+    def obtener(self, clave):
+        """Copia del carrito {producto_id: cantidad} (vacío si no existe)"""
+        return self.obtener_con_version(clave)[0]
+
+    def obtener_con_version(self, clave):
+        """
+        Copia del carrito junto con su versión
+
+        RETORNA:
+        - (items, version): la versión cambia cada vez que el carrito se
+          modifica (con escritura diferida, también al volver a cargarlo)
+        """
+        items, version = self._items(clave)
+        with self._lock:
+            return dict(items), version
+
+    def cantidad_productos(self, clave):
+        """Cantidad de productos distintos en el carrito"""
+        return len(self._items(clave)[0])
+
+    def agregar(self, clave, producto_id, cantidad=1):
+        """
+        Sumar unidades de un producto al carrito
+
+        RETORNA:
+        - Cantidad de productos distintos en el carrito
+        """
+        producto_id = str(producto_id)
+
+        def cambio(items):
+            items[producto_id] = items.get(producto_id, 0) + cantidad
+            return len(items)
+        return self._modificar(clave, cambio)
+
+    def actualizar(self, clave, producto_id, cantidad):
+        """
+        Fijar la cantidad de un producto (cantidad <= 0 lo quita)
+
+        RETORNA:
+        - True si el carrito cambió
+        """
+        producto_id = str(producto_id)
+
+        def cambio(items):
+            if cantidad > 0:
+                items[producto_id] = cantidad
+                return True
+            return items.pop(producto_id, None) is not None
+        return self._modificar(clave, cambio)
+
+    def aplicar(self, clave, operaciones):
+        """
+        Aplicar un lote de cambios al carrito de una sola vez (una versión
+        nueva y una escritura)
+
+        PARÁMETROS:
+        - operaciones: [(accion, producto_id, cantidad)] con accion 'agregar'
+          (suma unidades), 'fijar' (cantidad <= 0 lo quita) o 'quitar';
+          se aplican en orden y deben venir validadas
+
+        RETORNA:
+        - Cantidad de productos distintos en el carrito
+        """
+        def cambio(items):
+            for accion, producto_id, cantidad in operaciones:
+                producto_id = str(producto_id)
+                if accion == 'agregar':
+                    cantidad = items.get(producto_id, 0) + cantidad
+                elif accion == 'quitar':
+                    cantidad = 0
+                if cantidad > 0:
+                    items[producto_id] = cantidad
+                else:
+                    items.pop(producto_id, None)
+            return len(items)
+        return self._modificar(clave, cambio)
+
+    def vaciar(self, clave):
+        """Quitar todos los productos del carrito"""
+        self._modificar(clave, lambda items: items.clear())
+
+    def fusionar(self, origen, destino):
+        """
+        Pasar los productos del carrito origen al destino (sumando cantidades)
+        y vaciar el origen. Se usa al iniciar sesión con un carrito anónimo.
+
+        RETORNA:
+        - Cantidad de productos distintos en el carrito destino
+        """
+        if origen == destino:
+            return self.cantidad_productos(destino)
+        items_origen = self.obtener(origen)
+        if not items_origen:
+            return self.cantidad_productos(destino)
+
+        def cambio(items):
+            for producto_id, cantidad in items_origen.items():
+                items[producto_id] = items.get(producto_id, 0) + cantidad
+            return len(items)
+        cantidad = self._modificar(destino, cambio)
+        self.vaciar(origen)
+        logger.info(f"Carrito {origen} fusionado en {destino}: {len(items_origen)} productos")
+        return cantidad
+
+# Instancia global del proceso; los cambios pendientes se escriben al salir
+carritos = AlmacenCarritos()
+atexit.register(carritos.guardar_pendientes)
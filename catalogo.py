@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Catálogo de productos en memoria para Belgrano Ahorro
+Carga el catálogo (tablas SQLite importadas desde productos.json, compiladas a
+un snapshot binario mapeado en memoria) una sola vez por proceso, mantiene
+índices precalculados y se recarga de forma atómica sólo cuando el catálogo cambia
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+import catalogo_db
+import conexiones
+import snapshot_catalogo
+from busqueda import IndiceBusqueda
+from catalogo_compacto import ColumnasProductos
+
+logger = logging.getLogger(__name__)
+
+# Máximo de respuestas serializadas que guarda cada snapshot
+MAX_RESPUESTAS_POR_SNAPSHOT = 512
+
+# ==========================================
+# SNAPSHOT INMUTABLE DEL CATÁLOGO
+# ==========================================
+
+class IndiceCatalogo:
+    """
+    Snapshot del catálogo con índices precalculados
+
+    Los diccionarios y listas expuestos son compartidos entre requests:
+    deben tratarse como de solo lectura. Los productos son vistas sobre
+    columnas compactas (ProductoVista / SeleccionProductos): se usan como
+    diccionarios y listas, pero hay que convertirlos con dict() para jsonify.
+    """
+
+    def __init__(self, datos, version=0, firma=''):
+        self.version = version
+        self.firma = firma
+
+        self.negocios = datos.get('negocios', {})
+        self.categorias = datos.get('categorias', {})
+        self.sucursales = datos.get('sucursales', {})
+        self.ofertas = datos.get('ofertas', {})
+
+        # Productos por columnas (ver catalogo_compacto.py): datos['productos'] puede
+        # ser un generador, así nunca están todos los diccionarios en memoria a la vez,
+        # o columnas ya armadas (ej: mapeadas desde snapshot_catalogo.py)
+        productos = datos.get('productos', [])
+        self.columnas = productos if isinstance(productos, ColumnasProductos) else ColumnasProductos(productos)
+        columnas = self.columnas
+        self.productos = columnas.seleccion(range(len(columnas)))
+        self.datos = dict(datos, productos=self.productos)
+
+        # Índices: producto() incluye inactivos (igual que la búsqueda por ID original),
+        # el resto sólo contiene productos activos
+        self.activos = columnas.seleccion(columnas.filas_activas)
+        self.por_negocio = {clave: columnas.seleccion(filas) for clave, filas in columnas.filas_negocio.items()}
+        self.por_categoria = {clave: columnas.seleccion(filas) for clave, filas in columnas.filas_categoria.items()}
+        self.por_sucursal = {clave: columnas.seleccion(filas) for clave, filas in columnas.filas_sucursal.items()}
+        self.destacados = columnas.seleccion(columnas.filas_destacadas)
+
+        # Índice de búsqueda de texto sobre los productos activos (se arma en la primera búsqueda)
+        self._busqueda = None
+        self._lock_busqueda = threading.Lock()
+
+        # Respuestas ya serializadas para este snapshot: clave -> (cuerpo, etag, variante)
+        self._respuestas = {}
+
+    @property
+    def busqueda(self):
+        """Índice de búsqueda de texto (ver busqueda.py)"""
+        if self._busqueda is None:
+            with self._lock_busqueda:
+                if self._busqueda is None:
+                    self._busqueda = IndiceBusqueda(self.activos, self.negocios, self.categorias)
+        return self._busqueda
+
+    def producto(self, producto_id):
+        """Buscar un producto por ID (acepta int o str)"""
+        fila = self.columnas.fila(producto_id)
+        return None if fila is None else self.columnas.vista(fila)
+
+    def productos_por_ids(self, producto_ids):
+        """Buscar varios productos por ID de una vez (None en los que no existen)"""
+        columnas = self.columnas
+        return [None if fila is None else columnas.vista(fila) for fila in columnas.filas(producto_ids)]
+
+    def respuesta(self, clave, construir, variante=None):
+        """
+        Serializar una sola vez por snapshot el resultado de construir(self)
+
+        PARÁMETROS:
+        - variante: dato que cambia la respuesta además del catálogo (ej: la
+          versión del stock); si cambia se vuelve a serializar y reemplaza
+          a la guardada
+
+        RETORNA:
+        - (cuerpo JSON en bytes, etag fuerte)
+
+        El etag depende sólo del hash de productos.json, de la clave y de la
+        variante, así que todos los procesos de la aplicación publican el
+        mismo valor.
+        """
+        guardada = self._respuestas.get(clave)
+        if guardada is not None and guardada[2] == variante:
+            return guardada[:2]
+
+        cuerpo = json.dumps(construir(self), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        etag = hashlib.sha1(f"{self.firma}:{clave!r}:{variante!r}".encode('utf-8')).hexdigest()
+        if guardada is not None or len(self._respuestas) < MAX_RESPUESTAS_POR_SNAPSHOT:
+            self._respuestas[clave] = (cuerpo, etag, variante)
+        return cuerpo, etag
+
+# ==========================================
+# CATÁLOGO CON RECARGA EN CALIENTE
+# ==========================================
+
+class CatalogoProductos:
+    """
+    Catálogo compartido por todo el proceso
+
+    PARÁMETROS:
+    - ruta: archivo JSON con negocios, sucursales, categorías, ofertas y productos
+    - intervalo_verificacion: segundos entre chequeos de cambios
+    - pool: pool de la base donde vive el catálogo (ver catalogo_db.py)
+    - ruta_snapshot: snapshot binario compartido entre procesos (ver
+      snapshot_catalogo.py); None para armar el catálogo en memoria
+
+    MANTENIMIENTO:
+    - La fuente de verdad son las tablas del catálogo en SQLite; productos.json
+      es el formato de edición/intercambio
+    - Editar productos.json alcanza: el cambio se detecta por mtime/tamaño, se
+      confirma por hash y se reimporta a la base; todos los procesos ven la
+      nueva versión al leer catalogo_meta
+    - Cada versión se compila una sola vez a un snapshot binario que todos los
+      workers mapean en memoria (las páginas se comparten entre procesos)
+    - Si el JSON nuevo es inválido se sigue sirviendo el último snapshot válido
+    - Si la base no está disponible se lee productos.json directamente
+    """
+
+    def __init__(self, ruta='productos.json', intervalo_verificacion=2.0, pool=conexiones.pool,
+                 ruta_snapshot=snapshot_catalogo.ARCHIVO_SNAPSHOT):
+        self.ruta = ruta
+        self.pool = pool
+        self.ruta_snapshot = ruta_snapshot
+        self.intervalo_verificacion = intervalo_verificacion
+        self._lock = threading.Lock()
+        self._indice = None
+        self._firma_archivo = None
+        self._firma_contenido = None
+        self._ultima_verificacion = 0.0
+        self._version = 0
+
+    def obtener(self):
+        """Devolver el snapshot vigente, recargando si el catálogo cambió"""
+        indice = self._indice
+        if indice is not None and time.monotonic() - self._ultima_verificacion < self.intervalo_verificacion:
+            return indice
+        return self._verificar()
+
+    def recargar(self):
+        """Forzar la verificación del archivo en la próxima lectura"""
+        self._ultima_verificacion = 0.0
+        return self.obtener()
+
+    def _verificar(self):
+        with self._lock:
+            ahora = time.monotonic()
+            if self._indice is not None and ahora - self._ultima_verificacion < self.intervalo_verificacion:
+                return self._indice
+            self._ultima_verificacion = ahora
+
+            contenido = self._leer_si_cambio()
+            try:
+                return self._sincronizar_base(contenido)
+            except sqlite3.Error as e:
+                logger.error(f"Error accediendo al catálogo en {self.pool.ruta_db}, se usa {self.ruta}: {e}")
+                # Reintentar la importación en la próxima verificación (ej: base sin migrar)
+                self._firma_archivo = None
+                return self._cargar_desde_json(contenido)
+
+    def _leer_si_cambio(self):
+        """Contenido de productos.json si cambió desde la última lectura (si no, None)"""
+        try:
+            estado = os.stat(self.ruta)
+        except OSError:
+            return None
+
+        firma_archivo = (estado.st_mtime_ns, estado.st_size)
+        if firma_archivo == self._firma_archivo:
+            return None
+        try:
+            with open(self.ruta, 'rb') as f:
+                contenido = f.read()
+        except OSError as e:
+            logger.error(f"Error al leer {self.ruta}: {e}")
+            return None
+        self._firma_archivo = firma_archivo
+        return contenido
+
+    def _sincronizar_base(self, contenido):
+        with self.pool.conexion() as conn:
+            if contenido is not None:
+                firma = hashlib.sha1(contenido).hexdigest()
+                if firma != catalogo_db.leer_meta(conn, 'firma'):
+                    try:
+                        datos = json.loads(contenido.decode('utf-8'))
+                    except ValueError as e:
+                        logger.error(f"Error al parsear {self.ruta}, se mantiene la versión anterior: {e}")
+                        datos = None
+                    if datos is not None:
+                        version = catalogo_db.importar_datos(conn, datos, firma, solo_si_cambia=True)
+                        logger.info(f"{self.ruta} importado al catálogo en la base (versión {version})")
+
+            version = int(catalogo_db.leer_meta(conn, 'version') or 0)
+            if self._indice is not None and self._indice.version == version:
+                return self._indice
+
+            firma = catalogo_db.leer_meta(conn, 'firma') or ''
+            # Reemplazo atómico: los lectores ven el snapshot viejo o el nuevo, nunca uno a medio armar
+            self._indice = self._abrir_snapshot(conn, version, firma)
+            self._version = version
+            logger.info(f"Catálogo cargado (versión {version}): {len(self._indice.productos)} productos")
+            return self._indice
+
+    def _abrir_snapshot(self, conn, version, firma):
+        """
+        Snapshot de la versión indicada, mapeado desde el archivo compartido
+
+        Si el archivo no existe o es de otra versión, un solo proceso lo compila
+        desde la base y lo publica; los demás esperan el bloqueo y lo mapean.
+        """
+        if not self.ruta_snapshot:
+            return self._indice_desde_base(conn, version, firma)
+
+        abierto = snapshot_catalogo.abrir_snapshot(self.ruta_snapshot, version, firma)
+        if abierto is None:
+            try:
+                with snapshot_catalogo.bloqueo_publicacion(self.ruta_snapshot):
+                    abierto = snapshot_catalogo.abrir_snapshot(self.ruta_snapshot, version, firma)
+                    if abierto is None:
+                        indice = self._indice_desde_base(conn, version, firma)
+                        snapshot_catalogo.publicar_snapshot(self.ruta_snapshot, indice.datos,
+                                                            indice.columnas, version, firma)
+                        abierto = snapshot_catalogo.abrir_snapshot(self.ruta_snapshot, version, firma)
+            except OSError as e:
+                logger.error(f"No se pudo publicar el snapshot del catálogo en {self.ruta_snapshot}: {e}")
+            if abierto is None:
+                return self._indice_desde_base(conn, version, firma)
+
+        datos, version, firma = abierto
+        return IndiceCatalogo(datos, version, firma)
+
+    def _indice_desde_base(self, conn, version, firma):
+        datos = catalogo_db.leer_secciones(conn)
+        datos['productos'] = catalogo_db.iterar_productos(conn)
+        return IndiceCatalogo(datos, version, firma)
+
+    def _cargar_desde_json(self, contenido):
+        """Modo de respaldo sin base de datos: parsear productos.json en memoria"""
+        if contenido is None:
+            # El archivo no cambió o no se pudo leer: forzar la lectura en el próximo intento
+            self._firma_archivo = None
+            return self._indice_o_vacio()
+
+        firma = hashlib.sha1(contenido).hexdigest()
+        if self._indice is not None and firma == self._indice.firma:
+            return self._indice
+        try:
+            datos = json.loads(contenido.decode('utf-8'))
+        except ValueError as e:
+            logger.error(f"Error al parsear {self.ruta}, se mantiene la versión anterior: {e}")
+            return self._indice_o_vacio()
+
+        self._version += 1
+        self._indice = IndiceCatalogo(datos, self._version, firma)
+        logger.info(f"Catálogo cargado desde {self.ruta} (versión {self._version}): {len(self._indice.productos)} productos")
+        return self._indice
+
+    def _indice_o_vacio(self):
+        if self._indice is None:
+            self._indice = IndiceCatalogo({}, self._version, '')
+        return self._indice
+
+# Instancia global del catálogo
+catalogo = CatalogoProductos()
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Representación compacta de los productos del catálogo de Belgrano Ahorro
+Guarda los productos por columnas (arrays de precio, stock y banderas, IDs y
+textos internados) con máscaras de bits por negocio, categoría y sucursal.
+Los llamadores reciben vistas de solo lectura con interfaz de diccionario.
+"""
+
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from collections.abc import Mapping, Sequence
+from itertools import chain
+
+# Bits de la columna 'banderas'
+ACTIVO = 1
+DESTACADO = 2
+
+_ENTERO_MINIMO = -2 ** 63
+_ENTERO_MAXIMO = 2 ** 63 - 1
+
+# Estado de ColumnasProductos por tipo de atributo (ver snapshot_catalogo.py)
+ATRIBUTOS_ARRAY = ('id', 'precio', 'precio_original', 'stock', 'negocio', 'categoria', 'sucursales',
+                   'banderas', 'forma', 'filas_activas', 'filas_destacadas',
+                   '_ids_ordenados', '_filas_ordenadas', '_orden_precio', '_precios_ordenados')
+ATRIBUTOS_TEXTO = ('nombre', 'imagen')
+ATRIBUTOS_FILAS_POR_CLAVE = ('filas_negocio', 'filas_categoria', 'filas_sucursal')
+ATRIBUTOS_MASCARA = ('mascara_activos', 'mascara_destacado', 'mascara_en_stock', 'mascara_rebajado')
+ATRIBUTOS_MASCARAS_POR_CLAVE = ('mascaras_negocio', 'mascaras_categoria', 'mascaras_sucursal')
+ATRIBUTOS_VALORES = ('tipos_forma', 'valores_negocio', 'valores_categoria', 'combinaciones_sucursales',
+                     'extra', '_filas_id_texto')
+
+# ==========================================
+# MÁSCARAS DE BITS
+# ==========================================
+# Una máscara es un int de Python con el bit N en 1 si la fila N pertenece al
+# conjunto: los filtros se combinan con & | ~ y se cuentan con popcount()
+# (int.bit_count() recién existe desde Python 3.10)
+
+if hasattr(int, 'bit_count'):
+    def popcount(mascara):
+        """Cantidad de filas de la máscara"""
+        return mascara.bit_count()
+else:
+    def popcount(mascara):
+        """Cantidad de filas de la máscara"""
+        return bin(mascara).count('1')
+
+def mascara_desde_filas(filas, total):
+    """Construir la máscara de un conjunto de filas"""
+    bits = bytearray((total + 7) // 8)
+    for fila in filas:
+        bits[fila >> 3] |= 1 << (fila & 7)
+    return int.from_bytes(bits, 'little')
+
+def primeras_filas(mascara, cantidad, desde=-1):
+    """Las primeras `cantidad` filas de la máscara posteriores a `desde`"""
+    if desde >= 0:
+        mascara = mascara >> (desde + 1) << (desde + 1)
+    filas = []
+    while mascara and len(filas) < cantidad:
+        bajo = mascara & -mascara
+        filas.append(bajo.bit_length() - 1)
+        mascara ^= bajo
+    return filas
+
+def primera_fila(mascara):
+    """Fila más baja de una máscara no vacía"""
+    return (mascara & -mascara).bit_length() - 1
+
+# ==========================================
+# LECTURA DE CAMPOS
+# ==========================================
+
+def _tipo_columna(clave, valor):
+    """Columna (y tipo) donde se guarda un campo, o None si va a 'extra'"""
+    if clave in ('nombre', 'imagen'):
+        return clave if isinstance(valor, str) else None
+    if clave in ('negocio', 'categoria'):
+        return clave if valor is None or isinstance(valor, str) else None
+    if isinstance(valor, bool):
+        return clave if clave in ('activo', 'destacado') else None
+    if clave in ('id', 'stock'):
+        return clave if isinstance(valor, int) and _ENTERO_MINIMO <= valor <= _ENTERO_MAXIMO else None
+    if clave in ('precio', 'precio_original'):
+        if isinstance(valor, int) and abs(valor) <= 2 ** 53:
+            return f'{clave}:int'
+        if isinstance(valor, float):
+            return f'{clave}:float'
+        return None
+    if clave == 'sucursales':
+        return clave if isinstance(valor, list) and all(isinstance(s, str) for s in valor) else None
+    return None
+
+_LECTORES = {
+    'id': lambda c, fila, clave: c.id[fila],
+    'nombre': lambda c, fila, clave: c.nombre[fila],
+    'imagen': lambda c, fila, clave: c.imagen[fila],
+    'precio:int': lambda c, fila, clave: int(c.precio[fila]),
+    'precio:float': lambda c, fila, clave: c.precio[fila],
+    'precio_original:int': lambda c, fila, clave: int(c.precio_original[fila]),
+    'precio_original:float': lambda c, fila, clave: c.precio_original[fila],
+    'stock': lambda c, fila, clave: c.stock[fila],
+    'negocio': lambda c, fila, clave: c.valores_negocio[c.negocio[fila]],
+    'categoria': lambda c, fila, clave: c.valores_categoria[c.categoria[fila]],
+    'activo': lambda c, fila, clave: bool(c.banderas[fila] & ACTIVO),
+    'destacado': lambda c, fila, clave: bool(c.banderas[fila] & DESTACADO),
+    'sucursales': lambda c, fila, clave: list(c.combinaciones_sucursales[c.sucursales[fila]]),
+    None: lambda c, fila, clave: c.extra[fila][clave],
+}
+
+def _numero(valor, defecto=0.0):
+    """Valor numérico para filtrar/ordenar (defecto si no es un número)"""
+    if isinstance(valor, (int, float)) and not isinstance(valor, bool):
+        return float(valor)
+    return defecto
+
+# ==========================================
+# VISTAS CON INTERFAZ DE DICCIONARIO
+# ==========================================
+
+class ProductoVista(Mapping):
+    """
+    Producto de solo lectura que lee sus campos de las columnas
+
+    Se comporta como el diccionario original (mismas claves, mismo orden y
+    mismos tipos) para .get(), [], in, iteración y en los templates.
+
+    MANTENIMIENTO:
+    - json.dumps / jsonify no aceptan Mapping: convertir con dict(producto)
+    - Para modificar un producto, copiarlo con dict(producto)
+    """
+
+    __slots__ = ('_columnas', '_fila')
+
+    def __init__(self, columnas, fila):
+        self._columnas = columnas
+        self._fila = fila
+
+    def _forma(self):
+        return self._columnas.formas[self._columnas.forma[self._fila]]
+
+    def __getitem__(self, clave):
+        lector = self._forma().get(clave)
+        if lector is None:
+            raise KeyError(clave)
+        return lector(self._columnas, self._fila, clave)
+
+    def get(self, clave, defecto=None):
+        lector = self._forma().get(clave)
+        if lector is None:
+            return defecto
+        return lector(self._columnas, self._fila, clave)
+
+    def __contains__(self, clave):
+        return clave in self._forma()
+
+    def __iter__(self):
+        return iter(self._forma())
+
+    def __len__(self):
+        return len(self._forma())
+
+    def __repr__(self):
+        return f"ProductoVista({dict(self)!r})"
+
+class SeleccionProductos(Sequence):
+    """
+    Lista de solo lectura de productos (filas de las columnas)
+
+    Se usa donde antes había listas de diccionarios: len(), índices, slices
+    e iteración devuelven ProductoVista.
+    """
+
+    __slots__ = ('_columnas', '_filas')
+
+    def __init__(self, columnas, filas):
+        self._columnas = columnas
+        self._filas = filas
+
+    def __getitem__(self, posicion):
+        if isinstance(posicion, slice):
+            return SeleccionProductos(self._columnas, self._filas[posicion])
+        return ProductoVista(self._columnas, self._filas[posicion])
+
+    def __iter__(self):
+        columnas = self._columnas
+        for fila in self._filas:
+            yield ProductoVista(columnas, fila)
+
+    def __len__(self):
+        return len(self._filas)
+
+    def __repr__(self):
+        return f"SeleccionProductos({len(self._filas)} productos)"
+
+# ==========================================
+# COLUMNAS DE PRODUCTOS
+# ==========================================
+
+class ColumnasProductos:
+    """
+    Productos del catálogo guardados por columnas
+
+    PARÁMETROS:
+    - productos: iterable de diccionarios con la estructura de productos.json
+      (se recorre una sola vez: puede ser un generador)
+
+    ATRIBUTOS:
+    - id, precio, precio_original, stock, banderas: arrays con una posición por fila
+    - negocio, categoria, sucursales: códigos sobre listas de valores internados
+    - tipos_forma / formas: claves de cada producto (y columna de cada clave),
+      compartidas por todos los productos con la misma estructura
+    - extra: {fila: {clave: valor}} para campos sin columna o con tipos atípicos
+    - mascara_*: máscaras de bits sobre los productos activos
+    - filas_*: filas de los productos activos por negocio, categoría y sucursal
+    """
+
+    def __init__(self, productos):
+        self.id = array('q')
+        self.nombre = []
+        self.imagen = []
+        self.precio = array('d')
+        self.precio_original = array('d')
+        self.stock = array('q')
+        self.negocio = array('I')
+        self.categoria = array('I')
+        self.sucursales = array('I')
+        self.banderas = array('B')
+        self.forma = array('I')
+        self.extra = {}
+
+        self.tipos_forma = []
+        self.valores_negocio = []
+        self.valores_categoria = []
+        self.combinaciones_sucursales = []
+        codigos_forma = {}
+        codigos_negocio = {}
+        codigos_categoria = {}
+        codigos_sucursales = {}
+        # IDs que no son enteros: str(id) -> fila
+        self._filas_id_texto = {}
+
+        self.filas_activas = array('I')
+        self.filas_negocio = {}
+        self.filas_categoria = {}
+        self.filas_sucursal = {}
+        self.filas_destacadas = array('I')
+        filas_en_stock = array('I')
+        filas_rebajadas = array('I')
+
+        def codigo(codigos, valores, valor):
+            resultado = codigos.get(valor)
+            if resultado is None:
+                resultado = codigos[valor] = len(valores)
+                valores.append(valor)
+            return resultado
+
+        for fila, producto in enumerate(productos):
+            tipos = tuple((clave, _tipo_columna(clave, valor)) for clave, valor in producto.items())
+            extra = {clave: producto[clave] for clave, tipo in tipos if tipo is None}
+            if extra:
+                self.extra[fila] = extra
+            columnas = {tipo.split(':')[0] for _, tipo in tipos if tipo is not None}
+
+            def valor(clave, defecto):
+                return producto[clave] if clave in columnas else defecto
+
+            self.forma.append(codigo(codigos_forma, self.tipos_forma, tipos))
+            self.id.append(valor('id', 0))
+            self.nombre.append(valor('nombre', ''))
+            imagen = valor('imagen', '')
+            self.imagen.append(sys.intern(imagen) if imagen else imagen)
+            precio = producto.get('precio', 0)
+            precio_original = producto.get('precio_original')
+            self.precio.append(_numero(precio))
+            self.precio_original.append(_numero(valor('precio_original', 0)))
+            self.stock.append(valor('stock', 0))
+
+            negocio_id = producto.get('negocio')
+            categoria_id = producto.get('categoria')
+            sucursales = producto.get('sucursales', [])
+            self.negocio.append(codigo(codigos_negocio, self.valores_negocio, valor('negocio', None)))
+            self.categoria.append(codigo(codigos_categoria, self.valores_categoria, valor('categoria', None)))
+            combinacion = tuple(sys.intern(s) for s in valor('sucursales', ()))
+            self.sucursales.append(codigo(codigos_sucursales, self.combinaciones_sucursales, combinacion))
+
+            activo = bool(producto.get('activo', True))
+            destacado = bool(producto.get('destacado', False))
+            self.banderas.append((ACTIVO if activo else 0) | (DESTACADO if destacado else 0))
+
+            if 'id' not in columnas:
+                self._filas_id_texto[str(producto.get('id'))] = fila
+
+            if not activo:
+                continue
+            self.filas_activas.append(fila)
+            self.filas_negocio.setdefault(negocio_id, array('I')).append(fila)
+            self.filas_categoria.setdefault(categoria_id, array('I')).append(fila)
+            for sucursal_id in sucursales:
+                self.filas_sucursal.setdefault((negocio_id, sucursal_id), array('I')).append(fila)
+            if destacado:
+                self.filas_destacadas.append(fila)
+            try:
+                if producto.get('stock', 0) > 0:
+                    filas_en_stock.append(fila)
+            except TypeError:
+                pass
+            try:
+                if precio_original and precio_original > precio:
+                    filas_rebajadas.append(fila)
+            except TypeError:
+                pass
+
+        self.total = len(self.forma)
+        self._preparar_formas()
+
+        # Búsqueda por ID: arrays ordenados (la última fila gana si hay IDs repetidos)
+        filas_id = sorted((fila for fila in range(self.total) if fila not in self._filas_id_texto),
+                          key=self.id.__getitem__)
+        self._ids_ordenados = array('q', (self.id[fila] for fila in filas_id))
+        self._filas_ordenadas = array('I', filas_id)
+
+        # Orden por precio de los activos (para filtrar por rango con bisect)
+        self._orden_precio = array('I', sorted(self.filas_activas, key=self.precio.__getitem__))
+        self._precios_ordenados = array('d', (self.precio[fila] for fila in self._orden_precio))
+
+        total = self.total
+        self.mascara_activos = mascara_desde_filas(self.filas_activas, total)
+        self.mascara_destacado = mascara_desde_filas(self.filas_destacadas, total)
+        self.mascara_en_stock = mascara_desde_filas(filas_en_stock, total)
+        self.mascara_rebajado = mascara_desde_filas(filas_rebajadas, total)
+        self.mascaras_negocio = {clave: mascara_desde_filas(filas, total) for clave, filas in self.filas_negocio.items()}
+        self.mascaras_categoria = {clave: mascara_desde_filas(filas, total) for clave, filas in self.filas_categoria.items()}
+        # Por sucursal sin importar el negocio (como el filtro 'sucursal' de consultas.py)
+        self.mascaras_sucursal = {}
+        for (_, sucursal_id), filas in self.filas_sucursal.items():
+            mascara = mascara_desde_filas(filas, total)
+            self.mascaras_sucursal[sucursal_id] = self.mascaras_sucursal.get(sucursal_id, 0) | mascara
+
+    @classmethod
+    def desde_atributos(cls, atributos):
+        """
+        Reconstruir las columnas a partir de su estado ya calculado
+
+        Los arrays pueden ser cualquier secuencia indexable (ej: memoryview de
+        un snapshot mapeado en memoria): no se copian.
+        """
+        columnas = cls.__new__(cls)
+        columnas.__dict__.update(atributos)
+        columnas.total = len(columnas.forma)
+        columnas._preparar_formas()
+        return columnas
+
+    def _preparar_formas(self):
+        self.formas = [{clave: _LECTORES[tipo] for clave, tipo in tipos} for tipos in self.tipos_forma]
+
+    def __len__(self):
+        return self.total
+
+    def vista(self, fila):
+        """Producto de una fila"""
+        return ProductoVista(self, fila)
+
+    def seleccion(self, filas):
+        """Lista de productos de las filas dadas"""
+        return SeleccionProductos(self, filas)
+
+    def fila(self, producto_id):
+        """Fila de un producto por ID (acepta int o str), None si no existe"""
+        clave = str(producto_id)
+        fila = self._filas_id_texto.get(clave)
+        if fila is not None:
+            return fila
+        try:
+            numero = int(clave)
+        except ValueError:
+            return None
+        if str(numero) != clave:
+            return None
+        posicion = bisect_right(self._ids_ordenados, numero) - 1
+        if posicion < 0 or self._ids_ordenados[posicion] != numero:
+            return None
+        return self._filas_ordenadas[posicion]
+
+    def filas(self, producto_ids):
+        """
+        Filas de varios productos por ID en una sola pasada por el índice
+
+        Los IDs numéricos se ordenan y se buscan avanzando sobre el índice
+        ordenado (cada búsqueda empieza donde terminó la anterior).
+
+        RETORNA:
+        - Lista de filas (None si el producto no existe) en el orden de producto_ids
+        """
+        resultado = [None] * len(producto_ids)
+        numericos = []
+        for posicion, producto_id in enumerate(producto_ids):
+            clave = str(producto_id)
+            fila = self._filas_id_texto.get(clave)
+            if fila is not None:
+                resultado[posicion] = fila
+                continue
+            try:
+                numero = int(clave)
+            except ValueError:
+                continue
+            if str(numero) == clave:
+                numericos.append((numero, posicion))
+
+        ids = self._ids_ordenados
+        desde = 0
+        for numero, posicion in sorted(numericos):
+            # Igual que fila(): si hay IDs repetidos gana la última fila
+            fin = bisect_right(ids, numero, desde)
+            if fin > desde and ids[fin - 1] == numero:
+                resultado[posicion] = self._filas_ordenadas[fin - 1]
+            desde = max(fin - 1, 0)
+        return resultado
+
+    def mascara_filas(self, filas):
+        """Máscara de un conjunto arbitrario de filas"""
+        return mascara_desde_filas(filas, self.total)
+
+    def mascara_precio(self, minimo=None, maximo=None):
+        """Productos activos con precio dentro del rango (inclusive)"""
+        precios = self._precios_ordenados
+        inicio = 0 if minimo is None else bisect_left(precios, minimo)
+        fin = len(precios) if maximo is None else bisect_right(precios, maximo)
+        if fin <= inicio:
+            return 0
+        if (fin - inicio) * 2 <= len(precios):
+            return mascara_desde_filas(self._orden_precio[inicio:fin], self.total)
+        # Rango amplio: marcar las filas que quedan afuera y complementar
+        afuera = mascara_desde_filas(chain(self._orden_precio[:inicio], self._orden_precio[fin:]), self.total)
+        return self.mascara_activos & ~afuera
+
+    def precios_extremos(self, mascara):
+        """(mínimo, máximo) de precio en la máscara, (None, None) si está vacía"""
+        if not mascara:
+            return None, None
+        bits = mascara.to_bytes((self.total + 7) // 8, 'little')
+
+        def incluida(fila):
+            return bits[fila >> 3] >> (fila & 7) & 1
+
+        orden = self._orden_precio
+        minimo = next(fila for fila in orden if incluida(fila))
+        maximo = next(fila for fila in reversed(orden) if incluida(fila))
+        return self.vista(minimo).get('precio', 0), self.vista(maximo).get('precio', 0)
@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Catálogo de Belgrano Ahorro en SQLite
+Esquema único para negocios, sucursales, categorías, ofertas y productos,
+con importación/exportación masiva desde y hacia productos.json
+
+USO:
+    python catalogo_db.py importar [productos.json]
+    python catalogo_db.py exportar [salida.json]
+"""
+
+import hashlib
+import json
+import logging
+import sqlite3
+import sys
+
+import conexiones
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_DB = conexiones.RUTA_DB
+ARCHIVO_JSON = 'productos.json'
+
+# Filas insertadas por lote en la importación
+TAMANO_LOTE = 500
+
+# ==========================================
+# ESQUEMA
+# ==========================================
+
+ESQUEMA_CATALOGO = '''
+CREATE TABLE IF NOT EXISTS negocios (
+    id VARCHAR(50) PRIMARY KEY,
+    numero INTEGER,
+    nombre VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    logo VARCHAR(255),
+    color VARCHAR(20),
+    activo BOOLEAN,
+    orden INTEGER NOT NULL,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS sucursales (
+    negocio_id VARCHAR(50) NOT NULL,
+    id VARCHAR(50) NOT NULL,
+    numero INTEGER,
+    nombre VARCHAR(100),
+    direccion TEXT,
+    telefono VARCHAR(30),
+    horarios TEXT,
+    activo BOOLEAN,
+    orden INTEGER NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (negocio_id, id),
+    FOREIGN KEY (negocio_id) REFERENCES negocios (id)
+);
+
+CREATE TABLE IF NOT EXISTS categorias (
+    id VARCHAR(50) PRIMARY KEY,
+    numero INTEGER,
+    nombre VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    icono VARCHAR(20),
+    orden INTEGER NOT NULL,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    precio NUMERIC NOT NULL,
+    precio_original NUMERIC,
+    imagen VARCHAR(255),
+    negocio_id VARCHAR(50),
+    categoria_id VARCHAR(50),
+    stock INTEGER,
+    destacado BOOLEAN,
+    activo BOOLEAN,
+    orden INTEGER NOT NULL,
+    extra TEXT,
+    FOREIGN KEY (negocio_id) REFERENCES negocios (id),
+    FOREIGN KEY (categoria_id) REFERENCES categorias (id)
+);
+
+CREATE TABLE IF NOT EXISTS producto_sucursal (
+    producto_id INTEGER NOT NULL,
+    negocio_id VARCHAR(50),
+    sucursal_id VARCHAR(50) NOT NULL,
+    orden INTEGER NOT NULL,
+    PRIMARY KEY (producto_id, sucursal_id),
+    FOREIGN KEY (producto_id) REFERENCES productos (id)
+);
+
+CREATE TABLE IF NOT EXISTS ofertas (
+    negocio_id VARCHAR(50) NOT NULL,
+    id VARCHAR(50) NOT NULL,
+    titulo VARCHAR(100),
+    descripcion TEXT,
+    descuento NUMERIC,
+    fecha_inicio DATE,
+    fecha_fin DATE,
+    activa BOOLEAN,
+    orden INTEGER NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (negocio_id, id)
+);
+
+CREATE TABLE IF NOT EXISTS oferta_productos (
+    negocio_id VARCHAR(50) NOT NULL,
+    oferta_id VARCHAR(50) NOT NULL,
+    producto_id INTEGER NOT NULL,
+    orden INTEGER NOT NULL,
+    PRIMARY KEY (negocio_id, oferta_id, orden)
+);
+
+CREATE TABLE IF NOT EXISTS catalogo_meta (
+    clave VARCHAR(50) PRIMARY KEY,
+    valor TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_productos_negocio ON productos (negocio_id, activo, orden);
+CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos (categoria_id, activo, orden);
+CREATE INDEX IF NOT EXISTS idx_productos_destacado ON productos (orden) WHERE destacado = 1;
+CREATE INDEX IF NOT EXISTS idx_productos_orden ON productos (orden);
+CREATE INDEX IF NOT EXISTS idx_producto_sucursal_sucursal ON producto_sucursal (negocio_id, sucursal_id);
+CREATE INDEX IF NOT EXISTS idx_ofertas_fechas ON ofertas (fecha_inicio, fecha_fin);
+CREATE INDEX IF NOT EXISTS idx_oferta_productos_producto ON oferta_productos (producto_id);
+'''
+
+# Campos con columna propia: (clave en productos.json, columna, tipo)
+# El resto de los campos se guarda en la columna extra (JSON) para no perder datos
+CAMPOS_NEGOCIO = (('id', 'numero', None), ('nombre', 'nombre', None), ('descripcion', 'descripcion', None),
+                  ('logo', 'logo', None), ('color', 'color', None), ('activo', 'activo', bool))
+CAMPOS_SUCURSAL = (('id', 'numero', None), ('nombre', 'nombre', None), ('direccion', 'direccion', None),
+                   ('telefono', 'telefono', None), ('horarios', 'horarios', None), ('activo', 'activo', bool))
+CAMPOS_CATEGORIA = (('id', 'numero', None), ('nombre', 'nombre', None), ('descripcion', 'descripcion', None),
+                    ('icono', 'icono', None))
+CAMPOS_OFERTA = (('id', 'id', None), ('titulo', 'titulo', None), ('descripcion', 'descripcion', None),
+                 ('descuento', 'descuento', None), ('fecha_inicio', 'fecha_inicio', None),
+                 ('fecha_fin', 'fecha_fin', None), ('activa', 'activa', bool))
+CAMPOS_PRODUCTO = (('id', 'id', None), ('nombre', 'nombre', None), ('precio', 'precio', None),
+                   ('precio_original', 'precio_original', None), ('imagen', 'imagen', None),
+                   ('negocio', 'negocio_id', None), ('categoria', 'categoria_id', None),
+                   ('stock', 'stock', None), ('destacado', 'destacado', bool), ('activo', 'activo', bool))
+
+def conectar(ruta_db=ARCHIVO_DB):
+    """Conexión al archivo de base de datos con el esquema del catálogo creado"""
+    conn = sqlite3.connect(ruta_db)
+    crear_tablas_catalogo(conn)
+    return conn
+
+def crear_tablas_catalogo(conn):
+    """
+    Crear las tablas del catálogo (idempotente)
+
+    La tabla productos original (store, original_price, discount) nunca se usó;
+    si existe se renombra a productos_legacy antes de crear la nueva.
+    """
+    columnas = [fila[1] for fila in conn.execute("PRAGMA table_info(productos)")]
+    if 'store' in columnas:
+        # legacy_alter_table evita reescribir las FOREIGN KEY de carrito y pedido_items
+        conn.execute("PRAGMA legacy_alter_table = ON")
+        conn.execute("ALTER TABLE productos RENAME TO productos_legacy")
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+        logger.info("Tabla productos anterior renombrada a productos_legacy")
+    conexiones.ejecutar_script(conn, ESQUEMA_CATALOGO)
+
+# ==========================================
+# CONVERSIÓN FILA <-> DICCIONARIO
+# ==========================================
+
+def _a_columnas(datos, campos):
+    """Separar un diccionario en valores de columnas y JSON de campos extra"""
+    valores = []
+    conocidos = set()
+    for clave, _columna, tipo in campos:
+        conocidos.add(clave)
+        valor = datos.get(clave)
+        if tipo is bool and valor is not None:
+            valor = 1 if valor else 0
+        valores.append(valor)
+    extra = {k: v for k, v in datos.items() if k not in conocidos}
+    valores.append(json.dumps(extra, ensure_ascii=False) if extra else None)
+    return valores
+
+def _a_diccionario(fila, campos):
+    """Reconstruir el diccionario original (las columnas NULL se omiten)"""
+    datos = {}
+    for (clave, _columna, tipo), valor in zip(campos, fila):
+        if valor is None:
+            continue
+        datos[clave] = bool(valor) if tipo is bool else valor
+    extra = fila[len(campos)]
+    if extra:
+        datos.update(json.loads(extra))
+    return datos
+
+def _columnas(campos):
+    return ', '.join(columna for _clave, columna, _tipo in campos) + ', extra'
+
+def _lotes(filas, tamano=TAMANO_LOTE):
+    lote = []
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+# ==========================================
+# IMPORTACIÓN
+# ==========================================
+
+def importar_datos(conn, datos, firma='', solo_si_cambia=False):
+    """
+    Reemplazar el catálogo completo en una sola transacción
+
+    PARÁMETROS:
+    - conn: conexión SQLite
+    - datos: diccionario con la estructura de productos.json
+    - firma: hash del archivo de origen (para detectar cambios)
+    - solo_si_cambia: no reimportar si la base ya tiene esa firma (varios
+      procesos pueden detectar el mismo cambio a la vez)
+
+    RETORNA:
+    - Versión del catálogo en la base (entero creciente)
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if solo_si_cambia and firma and leer_meta(conn, 'firma') == firma:
+            conn.rollback()
+            return int(leer_meta(conn, 'version') or 0)
+
+        for tabla in ('oferta_productos', 'ofertas', 'producto_sucursal', 'productos',
+                      'sucursales', 'categorias', 'negocios'):
+            conn.execute(f"DELETE FROM {tabla}")
+
+        conn.executemany(
+            f"INSERT INTO negocios (id, {_columnas(CAMPOS_NEGOCIO)}, orden) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ([negocio_id] + _a_columnas(negocio, CAMPOS_NEGOCIO) + [orden]
+             for orden, (negocio_id, negocio) in enumerate(datos.get('negocios', {}).items())))
+
+        conn.executemany(
+            f"INSERT INTO sucursales (negocio_id, id, {_columnas(CAMPOS_SUCURSAL)}, orden) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            ([negocio_id, sucursal_id] + _a_columnas(sucursal, CAMPOS_SUCURSAL) + [orden]
+             for orden, (negocio_id, sucursal_id, sucursal) in enumerate(
+                 (negocio_id, sucursal_id, sucursal)
+                 for negocio_id, sucursales in datos.get('sucursales', {}).items()
+                 for sucursal_id, sucursal in sucursales.items())))
+
+        conn.executemany(
+            f"INSERT INTO categorias (id, {_columnas(CAMPOS_CATEGORIA)}, orden) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            ([categoria_id] + _a_columnas(categoria, CAMPOS_CATEGORIA) + [orden]
+             for orden, (categoria_id, categoria) in enumerate(datos.get('categorias', {}).items())))
+
+        orden = 0
+        for negocio_id, ofertas in datos.get('ofertas', {}).items():
+            for oferta in ofertas:
+                orden += 1
+                sin_productos = {k: v for k, v in oferta.items() if k != 'productos'}
+                conn.execute(
+                    f"INSERT INTO ofertas (negocio_id, {_columnas(CAMPOS_OFERTA)}, orden) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    [negocio_id] + _a_columnas(sin_productos, CAMPOS_OFERTA) + [orden])
+                conn.executemany(
+                    "INSERT INTO oferta_productos (negocio_id, oferta_id, producto_id, orden) VALUES (?, ?, ?, ?)",
+                    [(negocio_id, oferta.get('id'), producto_id, i)
+                     for i, producto_id in enumerate(oferta.get('productos', []))])
+
+        def filas_productos():
+            for orden, producto in enumerate(datos.get('productos', [])):
+                sin_sucursales = {k: v for k, v in producto.items() if k != 'sucursales'}
+                yield _a_columnas(sin_sucursales, CAMPOS_PRODUCTO) + [orden]
+
+        def filas_sucursales():
+            for producto in datos.get('productos', []):
+                for orden, sucursal_id in enumerate(producto.get('sucursales', [])):
+                    yield (producto.get('id'), producto.get('negocio'), sucursal_id, orden)
+
+        consulta_productos = f"INSERT INTO productos ({_columnas(CAMPOS_PRODUCTO)}, orden) VALUES ({', '.join('?' * (len(CAMPOS_PRODUCTO) + 2))})"
+        for lote in _lotes(filas_productos()):
+            conn.executemany(consulta_productos, lote)
+        for lote in _lotes(filas_sucursales()):
+            conn.executemany(
+                "INSERT INTO producto_sucursal (producto_id, negocio_id, sucursal_id, orden) VALUES (?, ?, ?, ?)", lote)
+
+        version = int(leer_meta(conn, 'version') or 0) + 1
+        conn.executemany("INSERT OR REPLACE INTO catalogo_meta (clave, valor) VALUES (?, ?)",
+                         [('version', str(version)), ('firma', firma)])
+        conn.commit()
+        return version
+    except Exception:
+        conn.rollback()
+        raise
+
+def importar_json(ruta_json=ARCHIVO_JSON, ruta_db=ARCHIVO_DB):
+    """Importar productos.json a la base de datos (retorna la nueva versión)"""
+    with open(ruta_json, 'rb') as f:
+        contenido = f.read()
+    conn = conectar(ruta_db)
+    try:
+        version = importar_datos(conn, json.loads(contenido.decode('utf-8')), hashlib.sha1(contenido).hexdigest())
+        logger.info(f"Catálogo importado desde {ruta_json} (versión {version})")
+        return version
+    finally:
+        conn.close()
+
+def leer_meta(conn, clave):
+    fila = conn.execute("SELECT valor FROM catalogo_meta WHERE clave = ?", (clave,)).fetchone()
+    return fila[0] if fila else None
+
+# ==========================================
+# LECTURA Y EXPORTACIÓN
+# ==========================================
+
+def iterar_productos(conn):
+    """Productos en el orden original, uno a la vez"""
+    sucursales = {}
+    for producto_id, sucursal_id in conn.execute(
+            "SELECT producto_id, sucursal_id FROM producto_sucursal ORDER BY producto_id, orden"):
+        sucursales.setdefault(producto_id, []).append(sucursal_id)
+
+    cursor = conn.execute(f"SELECT {_columnas(CAMPOS_PRODUCTO)} FROM productos ORDER BY orden")
+    while True:
+        filas = cursor.fetchmany(TAMANO_LOTE)
+        if not filas:
+            break
+        for fila in filas:
+            producto = _a_diccionario(fila, CAMPOS_PRODUCTO)
+            if producto.get('id') in sucursales:
+                producto['sucursales'] = sucursales[producto['id']]
+            yield producto
+
+def leer_secciones(conn):
+    """Negocios, sucursales, categorías y ofertas con la estructura de productos.json"""
+    negocios = {}
+    for fila in conn.execute(f"SELECT id, {_columnas(CAMPOS_NEGOCIO)} FROM negocios ORDER BY orden"):
+        negocios[fila[0]] = _a_diccionario(fila[1:], CAMPOS_NEGOCIO)
+
+    sucursales = {}
+    for fila in conn.execute(f"SELECT negocio_id, id, {_columnas(CAMPOS_SUCURSAL)} FROM sucursales ORDER BY orden"):
+        sucursales.setdefault(fila[0], {})[fila[1]] = _a_diccionario(fila[2:], CAMPOS_SUCURSAL)
+
+    categorias = {}
+    for fila in conn.execute(f"SELECT id, {_columnas(CAMPOS_CATEGORIA)} FROM categorias ORDER BY orden"):
+        categorias[fila[0]] = _a_diccionario(fila[1:], CAMPOS_CATEGORIA)
+
+    productos_oferta = {}
+    for negocio_id, oferta_id, producto_id in conn.execute(
+            "SELECT negocio_id, oferta_id, producto_id FROM oferta_productos ORDER BY negocio_id, oferta_id, orden"):
+        productos_oferta.setdefault((negocio_id, oferta_id), []).append(producto_id)
+
+    ofertas = {}
+    for fila in conn.execute(f"SELECT negocio_id, {_columnas(CAMPOS_OFERTA)} FROM ofertas ORDER BY orden"):
+        oferta = _a_diccionario(fila[1:], CAMPOS_OFERTA)
+        oferta['productos'] = productos_oferta.get((fila[0], oferta.get('id')), [])
+        ofertas.setdefault(fila[0], []).append(oferta)
+
+    return {'negocios': negocios, 'sucursales': sucursales, 'categorias': categorias, 'ofertas': ofertas}
+
+def leer_catalogo(conn):
+    """Catálogo completo como diccionario (misma estructura que productos.json)"""
+    datos = leer_secciones(conn)
+    datos['productos'] = list(iterar_productos(conn))
+    return datos
+
+def _formatear(valor, nivel=0):
+    """JSON con indentación de 2 espacios y listas de valores simples en una línea"""
+    sangria = '  ' * (nivel + 1)
+    if isinstance(valor, dict):
+        if not valor:
+            return '{}'
+        items = [f'{sangria}{json.dumps(k, ensure_ascii=False)}: {_formatear(v, nivel + 1)}' for k, v in valor.items()]
+        return '{\n' + ',\n'.join(items) + '\n' + '  ' * nivel + '}'
+    if isinstance(valor, list):
+        if all(not isinstance(v, (dict, list)) for v in valor):
+            return '[' + ', '.join(json.dumps(v, ensure_ascii=False) for v in valor) + ']'
+        return '[\n' + ',\n'.join(sangria + _formatear(v, nivel + 1) for v in valor) + '\n' + '  ' * nivel + ']'
+    return json.dumps(valor, ensure_ascii=False)
+
+def exportar_json(ruta_json=ARCHIVO_JSON, ruta_db=ARCHIVO_DB):
+    """
+    Exportar el catálogo a un archivo JSON escribiendo producto por producto
+
+    El formato es el mismo de productos.json, por lo que importar y exportar
+    devuelve el mismo archivo.
+    """
+    conn = conectar(ruta_db)
+    try:
+        secciones = leer_secciones(conn)
+        total = 0
+        with open(ruta_json, 'w', encoding='utf-8') as f:
+            f.write('{\n')
+            for clave, valor in secciones.items():
+                f.write(f'  {json.dumps(clave)}: {_formatear(valor, 1)},\n')
+            f.write('  "productos": [')
+            for producto in iterar_productos(conn):
+                f.write(',\n' if total else '\n')
+                f.write('    ' + _formatear(producto, 2))
+                total += 1
+            f.write('\n  ]\n}\n' if total else ']\n}\n')
+        logger.info(f"Catálogo exportado a {ruta_json}: {total} productos")
+        return total
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) < 2 or sys.argv[1] not in ('importar', 'exportar'):
+        print(__doc__)
+        sys.exit(1)
+    ruta = sys.argv[2] if len(sys.argv) > 2 else ARCHIVO_JSON
+    if sys.argv[1] == 'importar':
+        print(f"✅ Catálogo importado (versión {importar_json(ruta)})")
+    else:
+        print(f"✅ {exportar_json(ruta)} productos exportados a {ruta}")
@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Conexiones a la base SQLite de Belgrano Ahorro
+Un pool compartido de conexiones ya configuradas (WAL, synchronous=NORMAL,
+busy_timeout, caché y mmap) para db.py, app.py y api_belgrano_ahorro.py.
+
+Cada llamada toma una conexión del pool y la devuelve con close(): el código
+existente (conectar / usar / close) sigue igual, pero sin pagar la apertura
+ni la configuración en cada request.
+
+USO:
+    conn = conexiones.conectar()          # como sqlite3.connect(...)
+    ...
+    conn.close()                          # vuelve al pool
+
+    with conexiones.transaccion() as conn:    # BEGIN IMMEDIATE / COMMIT / ROLLBACK
+        conn.execute(...)
+
+Para reportes y estadísticas usar las conexiones de solo lectura de
+reportes.py, que nunca toman el lock de escritura.
+
+MANTENIMIENTO:
+- La ruta de la base se toma de AHORRO_DB_PATH (por defecto belgrano_ahorro.db)
+- Con WAL la base usa los archivos -wal y -shm junto al .db: copiar o
+  respaldar los tres juntos (o hacer un checkpoint antes)
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+from urllib.request import pathname2url
+
+logger = logging.getLogger(__name__)
+
+RUTA_DB = os.environ.get('AHORRO_DB_PATH', 'belgrano_ahorro.db')
+
+# Conexiones libres que se conservan abiertas
+POOL_MAXIMO = 16
+# Milisegundos que una escritura espera a que se libere la base
+BUSY_TIMEOUT_MS = 10000
+
+PRAGMAS = (
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+    # Negativo: KiB de caché de páginas por conexión
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=67108864',
+    'PRAGMA temp_store=MEMORY',
+)
+
+# Conexiones de solo lectura: sin journal_mode (lo fija la base) y sin escrituras
+PRAGMAS_LECTURA = (
+    'PRAGMA query_only=1',
+    f'PRAGMA busy_timeout={BUSY_TIMEOUT_MS}',
+    'PRAGMA cache_size=-16000',
+    'PRAGMA mmap_size=67108864',
+    'PRAGMA temp_store=MEMORY',
+)
+
+def sentencias(script):
+    """Separar un script SQL en sentencias (los BEGIN ... END de los triggers quedan enteros)"""
+    actual = ''
+    for linea in script.splitlines(keepends=True):
+        actual += linea
+        if sqlite3.complete_statement(actual):
+            yield actual.strip()
+            actual = ''
+    if actual.strip():
+        yield actual.strip()
+
+def ejecutar_script(conn, script):
+    """
+    Ejecutar un script SQL sentencia por sentencia
+
+    A diferencia de conn.executescript(), no hace COMMIT antes de empezar:
+    dentro de una transacción abierta (ej: una migración, ver esquema.py)
+    el script se aplica o se deshace junto con ella.
+    """
+    for sentencia in sentencias(script):
+        conn.execute(sentencia)
+
+class ConexionPool(sqlite3.Connection):
+    """
+    Conexión SQLite que vuelve a su pool al cerrarse
+
+    Al devolverla se deshace cualquier transacción abierta y se restauran
+    row_factory e isolation_level, así el próximo usuario la recibe limpia.
+    """
+
+    _pool = None
+    _prestada = False
+    _generacion = 0
+
+    def close(self):
+        if self._pool is None:
+            super().close()
+        elif self._prestada:
+            self._pool._devolver(self)
+        # Ya devuelta: close() repetido, no hace nada
+
+    def cerrar(self):
+        """Cerrar la conexión de verdad (no vuelve al pool)"""
+        self._pool = None
+        super().close()
+
+class PoolConexiones:
+    """
+    Pool de conexiones a una base SQLite
+
+    Las conexiones se crean con check_same_thread=False porque pasan de un
+    hilo a otro entre préstamos; cada una la usa un solo hilo a la vez.
+
+    PARÁMETROS:
+    - solo_lectura: abrir la base con mode=ro y query_only (reportes)
+    - inmutable: además, sin locks ni WAL (solo para archivos que nunca
+      cambian, como la réplica de reportes.py)
+    """
+
+    def __init__(self, ruta_db=RUTA_DB, maximo=POOL_MAXIMO, solo_lectura=False, inmutable=False):
+        self.ruta_db = ruta_db
+        self.maximo = maximo
+        self.solo_lectura = solo_lectura or inmutable
+        self.inmutable = inmutable
+        self._libres = deque()
+        self._lock = threading.Lock()
+        self._generacion = 0
+
+    def _nueva(self):
+        if self.solo_lectura:
+            parametros = 'mode=ro&immutable=1' if self.inmutable else 'mode=ro'
+            conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(self.ruta_db))}?{parametros}", uri=True,
+                                   timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False, factory=ConexionPool)
+            pragmas = PRAGMAS_LECTURA
+        else:
+            conn = sqlite3.connect(self.ruta_db, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False,
+                                   factory=ConexionPool)
+            pragmas = PRAGMAS
+        for pragma in pragmas:
+            try:
+                conn.execute(pragma)
+            except sqlite3.Error as e:
+                # Ej: mmap no disponible en la plataforma; la conexión sirve igual
+                logger.warning(f"No se pudo aplicar {pragma}: {e}")
+        return conn
+
+    def conectar(self):
+        """Tomar una conexión del pool (o abrir una); devolverla con close()"""
+        with self._lock:
+            conn = self._libres.pop() if self._libres else None
+            generacion = self._generacion
+        if conn is None:
+            conn = self._nueva()
+            conn._pool = self
+            conn._generacion = generacion
+        conn._prestada = True
+        return conn
+
+    def _devolver(self, conn):
+        conn._prestada = False
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            conn.row_factory = None
+            conn.isolation_level = ''
+        except sqlite3.Error:
+            conn.cerrar()
+            return
+        with self._lock:
+            # Las conexiones de antes de renovar() no vuelven al pool
+            if conn._generacion == self._generacion and len(self._libres) < self.maximo:
+                self._libres.append(conn)
+                return
+        conn.cerrar()
+
+    @contextmanager
+    def conexion(self):
+        """Conexión prestada durante el bloque `with`"""
+        conn = self.conectar()
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @contextmanager
+    def lectura(self):
+        """
+        Lectura consistente durante el bloque `with`
+
+        Todas las consultas del bloque ven la misma versión de la base (una
+        transacción de lectura que nunca pide el lock de escritura; con WAL
+        no demora a las escrituras que ocurren mientras tanto).
+        """
+        conn = self.conectar()
+        try:
+            conn.execute('BEGIN')
+            yield conn
+        finally:
+            # Al devolverla se cierra la transacción de lectura
+            conn.close()
+
+    @contextmanager
+    def transaccion(self, inmediata=True):
+        """
+        Transacción durante el bloque `with`: COMMIT al salir, ROLLBACK si hay excepción
+
+        PARÁMETROS:
+        - inmediata: tomar el lock de escritura al empezar (BEGIN IMMEDIATE), así
+          dos escrituras concurrentes esperan en vez de fallar a mitad de camino
+        """
+        conn = self.conectar()
+        try:
+            conn.execute('BEGIN IMMEDIATE' if inmediata else 'BEGIN')
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        finally:
+            conn.close()
+
+    def cerrar_todas(self):
+        """Cerrar las conexiones libres (ej: antes de mover o respaldar la base)"""
+        with self._lock:
+            libres = list(self._libres)
+            self._libres.clear()
+        for conn in libres:
+            conn.cerrar()
+
+    def renovar(self, ruta_db=None):
+        """
+        Reabrir las conexiones (ej: la base fue reemplazada por otro archivo)
+
+        Las libres se cierran ya; las prestadas se cierran al devolverlas.
+        """
+        with self._lock:
+            if ruta_db is not None:
+                self.ruta_db = ruta_db
+            self._generacion += 1
+        self.cerrar_todas()
+
+# Pool global del proceso sobre la base configurada
+pool = PoolConexiones()
+conectar = pool.conectar
+conexion = pool.conexion
+transaccion = pool.transaccion
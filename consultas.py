@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Consultas facetadas sobre el catálogo de Belgrano Ahorro
+Filtra por negocio, categoría, sucursal, rango de precio, destacado, stock y
+ofertas; devuelve conteos por faceta y pagina con cursor
+"""
+
+import base64
+
+from catalogo_compacto import popcount, primera_fila, primeras_filas
+
+# Tamaño de página por defecto y máximo permitido
+TAMANO_PAGINA = 24
+TAMANO_PAGINA_MAXIMO = 100
+
+_VERDADEROS = ('1', 'true', 'si', 'sí', 'on')
+
+# ==========================================
+# FILTROS Y CURSORES
+# ==========================================
+
+def parsear_filtros(args):
+    """
+    Armar el diccionario de filtros desde la query string
+
+    FILTROS:
+    - negocio, categoria, sucursal: IDs exactos
+    - precio_min, precio_max: rango de precio (inclusive)
+    - destacado, en_stock, con_oferta: booleanos ('1', 'true', 'si')
+
+    Lanza ValueError si un precio no es numérico.
+    """
+    filtros = {}
+    for campo in ('negocio', 'categoria', 'sucursal'):
+        valor = (args.get(campo) or '').strip()
+        if valor:
+            filtros[campo] = valor
+    for campo in ('precio_min', 'precio_max'):
+        valor = (args.get(campo) or '').strip()
+        if valor:
+            filtros[campo] = float(valor)
+    for campo in ('destacado', 'en_stock', 'con_oferta'):
+        valor = (args.get(campo) or '').strip().lower()
+        if valor:
+            filtros[campo] = valor in _VERDADEROS
+    return filtros
+
+def codificar_cursor(posicion, producto_id):
+    """Cursor opaco con la posición y el ID del último producto entregado"""
+    return base64.urlsafe_b64encode(f"{posicion}:{producto_id}".encode('utf-8')).decode('ascii').rstrip('=')
+
+def decodificar_cursor(cursor):
+    """Devolver (posicion, producto_id); lanza ValueError si el cursor es inválido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        posicion, producto_id = base64.urlsafe_b64decode(cursor + relleno).decode('utf-8').split(':', 1)
+        return int(posicion), producto_id
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+def _posicion_desde_cursor(indice, cursor):
+    """
+    Fila a partir de la cual continuar
+
+    Si el catálogo se recargó entre páginas se reubica por ID del producto
+    para no repetir ni saltear productos.
+    """
+    posicion, producto_id = decodificar_cursor(cursor)
+    fila = indice.columnas.fila(producto_id)
+    return posicion if fila is None else fila
+
+# ==========================================
+# CONSULTA FACETADA
+# ==========================================
+# Cada filtro es una máscara de bits sobre los productos activos
+# (ver catalogo_compacto.py): filtrar es intersectar máscaras y contar
+# una faceta es contar los bits de una intersección
+
+def tiene_oferta(producto, ofertas_por_producto):
+    """Producto con oferta vigente o con precio rebajado en productos.json"""
+    if str(producto.get('id')) in ofertas_por_producto:
+        return True
+    precio_original = producto.get('precio_original')
+    return bool(precio_original) and precio_original > producto.get('precio', 0)
+
+def mascara_con_oferta(indice, ofertas_por_producto):
+    """Máscara de los productos activos para los que tiene_oferta() es verdadero"""
+    columnas = indice.columnas
+    filas = (columnas.fila(producto_id) for producto_id in ofertas_por_producto)
+    con_oferta = columnas.mascara_filas(fila for fila in filas if fila is not None)
+    return (con_oferta & columnas.mascara_activos) | columnas.mascara_rebajado
+
+def mascara_en_stock(indice, stock_por_producto):
+    """
+    Máscara de los productos activos con unidades disponibles
+
+    Los productos con inventario (stock_por_producto, ver inventario.py) usan
+    sus unidades disponibles; el resto, el stock de productos.json.
+    """
+    columnas = indice.columnas
+    mascara = columnas.mascara_en_stock
+    for producto_id, disponible in stock_por_producto.items():
+        fila = columnas.fila(producto_id)
+        if fila is None:
+            continue
+        if disponible > 0:
+            mascara |= 1 << fila
+        else:
+            mascara &= ~(1 << fila)
+    return mascara & columnas.mascara_activos
+
+def _mascaras_filtros(indice, filtros, ofertas_por_producto, stock_por_producto):
+    """Máscara de cada filtro presente: {dimension: máscara}"""
+    columnas = indice.columnas
+    mascaras = {}
+    if 'negocio' in filtros:
+        mascaras['negocio'] = columnas.mascaras_negocio.get(filtros['negocio'], 0)
+    if 'categoria' in filtros:
+        mascaras['categoria'] = columnas.mascaras_categoria.get(filtros['categoria'], 0)
+    if 'sucursal' in filtros:
+        mascaras['sucursal'] = columnas.mascaras_sucursal.get(filtros['sucursal'], 0)
+    if 'precio_min' in filtros or 'precio_max' in filtros:
+        mascaras['precio'] = columnas.mascara_precio(filtros.get('precio_min'), filtros.get('precio_max'))
+    for dimension in ('destacado', 'en_stock', 'con_oferta'):
+        if dimension not in filtros:
+            continue
+        if dimension == 'con_oferta':
+            mascara = mascara_con_oferta(indice, ofertas_por_producto)
+        elif dimension == 'en_stock':
+            mascara = mascara_en_stock(indice, stock_por_producto)
+        else:
+            mascara = getattr(columnas, f'mascara_{dimension}')
+        mascaras[dimension] = mascara if filtros[dimension] else columnas.mascara_activos & ~mascara
+    return mascaras
+
+def _interseccion(base, mascaras, excepto=None):
+    for dimension, mascara in mascaras.items():
+        if dimension != excepto:
+            base &= mascara
+    return base
+
+def _conteos(base, mascaras_por_valor, orden_en_fila=None):
+    """
+    Conteo por valor, en el orden en que aparece cada valor en el catálogo
+
+    orden_en_fila(fila, valor) desempata valores que aparecen por primera vez
+    en el mismo producto (ej: las sucursales de un producto)
+    """
+    conteos = []
+    for valor, mascara in mascaras_por_valor.items():
+        comunes = base & mascara
+        if comunes:
+            fila = primera_fila(comunes)
+            orden = orden_en_fila(fila, valor) if orden_en_fila else 0
+            conteos.append(((fila, orden), valor, popcount(comunes)))
+    conteos.sort(key=lambda conteo: conteo[0])
+    return {valor: cantidad for _, valor, cantidad in conteos}
+
+def consultar_catalogo(indice, filtros=None, cursor=None, limite=TAMANO_PAGINA, ofertas_por_producto=None,
+                       stock_por_producto=None, facetas=True):
+    """
+    Consultar el catálogo con filtros, facetas y paginación por cursor
+
+    PARÁMETROS:
+    - indice: snapshot del catálogo (catalogo.obtener())
+    - filtros: diccionario devuelto por parsear_filtros()
+    - cursor: valor 'siguiente' de la página anterior (None para la primera)
+    - ofertas_por_producto: ofertas vigentes por ID (ver ofertas.py)
+    - stock_por_producto: unidades disponibles por ID (ver inventario.py);
+      None usa el stock de productos.json
+    - facetas: calcular o no los conteos por faceta
+
+    RETORNA:
+    - {'productos': [...], 'total': n, 'siguiente': cursor o None, 'facetas': {...}}
+
+    Los conteos de cada faceta se calculan con todos los filtros menos el de
+    esa misma faceta, para mostrar cuántos productos habría al cambiarla.
+    """
+    filtros = filtros or {}
+    ofertas_por_producto = ofertas_por_producto or {}
+    stock_por_producto = stock_por_producto or {}
+    columnas = indice.columnas
+    activos = columnas.mascara_activos
+    desde = _posicion_desde_cursor(indice, cursor) if cursor else -1
+
+    mascaras = _mascaras_filtros(indice, filtros, ofertas_por_producto, stock_por_producto)
+    seleccion = _interseccion(activos, mascaras)
+
+    # Una fila de más para saber si hay página siguiente
+    filas = primeras_filas(seleccion, limite + 1, desde)
+    hay_mas = len(filas) > limite
+    pagina = [columnas.vista(fila) for fila in filas[:limite]]
+
+    resultado = {
+        'productos': pagina,
+        'total': popcount(seleccion),
+        'siguiente': codificar_cursor(filas[limite - 1], pagina[-1].get('id')) if hay_mas else None
+    }
+    if facetas:
+        con_oferta = mascaras.get('con_oferta')
+        if con_oferta is None or not filtros['con_oferta']:
+            con_oferta = mascara_con_oferta(indice, ofertas_por_producto)
+        en_stock = mascaras.get('en_stock')
+        if en_stock is None or not filtros['en_stock']:
+            en_stock = mascara_en_stock(indice, stock_por_producto)
+        precio_minimo, precio_maximo = columnas.precios_extremos(_interseccion(activos, mascaras, 'precio'))
+        resultado['facetas'] = {
+            'negocio': _conteos(_interseccion(activos, mascaras, 'negocio'), columnas.mascaras_negocio),
+            'categoria': _conteos(_interseccion(activos, mascaras, 'categoria'), columnas.mascaras_categoria),
+            'sucursal': _conteos(_interseccion(activos, mascaras, 'sucursal'), columnas.mascaras_sucursal,
+                                 lambda fila, sucursal_id: columnas.vista(fila)['sucursales'].index(sucursal_id)),
+            'destacado': popcount(_interseccion(activos, mascaras, 'destacado') & columnas.mascara_destacado),
+            'en_stock': popcount(_interseccion(activos, mascaras, 'en_stock') & en_stock),
+            'con_oferta': popcount(_interseccion(activos, mascaras, 'con_oferta') & con_oferta),
+            'precio': {'min': precio_minimo, 'max': precio_maximo}
+        }
+    return resultado
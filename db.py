@@ -1,9 +1,19 @@
-import sqlite3
+import base64
 import hashlib
 import secrets
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
 
+import conexiones
+import despacho_tickets
+import esquema
+import tablas
+from catalogo import catalogo
+from inventario import confirmar_reservas, inventario
+from ofertas import ofertas_vigentes
+from precios import cotizar_items
+from reportes import reportes
+
 logger = logging.getLogger(__name__)
 
 # ==========================================
@@ -11,142 +21,16 @@ logger = logging.getLogger(__name__)
 # ==========================================
 
 def crear_base_datos():
-    """Crear todas las tablas de la base de datos"""
+    """
+    Crear o actualizar todas las tablas de la base de datos
+
+    El esquema vive en migraciones/ (ver esquema.py); con la base al día no
+    se ejecuta ningún DDL.
+    """
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        # Tabla usuarios
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre VARCHAR(50) NOT NULL,
-                apellido VARCHAR(50) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                telefono VARCHAR(20),
-                direccion TEXT,
-                fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP,
-                password VARCHAR(100) NOT NULL,
-                rol VARCHAR(20) DEFAULT 'cliente'
-            )
-        ''')
-        
-        # Tabla productos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS productos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nombre VARCHAR(100) NOT NULL,
-                store VARCHAR(50) NOT NULL,
-                precio DECIMAL(10,2) NOT NULL,
-                original_price DECIMAL(10,2),
-                discount INTEGER,
-                new BOOLEAN DEFAULT 0,
-                imagen VARCHAR(255),
-                categoria VARCHAR(50),
-                destacado BOOLEAN DEFAULT 0,
-                activo BOOLEAN DEFAULT 1
-            )
-        ''')
-        
-        # Tabla carrito
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS carrito (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                producto_id INTEGER NOT NULL,
-                cantidad INTEGER NOT NULL,
-                fecha_agregado DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id),
-                FOREIGN KEY (producto_id) REFERENCES productos (id)
-            )
-        ''')
-        
-        # Tabla pedidos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pedidos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                numero_pedido VARCHAR(50) UNIQUE NOT NULL,
-                fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
-                total DECIMAL(10,2) NOT NULL,
-                estado VARCHAR(20) DEFAULT 'pendiente',
-                metodo_pago VARCHAR(50),
-                direccion_entrega TEXT,
-                notas TEXT,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
-        
-        # Tabla items de pedidos
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS pedido_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                pedido_id INTEGER NOT NULL,
-                producto_id INTEGER NOT NULL,
-                cantidad INTEGER NOT NULL,
-                precio_unitario DECIMAL(10,2) NOT NULL,
-                subtotal DECIMAL(10,2) NOT NULL,
-                FOREIGN KEY (pedido_id) REFERENCES pedidos (id),
-                FOREIGN KEY (producto_id) REFERENCES productos (id)
-            )
-        ''')
-        
-        # Tabla comerciantes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS comerciantes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                nombre_negocio VARCHAR(100) NOT NULL,
-                cuit VARCHAR(20),
-                direccion_comercial TEXT,
-                telefono_comercial VARCHAR(20),
-                tipo_negocio VARCHAR(50),
-                fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP,
-                activo BOOLEAN DEFAULT 1,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
-        
-        # Tabla paquetes de comerciantes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS paquetes_comerciantes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                comerciante_id INTEGER NOT NULL,
-                nombre_paquete VARCHAR(100) NOT NULL,
-                descripcion TEXT,
-                fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
-                activo BOOLEAN DEFAULT 1,
-                frecuencia VARCHAR(20) DEFAULT 'mensual',
-                proximo_pedido DATE,
-                FOREIGN KEY (comerciante_id) REFERENCES comerciantes (id)
-            )
-        ''')
-        
-        # Tabla items de paquetes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS paquete_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                paquete_id INTEGER NOT NULL,
-                producto_id VARCHAR(50) NOT NULL,
-                cantidad INTEGER NOT NULL,
-                FOREIGN KEY (paquete_id) REFERENCES paquetes_comerciantes (id)
-            )
-        ''')
-        
-        # Tabla tokens de recuperación
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tokens_recuperacion (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                usuario_id INTEGER NOT NULL,
-                token VARCHAR(100) UNIQUE NOT NULL,
-                expiracion DATETIME NOT NULL,
-                usado BOOLEAN DEFAULT 0,
-                FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
+        aplicadas = esquema.migrar()
+        for version, nombre in aplicadas:
+            print(f"   📝 Migración {version:04d} aplicada: {nombre}")
         print("✅ Base de datos inicializada correctamente")
     except Exception as e:
         print(f"❌ Error al crear base de datos: {e}")
@@ -169,7 +53,7 @@ def verificar_password(password, hashed):
 
 def crear_usuario(nombre, apellido, email, password, telefono=None, direccion=None, rol='cliente'):
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('SELECT id FROM usuarios WHERE email = ?', (email,))
         if cursor.fetchone():
@@ -187,7 +71,7 @@ def crear_usuario(nombre, apellido, email, password, telefono=None, direccion=No
 
 def verificar_usuario(email, password):
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('''SELECT id, nombre, apellido, email, password, rol FROM usuarios WHERE email = ?''', (email,))
         usuario = cursor.fetchone()
@@ -202,7 +86,7 @@ def verificar_usuario(email, password):
 
 def buscar_usuario_por_email(email):
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('''SELECT id, nombre, apellido, email, telefono, direccion, rol FROM usuarios WHERE email = ?''', (email,))
         usuario = cursor.fetchone()
@@ -217,7 +101,7 @@ def buscar_usuario_por_email(email):
 # ========== RECUPERACIÓN DE CONTRASEÑA ==========
 def guardar_token_recuperacion(usuario_id, token, expiracion):
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('INSERT INTO tokens_recuperacion (usuario_id, token, expiracion) VALUES (?, ?, ?)', (usuario_id, token, expiracion))
         conn.commit()
@@ -229,7 +113,7 @@ def guardar_token_recuperacion(usuario_id, token, expiracion):
 
 def verificar_token_recuperacion(email, token):
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('''SELECT t.id, t.usuario_id, t.expiracion, t.usado FROM tokens_recuperacion t JOIN usuarios u ON t.usuario_id = u.id WHERE u.email = ? AND t.token = ?''', (email, token))
         row = cursor.fetchone()
@@ -243,7 +127,7 @@ def verificar_token_recuperacion(email, token):
 
 def cambiar_password_por_token(email, token_id, nueva_password):
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('''SELECT u.id FROM usuarios u JOIN tokens_recuperacion t ON u.id = t.usuario_id WHERE t.id = ? AND u.email = ?''', (token_id, email))
         row = cursor.fetchone()
@@ -267,7 +151,7 @@ def cambiar_password_por_token(email, token_id, nueva_password):
 def obtener_usuario_por_id(usuario_id):
     """Obtener usuario por ID"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('''SELECT id, nombre, apellido, email, telefono, direccion, rol, fecha_registro FROM usuarios WHERE id = ?''', (usuario_id,))
         usuario = cursor.fetchone()
@@ -290,7 +174,7 @@ def obtener_usuario_por_id(usuario_id):
 def actualizar_usuario(usuario_id, nombre, telefono, direccion):
     """Actualizar información del usuario"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('''UPDATE usuarios SET nombre = ?, telefono = ?, direccion = ? WHERE id = ?''', (nombre, telefono, direccion, usuario_id))
         conn.commit()
@@ -303,7 +187,7 @@ def actualizar_usuario(usuario_id, nombre, telefono, direccion):
 def cambiar_password(usuario_id, password_actual, password_nuevo):
     """Cambiar contraseña del usuario"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         # Verificar password actual
@@ -323,31 +207,70 @@ def cambiar_password(usuario_id, password_actual, password_nuevo):
         logger.error(f"Error al cambiar password: {e}")
         return False
 
-def guardar_pedido(usuario_id, numero_pedido, total, metodo_pago, direccion_entrega, notas):
-    """Guardar un nuevo pedido"""
-    try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        cursor.execute('''INSERT INTO pedidos (usuario_id, numero_pedido, total, metodo_pago, direccion_entrega, notas) VALUES (?, ?, ?, ?, ?, ?)''', 
-                      (usuario_id, numero_pedido, total, metodo_pago, direccion_entrega, notas))
-        pedido_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return pedido_id
+# ---------- Persistencia de pedidos ----------
+# Cabecera, items y ticket del outbox se escriben en una sola transacción:
+# un pedido nunca queda guardado sin sus items ni sin su ticket.
+# Cada pedido va en su propia transacción, también en las corridas de
+# paquetes: un pedido que falla (ej: sin stock) no deshace los demás
+
+def _insertar_pedido(cursor, pedido, items, ticket=None):
+    """Insertar cabecera, items (executemany), ticket y confirmación de la reserva de stock sin hacer commit"""
+    cursor.execute('''INSERT INTO pedidos (usuario_id, numero_pedido, total, estado, metodo_pago, direccion_entrega, notas) VALUES (?, ?, ?, ?, ?, ?, ?)''',
+                   (pedido['usuario_id'], pedido['numero_pedido'], pedido['total'], pedido.get('estado', 'pendiente'),
+                    pedido.get('metodo_pago'), pedido.get('direccion_entrega'), pedido.get('notas')))
+    pedido_id = cursor.lastrowid
+    cursor.executemany('''INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal, nombre_producto) VALUES (?, ?, ?, ?, ?, ?)''',
+                       [(pedido_id, item['producto_id'], item['cantidad'], item['precio_unitario'], item['subtotal'], item.get('nombre'))
+                        for item in items])
+    if ticket is not None:
+        despacho_tickets.encolar_ticket(cursor.connection, ticket)
+    if pedido.get('confirmar_reserva'):
+        confirmar_reservas(cursor.connection, pedido['numero_pedido'])
+    return pedido_id
+
+def crear_pedido_con_items(pedido, items, ticket=None, conn=None):
+    """
+    Guardar un pedido completo en una transacción
+
+    PARÁMETROS:
+    - pedido: {usuario_id, numero_pedido, total, metodo_pago, direccion_entrega, notas, estado (opcional),
+      confirmar_reserva (opcional: confirma la reserva de stock del pedido, ver inventario.py)}
+    - items: [{producto_id, cantidad, precio_unitario, subtotal, nombre (opcional: se guarda como
+      nombre_producto)}]
+    - ticket: ticket para la Ticketera (se encola en el outbox, ver despacho_tickets.py)
+    - conn: conexión a reutilizar (por defecto se abre una)
+
+    RETORNA:
+    - id del pedido, o None si no se pudo guardar (no queda nada escrito)
+    """
+    try:
+        if conn is not None:
+            with conn:
+                return _insertar_pedido(conn.cursor(), pedido, items, ticket)
+        with conexiones.transaccion() as conn:
+            return _insertar_pedido(conn.cursor(), pedido, items, ticket)
     except Exception as e:
         logger.error(f"Error al guardar pedido: {e}")
         return None
 
+def guardar_pedido(usuario_id, numero_pedido, total, metodo_pago, direccion_entrega, notas, ticket=None):
+    """Guardar un nuevo pedido sin items (ver crear_pedido_con_items)"""
+    return crear_pedido_con_items({
+        'usuario_id': usuario_id,
+        'numero_pedido': numero_pedido,
+        'total': total,
+        'metodo_pago': metodo_pago,
+        'direccion_entrega': direccion_entrega,
+        'notas': notas
+    }, [], ticket)
+
 def guardar_items_pedido(pedido_id, items):
     """Guardar items de un pedido"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        for item in items:
-            cursor.execute('''INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal) VALUES (?, ?, ?, ?, ?)''',
-                          (pedido_id, item['producto_id'], item['cantidad'], item['precio_unitario'], item['subtotal']))
-        conn.commit()
-        conn.close()
+        with conexiones.transaccion() as conn:
+            conn.executemany('''INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal, nombre_producto) VALUES (?, ?, ?, ?, ?, ?)''',
+                             [(pedido_id, item['producto_id'], item['cantidad'], item['precio_unitario'], item['subtotal'], item.get('nombre'))
+                              for item in items])
         return True
     except Exception as e:
         logger.error(f"Error al guardar items de pedido: {e}")
@@ -356,7 +279,7 @@ def guardar_items_pedido(pedido_id, items):
 def obtener_pedidos_usuario(usuario_id):
     """Obtener todos los pedidos de un usuario"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         cursor.execute('''SELECT id, numero_pedido, fecha, total, estado FROM pedidos WHERE usuario_id = ? ORDER BY fecha DESC''', (usuario_id,))
         pedidos = []
@@ -374,91 +297,229 @@ def obtener_pedidos_usuario(usuario_id):
         logger.error(f"Error al obtener pedidos: {e}")
         return []
 
-def obtener_pedido_completo(pedido_id):
-    """Obtener un pedido completo con sus items"""
+# Pedidos por página en el historial (mis_pedidos)
+TAMANO_PAGINA_PEDIDOS = 20
+COLUMNAS_HISTORIAL = ('id', 'numero_pedido', 'fecha', 'total', 'estado', 'metodo_pago', 'direccion_entrega')
+
+def codificar_cursor_pedidos(fecha, pedido_id):
+    """Cursor opaco con la fecha y el ID del último pedido entregado"""
+    return base64.urlsafe_b64encode(f"{fecha}|{pedido_id}".encode('utf-8')).decode('ascii').rstrip('=')
+
+def decodificar_cursor_pedidos(cursor):
+    """Devolver (fecha, pedido_id); lanza ValueError si el cursor es inválido"""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        fecha, pedido_id = base64.urlsafe_b64decode(cursor + relleno).decode('utf-8').rsplit('|', 1)
+        return fecha, int(pedido_id)
+    except Exception:
+        raise ValueError('Cursor inválido')
+
+def obtener_pagina_pedidos_usuario(usuario_id, cursor=None, limite=TAMANO_PAGINA_PEDIDOS):
+    """
+    Una página del historial de pedidos de un usuario, más recientes primero
+
+    Pagina por (fecha, id) a partir del último pedido entregado, así cada
+    página cuesta lo mismo sin importar cuántos pedidos tenga el usuario
+    (usa idx_pedidos_usuario_fecha, que ya termina en el id).
+
+    PARÁMETROS:
+    - cursor: valor 'siguiente' de la página anterior (None para la primera)
+    - limite: pedidos por página
+
+    RETORNA:
+    - {'pedidos': [...], 'siguiente': cursor o None}
+    Lanza ValueError si el cursor es inválido.
+    """
+    if cursor:
+        fecha, pedido_id = decodificar_cursor_pedidos(cursor)
+        where, parametros = 'usuario_id = ? AND (fecha, id) < (?, ?)', (usuario_id, fecha, pedido_id)
+    else:
+        where, parametros = 'usuario_id = ?', (usuario_id,)
+    try:
+        with conexiones.conexion() as conn:
+            # Uno de más para saber si hay otra página
+            pedidos = tablas.PEDIDOS.consultar(conn, COLUMNAS_HISTORIAL, where=where, parametros=parametros,
+                                               orden='fecha DESC, id DESC', limite=limite + 1)
+    except Exception as e:
+        logger.error(f"Error al obtener pedidos: {e}")
+        return {'pedidos': [], 'siguiente': None}
+    hay_mas = len(pedidos) > limite
+    pedidos = pedidos[:limite]
+    return {
+        'pedidos': pedidos,
+        'siguiente': codificar_cursor_pedidos(pedidos[-1]['fecha'], pedidos[-1]['id']) if hay_mas else None
+    }
+
+def obtener_resumen_pedidos(usuario_id):
+    """
+    Cantidad de pedidos, total gastado y fecha del último pedido de un usuario
+
+    Lee la fila de resumen_pedidos_usuario, que los triggers de la
+    migración 0003 mantienen al escribir pedidos.
+    """
+    resumen = {'cantidad_pedidos': 0, 'total_gastado': 0, 'ultimo_pedido': None}
+    try:
+        with conexiones.conexion() as conn:
+            fila = tablas.RESUMEN_PEDIDOS.obtener(conn, ('cantidad_pedidos', 'total_gastado', 'ultimo_pedido'),
+                                                  where='usuario_id = ?', parametros=(usuario_id,), fila='dict')
+    except Exception as e:
+        logger.error(f"Error al obtener resumen de pedidos: {e}")
+        return resumen
+    if fila:
+        resumen.update(fila)
+        # Las sumas incrementales de REAL acumulan error de redondeo
+        resumen['total_gastado'] = round(resumen['total_gastado'], 2)
+    return resumen
+
+# ---------- Detalle de pedidos ----------
+# Los items se leen con una consulta para todos los pedidos pedidos y los
+# productos se resuelven contra el índice del catálogo en una sola búsqueda.
+# Si un producto ya no está en el catálogo se usa el nombre guardado en el
+# item al momento de la compra (nombre_producto); el precio es siempre el
+# precio_unitario con que se compró
+
+# Máximo de ids por consulta IN (SQLite admite como mínimo 999 parámetros)
+IDS_POR_CONSULTA = 500
+
+def obtener_items_pedidos(pedido_ids, conn=None):
+    """
+    Items de varios pedidos con nombre e imagen del catálogo
+
+    PARÁMETROS:
+    - pedido_ids: ids de los pedidos
+    - conn: conexión a reutilizar (por defecto se abre una)
+
+    RETORNA:
+    - {pedido_id: [{producto_id, cantidad, precio_unitario, subtotal, nombre, imagen}]}
+      (los pedidos sin items no aparecen)
+    """
+    pedido_ids = list(dict.fromkeys(pedido_ids))
+    if not pedido_ids:
+        return {}
+    if conn is None:
+        with conexiones.conexion() as conn:
+            return obtener_items_pedidos(pedido_ids, conn)
+
+    filas = []
+    for desde in range(0, len(pedido_ids), IDS_POR_CONSULTA):
+        lote = pedido_ids[desde:desde + IDS_POR_CONSULTA]
+        filas.extend(tablas.PEDIDO_ITEMS.consultar(
+            conn, columnas=('pedido_id', 'producto_id', 'cantidad', 'precio_unitario', 'subtotal', 'nombre_producto'),
+            where=f"pedido_id IN ({', '.join('?' * len(lote))})", parametros=lote, orden='pedido_id, id',
+            fila='tupla'))
+
+    producto_ids = list(dict.fromkeys(fila[1] for fila in filas))
+    productos = dict(zip(producto_ids, catalogo.obtener().productos_por_ids(producto_ids)))
+
+    items = {}
+    for pedido_id, producto_id, cantidad, precio_unitario, subtotal, nombre_producto in filas:
+        producto = productos[producto_id]
+        items.setdefault(pedido_id, []).append({
+            'producto_id': producto_id,
+            'cantidad': cantidad,
+            'precio_unitario': precio_unitario,
+            'subtotal': subtotal,
+            'nombre': producto['nombre'] if producto is not None else nombre_producto,
+            'imagen': producto.get('imagen') if producto is not None else None
+        })
+    return items
+
+def obtener_pedidos_completos(pedido_ids):
+    """
+    Varios pedidos completos con sus items (API, pantallas de administración)
+
+    PARÁMETROS:
+    - pedido_ids: ids de los pedidos
+
+    RETORNA:
+    - Lista de pedidos en el orden de pedido_ids (los que no existen se omiten),
+      cada uno con 'items' como en obtener_items_pedidos
+    """
+    pedido_ids = list(dict.fromkeys(pedido_ids))
+    if not pedido_ids:
+        return []
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        # Obtener pedido
-        cursor.execute('''SELECT id, numero_pedido, fecha, total, estado, metodo_pago, direccion_entrega, notas FROM pedidos WHERE id = ?''', (pedido_id,))
-        pedido_row = cursor.fetchone()
-        if not pedido_row:
-            conn.close()
-            return None
-        
-        pedido = {
-            'id': pedido_row[0],
-            'numero_pedido': pedido_row[1],
-            'fecha': pedido_row[2],
-            'total': pedido_row[3],
-            'estado': pedido_row[4],
-            'metodo_pago': pedido_row[5],
-            'direccion_entrega': pedido_row[6],
-            'notas': pedido_row[7],
-            'items': []
-        }
-        
-        # Obtener items del pedido
-        cursor.execute('''SELECT pi.producto_id, pi.cantidad, pi.precio_unitario, pi.subtotal, p.nombre, p.imagen 
-                         FROM pedido_items pi 
-                         JOIN productos p ON pi.producto_id = p.id 
-                         WHERE pi.pedido_id = ?''', (pedido_id,))
-        
-        for row in cursor.fetchall():
-            pedido['items'].append({
-                'producto_id': row[0],
-                'cantidad': row[1],
-                'precio_unitario': row[2],
-                'subtotal': row[3],
-                'nombre': row[4],
-                'imagen': row[5]
-            })
-        
-        conn.close()
-        return pedido
+        with conexiones.conexion() as conn:
+            pedidos = {}
+            for desde in range(0, len(pedido_ids), IDS_POR_CONSULTA):
+                lote = pedido_ids[desde:desde + IDS_POR_CONSULTA]
+                for pedido in tablas.PEDIDOS.consultar(
+                        conn, columnas=('id', 'numero_pedido', 'fecha', 'total', 'estado', 'metodo_pago',
+                                        'direccion_entrega', 'notas'),
+                        where=f"id IN ({', '.join('?' * len(lote))})", parametros=lote, fila='dict'):
+                    pedidos[pedido['id']] = pedido
+            items = obtener_items_pedidos(list(pedidos), conn)
     except Exception as e:
-        logger.error(f"Error al obtener pedido completo: {e}")
-        return None
+        logger.error(f"Error al obtener pedidos completos: {e}")
+        return []
 
-def repetir_pedido(pedido_id, usuario_id):
-    """Repetir un pedido anterior"""
-    try:
-        # Obtener pedido original
-        pedido_original = obtener_pedido_completo(pedido_id)
-        if not pedido_original:
-            return False, "Pedido no encontrado"
-        
-        # Crear nuevo pedido
-        numero_pedido = generar_numero_pedido()
-        nuevo_pedido_id = guardar_pedido(
-            usuario_id=usuario_id,
-            numero_pedido=numero_pedido,
-            total=pedido_original['total'],
-            metodo_pago=pedido_original['metodo_pago'],
-            direccion_entrega=pedido_original['direccion_entrega'],
-            notas=f"Pedido repetido del {pedido_original['numero_pedido']}"
-        )
-        
-        if nuevo_pedido_id:
-            # Copiar items del pedido original
-            items = []
-            for item in pedido_original['items']:
-                items.append({
-                    'producto_id': item['producto_id'],
-                    'cantidad': item['cantidad'],
-                    'precio_unitario': item['precio_unitario'],
-                    'subtotal': item['subtotal']
-                })
-            
-            guardar_items_pedido(nuevo_pedido_id, items)
-            return True, numero_pedido
+    completos = []
+    for pedido_id in pedido_ids:
+        pedido = pedidos.get(pedido_id)
+        if pedido is not None:
+            pedido['items'] = items.get(pedido_id, [])
+            completos.append(pedido)
+    return completos
+
+def obtener_pedido_completo(pedido_id):
+    """Obtener un pedido completo con sus items (None si no existe)"""
+    pedidos = obtener_pedidos_completos([pedido_id])
+    return pedidos[0] if pedidos else None
+
+# ---------- Repetir pedidos ----------
+# Los items del pedido original se agrupan por producto y se vuelven a
+# cotizar con los precios y ofertas vigentes (precios.py). El pedido nuevo
+# sigue el camino del checkout (app.registrar_pedido): reserva de stock,
+# pedido y ticket en una transacción, despacho. Los productos que ya no
+# están en el catálogo o están inactivos no se repiten y se informan en
+# 'no_disponibles'
+
+def _productos_para_repetir(conn, pedido_id, usuario_id, indice):
+    """
+    Productos de un pedido del usuario separados en disponibles y no disponibles
+
+    RETORNA:
+    - ({producto_id: cantidad} disponibles, [{producto_id, nombre}] no disponibles)
+    """
+    filas = conn.execute('''SELECT pi.producto_id, SUM(pi.cantidad), MAX(pi.nombre_producto)
+                           FROM pedido_items pi JOIN pedidos p ON p.id = pi.pedido_id
+                           WHERE p.id = ? AND p.usuario_id = ?
+                           GROUP BY pi.producto_id ORDER BY MIN(pi.id)''', (pedido_id, usuario_id)).fetchall()
+    productos = indice.productos_por_ids([fila[0] for fila in filas])
+    disponibles = {}
+    no_disponibles = []
+    for (producto_id, cantidad, nombre_producto), producto in zip(filas, productos):
+        if producto is not None and producto.get('activo', True):
+            disponibles[producto_id] = cantidad
         else:
-            return False, "Error al crear nuevo pedido"
-            
+            no_disponibles.append({'producto_id': producto_id,
+                                   'nombre': producto['nombre'] if producto is not None else nombre_producto})
+    return disponibles, no_disponibles
+
+def productos_para_repetir(pedido_id, usuario_id):
+    """
+    Productos de un pedido para volver a cargarlos en el carrito o para
+    repetirlo directamente (app.registrar_pedido: reserva, ticket y outbox
+    como en el checkout)
+
+    RETORNA:
+    - {'exito', 'mensaje', 'pedido': {numero_pedido, metodo_pago, direccion_entrega},
+      'items': {producto_id: cantidad}, 'no_disponibles': [{producto_id, nombre}]}
+    """
+    try:
+        with conexiones.conexion() as conn:
+            original = conn.execute('''SELECT numero_pedido, metodo_pago, direccion_entrega FROM pedidos
+                                      WHERE id = ? AND usuario_id = ?''', (pedido_id, usuario_id)).fetchone()
+            if original is None:
+                return {'exito': False, 'mensaje': 'Pedido no encontrado', 'pedido': None, 'items': {},
+                        'no_disponibles': []}
+            items, no_disponibles = _productos_para_repetir(conn, pedido_id, usuario_id, catalogo.obtener())
     except Exception as e:
-        logger.error(f"Error al repetir pedido: {e}")
-        return False, str(e)
+        logger.error(f"Error al leer pedido a repetir: {e}")
+        return {'exito': False, 'mensaje': str(e), 'pedido': None, 'items': {}, 'no_disponibles': []}
+    pedido = {'numero_pedido': original[0], 'metodo_pago': original[1], 'direccion_entrega': original[2]}
+    return {'exito': True, 'mensaje': f'{len(items)} productos para repetir', 'pedido': pedido, 'items': items,
+            'no_disponibles': no_disponibles}
 
 def generar_numero_pedido():
     """Generar número único de pedido"""
@@ -472,7 +533,7 @@ def generar_numero_pedido():
 def crear_comerciante(usuario_id, nombre_negocio, cuit=None, direccion_comercial=None, telefono_comercial=None, tipo_negocio=None):
     """Crear un nuevo comerciante"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         # Verificar si el usuario ya es comerciante
@@ -494,38 +555,11 @@ def crear_comerciante(usuario_id, nombre_negocio, cuit=None, direccion_comercial
         return {'exito': False, 'mensaje': f'Error al crear comerciante: {str(e)}'}
 
 def obtener_comerciante_por_usuario(usuario_id):
-    """Obtener información del comerciante por usuario_id"""
+    """Obtener información del comerciante por usuario_id (columnas en tablas.COMERCIANTES)"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT c.*, u.nombre, u.apellido, u.email, u.telefono
-            FROM comerciantes c
-            JOIN usuarios u ON c.usuario_id = u.id
-            WHERE c.usuario_id = ? AND c.activo = 1
-        ''', (usuario_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return {
-                'id': row[0],
-                'usuario_id': row[1],
-                'nombre_negocio': row[2],
-                'cuit': row[3],
-                'direccion_comercial': row[4],
-                'telefono_comercial': row[5],
-                'tipo_negocio': row[6],
-                'fecha_registro': row[7],
-                'activo': row[8],
-                'nombre': row[9],
-                'apellido': row[10],
-                'email': row[11],
-                'telefono': row[12]
-            }
-        return None
+        with conexiones.conexion() as conn:
+            return tablas.COMERCIANTES.obtener(conn, where='c.usuario_id = ? AND c.activo = 1',
+                                               parametros=(usuario_id,), fila='dict')
     except Exception as e:
         logger.error(f"Error obteniendo comerciante: {e}")
         return None
@@ -533,7 +567,7 @@ def obtener_comerciante_por_usuario(usuario_id):
 def crear_paquete_comerciante(comerciante_id, nombre_paquete, descripcion=None, frecuencia='mensual'):
     """Crear un nuevo paquete para comerciante"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         # Calcular próximo pedido (1 mes desde hoy)
@@ -556,7 +590,7 @@ def crear_paquete_comerciante(comerciante_id, nombre_paquete, descripcion=None,
 def agregar_producto_a_paquete(paquete_id, producto_id, cantidad):
     """Agregar un producto a un paquete"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -574,7 +608,7 @@ def agregar_producto_a_paquete(paquete_id, producto_id, cantidad):
 def obtener_paquetes_comerciante(comerciante_id):
     """Obtener todos los paquetes de un comerciante"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -612,155 +646,151 @@ def obtener_paquetes_comerciante(comerciante_id):
         logger.error(f"Error obteniendo paquetes: {e}")
         return []
 
+def _armar_pedido_paquete(conn, paquete_id, indice, ofertas_por_producto):
+    """
+    Pedido automático de un paquete cotizado con los precios y ofertas
+    vigentes (precios.py), o un mensaje de error si no se puede armar
+    """
+    # Obtener información del paquete y comerciante
+    row = conn.execute('''
+        SELECT pc.comerciante_id, pc.nombre_paquete, c.usuario_id
+        FROM paquetes_comerciantes pc
+        JOIN comerciantes c ON pc.comerciante_id = c.id
+        WHERE pc.id = ?
+    ''', (paquete_id,)).fetchone()
+    if not row:
+        return 'Paquete no encontrado'
+    
+    comerciante_id, nombre_paquete, usuario_id = row
+    
+    # Obtener items del paquete
+    items = {}
+    for producto_id, cantidad in conn.execute('''
+        SELECT producto_id, cantidad
+        FROM paquete_items
+        WHERE paquete_id = ?
+    ''', (paquete_id,)):
+        items[producto_id] = items.get(producto_id, 0) + cantidad
+    if not items:
+        return 'Paquete sin productos'
+    
+    cotizacion = cotizar_items(items, indice, ofertas_por_producto)
+    if not cotizacion['lineas']:
+        return 'Ningún producto del paquete sigue disponible'
+    if cotizacion['no_disponibles']:
+        logger.warning(f"Paquete {paquete_id}: productos no disponibles omitidos {cotizacion['no_disponibles']}")
+    
+    return {
+        'usuario_id': usuario_id,
+        'numero_pedido': f"PAQ-{paquete_id}-{datetime.now().strftime('%Y%m%d')}",
+        'total': cotizacion['total'],
+        'estado': 'pendiente',
+        'metodo_pago': 'transferencia',
+        'direccion_entrega': 'Entrega comercial',
+        'notas': f'Pedido automático - {nombre_paquete}',
+        'confirmar_reserva': True,
+        'lineas': cotizacion['lineas'],
+        'items': [{'producto_id': linea['producto']['id'], 'nombre': linea['producto']['nombre'],
+                   'cantidad': linea['cantidad'], 'precio_unitario': linea['precio_unitario'],
+                   'subtotal': linea['subtotal']} for linea in cotizacion['lineas']]
+    }
+
+def _procesar_paquete(paquete_id, indice, ofertas_por_producto, proximo_pedido):
+    """
+    Reservar el stock y guardar el pedido de un paquete en su propia transacción
+
+    RETORNA:
+    - {'exito': True, 'numero_pedido'} o {'exito': False, 'mensaje'}
+    """
+    with conexiones.conexion() as conn:
+        pedido = _armar_pedido_paquete(conn, paquete_id, indice, ofertas_por_producto)
+        if isinstance(pedido, str):
+            return {'exito': False, 'mensaje': pedido}
+        numero_pedido = pedido['numero_pedido']
+        # Antes de reservar: la reserva se identifica por el número del pedido
+        if conn.execute('SELECT 1 FROM pedidos WHERE numero_pedido = ?', (numero_pedido,)).fetchone():
+            return {'exito': False, 'mensaje': f'El pedido {numero_pedido} ya existe'}
+    
+    reserva = inventario.reservar(numero_pedido, [(linea['producto'], linea['cantidad']) for linea in pedido['lineas']])
+    if not reserva['exito']:
+        return {'exito': False, 'mensaje': reserva['mensaje']}
+    try:
+        with conexiones.transaccion() as conn:
+            _insertar_pedido(conn.cursor(), pedido, pedido['items'])
+            conn.execute('''
+                UPDATE paquetes_comerciantes
+                SET proximo_pedido = ?
+                WHERE id = ?
+            ''', (proximo_pedido, paquete_id))
+    except Exception:
+        inventario.liberar(numero_pedido, 'pedido_fallido')
+        raise
+    return {'exito': True, 'numero_pedido': numero_pedido}
+
+def procesar_pedidos_automaticos_paquetes(paquete_ids=None):
+    """
+    Procesar en lote los pedidos automáticos de paquetes
+
+    PARÁMETROS:
+    - paquete_ids: paquetes a procesar (por defecto, los activos con
+      proximo_pedido vencido)
+
+    RETORNA:
+    - {'exito', 'mensaje', 'pedidos': [numero_pedido], 'errores': {paquete_id: mensaje}}
+      Cada paquete reserva su stock y guarda su pedido y su próxima fecha en
+      su propia transacción: un paquete que falla no frena a los demás y se
+      vuelve a intentar en la próxima corrida.
+    """
+    try:
+        if paquete_ids is None:
+            with conexiones.conexion() as conn:
+                paquete_ids = [row[0] for row in conn.execute('''
+                    SELECT id FROM paquetes_comerciantes
+                    WHERE activo = 1 AND proximo_pedido IS NOT NULL AND proximo_pedido <= ?
+                ''', (datetime.now().date(),))]
+    except Exception as e:
+        logger.error(f"Error procesando pedidos automáticos: {e}")
+        return {'exito': False, 'mensaje': f'Error al procesar pedidos: {str(e)}', 'pedidos': [], 'errores': {}}
+    
+    indice = catalogo.obtener()
+    por_producto = ofertas_vigentes.obtener().por_producto
+    proximo_pedido = (datetime.now() + timedelta(days=30)).date()
+    numeros = []
+    errores = {}
+    for paquete_id in paquete_ids:
+        try:
+            resultado = _procesar_paquete(paquete_id, indice, por_producto, proximo_pedido)
+        except Exception as e:
+            logger.error(f"Error procesando el pedido automático del paquete {paquete_id}: {e}")
+            resultado = {'exito': False, 'mensaje': f'Error al procesar pedido: {str(e)}'}
+        if resultado['exito']:
+            numeros.append(resultado['numero_pedido'])
+        else:
+            errores[paquete_id] = resultado['mensaje']
+    
+    return {
+        'exito': bool(numeros) or not errores,
+        'mensaje': f'{len(numeros)} pedidos automáticos procesados',
+        'pedidos': numeros,
+        'errores': errores
+    }
+
 def procesar_pedido_automatico_paquete(paquete_id):
     """Procesar pedido automático de un paquete"""
-    try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        # Obtener información del paquete y comerciante
-        cursor.execute('''
-            SELECT pc.comerciante_id, pc.nombre_paquete, c.usuario_id
-            FROM paquetes_comerciantes pc
-            JOIN comerciantes c ON pc.comerciante_id = c.id
-            WHERE pc.id = ?
-        ''', (paquete_id,))
-        
-        row = cursor.fetchone()
-        if not row:
-            return {'exito': False, 'mensaje': 'Paquete no encontrado'}
-        
-        comerciante_id, nombre_paquete, usuario_id = row
-        
-        # Obtener items del paquete
-        cursor.execute('''
-            SELECT producto_id, cantidad
-            FROM paquete_items
-            WHERE paquete_id = ?
-        ''', (paquete_id,))
-        
-        items = cursor.fetchall()
-        if not items:
-            return {'exito': False, 'mensaje': 'Paquete sin productos'}
-        
-        # Crear pedido automático
-        numero_pedido = f"PAQ-{paquete_id}-{datetime.now().strftime('%Y%m%d')}"
-        total = 0
-        
-        # Calcular total (necesitarías obtener precios de productos.json)
-        # Por ahora usamos un total estimado
-        total = sum(cantidad * 100 for _, cantidad in items)  # Precio estimado $100 por producto
-        
-        cursor.execute('''
-            INSERT INTO pedidos (usuario_id, numero_pedido, total, estado, metodo_pago, direccion_entrega, notas)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        ''', (usuario_id, numero_pedido, total, 'pendiente', 'transferencia', 'Entrega comercial', f'Pedido automático - {nombre_paquete}'))
-        
-        pedido_id = cursor.lastrowid
-        
-        # Agregar items al pedido
-        for producto_id, cantidad in items:
-            cursor.execute('''
-                INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (pedido_id, producto_id, cantidad, 100, cantidad * 100))  # Precio estimado
-        
-        # Actualizar próximo pedido
-        from datetime import datetime, timedelta
-        proximo_pedido = (datetime.now() + timedelta(days=30)).date()
-        cursor.execute('''
-            UPDATE paquetes_comerciantes
-            SET proximo_pedido = ?
-            WHERE id = ?
-        ''', (proximo_pedido, paquete_id))
-        
-        conn.commit()
-        conn.close()
-        return {'exito': True, 'numero_pedido': numero_pedido, 'mensaje': 'Pedido automático procesado'}
-    except Exception as e:
-        logger.error(f"Error procesando pedido automático: {e}")
-        return {'exito': False, 'mensaje': f'Error al procesar pedido: {str(e)}'}
+    resultado = procesar_pedidos_automaticos_paquetes([paquete_id])
+    if resultado['pedidos']:
+        return {'exito': True, 'numero_pedido': resultado['pedidos'][0], 'mensaje': 'Pedido automático procesado'}
+    mensaje = resultado['errores'].get(paquete_id) or resultado['mensaje']
+    return {'exito': False, 'mensaje': mensaje}
 
 # ==========================================
 # FUNCIONES PARA TICKETS
 # ==========================================
 
 def crear_tabla_tickets():
-    """Crear tabla de tickets si no existe"""
+    """Crear las tablas tickets y registro_tickets si no existen (son parte del esquema base)"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS tickets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero VARCHAR(50) UNIQUE NOT NULL,
-                cliente_nombre VARCHAR(100) NOT NULL,
-                cliente_direccion TEXT,
-                cliente_telefono VARCHAR(20),
-                cliente_email VARCHAR(100),
-                productos TEXT NOT NULL,
-                total DECIMAL(10,2) NOT NULL DEFAULT 0.00,
-                estado VARCHAR(20) DEFAULT 'pendiente',
-                estado_envio VARCHAR(20) DEFAULT 'pendiente',
-                prioridad VARCHAR(20) DEFAULT 'normal',
-                indicaciones TEXT,
-                repartidor VARCHAR(50),
-                fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
-                fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP,
-                fecha_envio DATETIME,
-                fecha_entrega DATETIME
-            )
-        ''')
-        
-        # Crear tabla de registro de tickets (historial)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS registro_tickets (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ticket_id INTEGER NOT NULL,
-                numero VARCHAR(50) NOT NULL,
-                cliente_nombre VARCHAR(100) NOT NULL,
-                cliente_direccion TEXT,
-                cliente_telefono VARCHAR(20),
-                cliente_email VARCHAR(100),
-                productos TEXT NOT NULL,
-                total DECIMAL(10,2) NOT NULL,
-                estado_final VARCHAR(20) NOT NULL,
-                estado_envio_final VARCHAR(20) NOT NULL,
-                prioridad VARCHAR(20),
-                indicaciones TEXT,
-                repartidor VARCHAR(50),
-                fecha_creacion DATETIME,
-                fecha_envio DATETIME,
-                fecha_entrega DATETIME,
-                fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (ticket_id) REFERENCES tickets (id)
-            )
-        ''')
-        
-        # Agregar columnas si no existen (para compatibilidad con bases de datos existentes)
-        try:
-            cursor.execute('ALTER TABLE tickets ADD COLUMN total DECIMAL(10,2) DEFAULT 0.00')
-        except:
-            pass  # La columna ya existe
-            
-        try:
-            cursor.execute('ALTER TABLE tickets ADD COLUMN estado_envio VARCHAR(20) DEFAULT "pendiente"')
-        except:
-            pass  # La columna ya existe
-            
-        try:
-            cursor.execute('ALTER TABLE tickets ADD COLUMN fecha_envio DATETIME')
-        except:
-            pass  # La columna ya existe
-            
-        try:
-            cursor.execute('ALTER TABLE tickets ADD COLUMN fecha_entrega DATETIME')
-        except:
-            pass  # La columna ya existe
-        
-        conn.commit()
-        conn.close()
+        esquema.migrar()
         return True
     except Exception as e:
         logger.error(f"Error creando tabla tickets: {e}")
@@ -769,7 +799,7 @@ def crear_tabla_tickets():
 def guardar_ticket(**kwargs):
     """Guardar un nuevo ticket"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -802,89 +832,27 @@ def guardar_ticket(**kwargs):
         logger.error(f"Error guardando ticket: {e}")
         return None
 
-def obtener_todos_los_tickets():
-    """Obtener todos los tickets"""
+def obtener_todos_los_tickets(columnas=None, fila='vista'):
+    """
+    Obtener todos los tickets, más recientes primero
+
+    PARÁMETROS:
+    - columnas: columnas a leer (por defecto todas las de tablas.TICKETS)
+    - fila: fábrica de filas ('vista', 'tupla', 'nombrada', 'dict'; ver tablas.py)
+    """
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, numero, cliente_nombre, cliente_direccion, cliente_telefono,
-                   cliente_email, productos, total, estado, estado_envio, prioridad, 
-                   indicaciones, repartidor, fecha_creacion, fecha_actualizacion,
-                   fecha_envio, fecha_entrega
-            FROM tickets
-            ORDER BY fecha_creacion DESC
-        ''')
-        
-        tickets = []
-        for row in cursor.fetchall():
-            tickets.append({
-                'id': row[0],
-                'numero': row[1],
-                'cliente_nombre': row[2],
-                'cliente_direccion': row[3],
-                'cliente_telefono': row[4],
-                'cliente_email': row[5],
-                'productos': row[6],
-                'total': row[7] or 0.00,
-                'estado': row[8],
-                'estado_envio': row[9],
-                'prioridad': row[10],
-                'indicaciones': row[11],
-                'repartidor': row[12],
-                'fecha_creacion': row[13],
-                'fecha_actualizacion': row[14],
-                'fecha_envio': row[15],
-                'fecha_entrega': row[16]
-            })
-        
-        conn.close()
-        return tickets
+        with conexiones.conexion() as conn:
+            return tablas.TICKETS.consultar(conn, columnas, orden='fecha_creacion DESC', fila=fila)
     except Exception as e:
         logger.error(f"Error obteniendo tickets: {e}")
         return []
 
-def obtener_tickets_por_repartidor(repartidor):
-    """Obtener tickets asignados a un repartidor"""
+def obtener_tickets_por_repartidor(repartidor, columnas=None, fila='vista'):
+    """Obtener tickets asignados a un repartidor (columnas y fila como en obtener_todos_los_tickets)"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, numero, cliente_nombre, cliente_direccion, cliente_telefono,
-                   cliente_email, productos, total, estado, estado_envio, prioridad, 
-                   indicaciones, repartidor, fecha_creacion, fecha_actualizacion,
-                   fecha_envio, fecha_entrega
-            FROM tickets
-            WHERE repartidor = ?
-            ORDER BY fecha_creacion DESC
-        ''', (repartidor,))
-        
-        tickets = []
-        for row in cursor.fetchall():
-            tickets.append({
-                'id': row[0],
-                'numero': row[1],
-                'cliente_nombre': row[2],
-                'cliente_direccion': row[3],
-                'cliente_telefono': row[4],
-                'cliente_email': row[5],
-                'productos': row[6],
-                'total': row[7] or 0.00,
-                'estado': row[8],
-                'estado_envio': row[9],
-                'prioridad': row[10],
-                'indicaciones': row[11],
-                'repartidor': row[12],
-                'fecha_creacion': row[13],
-                'fecha_actualizacion': row[14],
-                'fecha_envio': row[15],
-                'fecha_entrega': row[16]
-            })
-        
-        conn.close()
-        return tickets
+        with conexiones.conexion() as conn:
+            return tablas.TICKETS.consultar(conn, columnas, where='repartidor = ?', parametros=(repartidor,),
+                                            orden='fecha_creacion DESC', fila=fila)
     except Exception as e:
         logger.error(f"Error obteniendo tickets por repartidor: {e}")
         return []
@@ -892,7 +860,7 @@ def obtener_tickets_por_repartidor(repartidor):
 def obtener_usuarios_por_rol(rol):
     """Obtener usuarios por rol"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         cursor.execute('''
@@ -920,16 +888,10 @@ def obtener_usuarios_por_rol(rol):
         return []
 
 def contar_tickets():
-    """Contar total de tickets"""
+    """Contar total de tickets (conexión de solo lectura, ver reportes.py)"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('SELECT COUNT(*) FROM tickets')
-        count = cursor.fetchone()[0]
-        
-        conn.close()
-        return count
+        with reportes.lectura() as conn:
+            return conn.execute('SELECT COUNT(*) FROM tickets').fetchone()[0]
     except Exception as e:
         logger.error(f"Error contando tickets: {e}")
         return 0
@@ -937,7 +899,7 @@ def contar_tickets():
 def actualizar_estado_ticket(ticket_id, estado, estado_envio=None, repartidor=None, prioridad=None):
     """Actualizar estado de un ticket"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         # Preparar la consulta dinámicamente
@@ -988,7 +950,7 @@ def actualizar_estado_ticket(ticket_id, estado, estado_envio=None, repartidor=No
 def mover_ticket_a_registro(ticket_id):
     """Mover un ticket completado al registro de tickets"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
+        conn = conexiones.conectar()
         cursor = conn.cursor()
         
         # Obtener datos del ticket
@@ -1028,46 +990,11 @@ def mover_ticket_a_registro(ticket_id):
         logger.error(f"Error moviendo ticket a registro: {e}")
         return False
 
-def obtener_tickets_registro():
-    """Obtener tickets del registro (historial)"""
+def obtener_tickets_registro(columnas=None, fila='vista'):
+    """Obtener tickets del registro (historial; columnas en tablas.REGISTRO_TICKETS)"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, ticket_id, numero, cliente_nombre, cliente_direccion, cliente_telefono,
-                   cliente_email, productos, total, estado_final, estado_envio_final,
-                   prioridad, indicaciones, repartidor, fecha_creacion, fecha_envio,
-                   fecha_entrega, fecha_registro
-            FROM registro_tickets
-            ORDER BY fecha_registro DESC
-        ''')
-        
-        tickets = []
-        for row in cursor.fetchall():
-            tickets.append({
-                'id': row[0],
-                'ticket_id': row[1],
-                'numero': row[2],
-                'cliente_nombre': row[3],
-                'cliente_direccion': row[4],
-                'cliente_telefono': row[5],
-                'cliente_email': row[6],
-                'productos': row[7],
-                'total': row[8] or 0.00,
-                'estado_final': row[9],
-                'estado_envio_final': row[10],
-                'prioridad': row[11],
-                'indicaciones': row[12],
-                'repartidor': row[13],
-                'fecha_creacion': row[14],
-                'fecha_envio': row[15],
-                'fecha_entrega': row[16],
-                'fecha_registro': row[17]
-            })
-        
-        conn.close()
-        return tickets
+        with conexiones.conexion() as conn:
+            return tablas.REGISTRO_TICKETS.consultar(conn, columnas, orden='fecha_registro DESC', fila=fila)
     except Exception as e:
         logger.error(f"Error obteniendo tickets del registro: {e}")
         return []
@@ -1075,42 +1002,8 @@ def obtener_tickets_registro():
 def obtener_ticket_por_id(ticket_id):
     """Obtener un ticket específico por ID"""
     try:
-        conn = sqlite3.connect('belgrano_ahorro.db')
-        cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT id, numero, cliente_nombre, cliente_direccion, cliente_telefono,
-                   cliente_email, productos, total, estado, estado_envio, prioridad,
-                   indicaciones, repartidor, fecha_creacion, fecha_actualizacion,
-                   fecha_envio, fecha_entrega
-            FROM tickets
-            WHERE id = ?
-        ''', (ticket_id,))
-        
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return {
-                'id': row[0],
-                'numero': row[1],
-                'cliente_nombre': row[2],
-                'cliente_direccion': row[3],
-                'cliente_telefono': row[4],
-                'cliente_email': row[5],
-                'productos': row[6],
-                'total': row[7] or 0.00,
-                'estado': row[8],
-                'estado_envio': row[9],
-                'prioridad': row[10],
-                'indicaciones': row[11],
-                'repartidor': row[12],
-                'fecha_creacion': row[13],
-                'fecha_actualizacion': row[14],
-                'fecha_envio': row[15],
-                'fecha_entrega': row[16]
-            }
-        return None
+        with conexiones.conexion() as conn:
+            return tablas.TICKETS.obtener(conn, where='id = ?', parametros=(ticket_id,), fila='dict')
     except Exception as e:
         logger.error(f"Error obteniendo ticket por ID: {e}")
         return None
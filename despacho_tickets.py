@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Despacho de pedidos a la Ticketera con outbox durable
+El checkout guarda el ticket en la tabla outbox_tickets dentro de la misma
+transacción que el pedido y responde enseguida; un despachador en segundo
+plano entrega los tickets pendientes por lotes, con concurrencia limitada y
+reintentos con backoff. La Ticketera es idempotente por `numero`, así que
+reenviar un ticket ya recibido no crea otro.
+
+USO:
+    python despacho_tickets.py            # entregar los tickets pendientes y salir
+    python despacho_tickets.py resumen    # cantidad de tickets por estado
+
+MANTENIMIENTO:
+- La URL se toma de TICKETERA_URL y la clave de BELGRANO_AHORRO_API_KEY.
+  Sin TICKETERA_URL no se despacha nada (ni hacia producción por defecto):
+  los tickets esperan en el outbox hasta que un proceso con la URL los envíe
+- Los tickets rechazados por la Ticketera (400/401/403/422) o que agotan
+  MAX_INTENTOS quedan con estado 'fallido' y su último error para revisarlos
+"""
+
+import json
+import logging
+import os
+import random
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
+import conexiones
+import esquema
+
+logger = logging.getLogger(__name__)
+
+# Tickets reclamados por vuelta del despachador
+TAMANO_LOTE = 20
+# Envíos simultáneos a la Ticketera
+CONCURRENCIA = 4
+TIMEOUT_ENVIO = 10
+# Espera máxima entre vueltas cuando no hay trabajo
+ESPERA_SONDEO = 5.0
+# Backoff exponencial con jitter: BACKOFF_BASE * 2^intentos, hasta BACKOFF_MAXIMO
+BACKOFF_BASE = 2
+BACKOFF_MAXIMO = 600
+MAX_INTENTOS = 12
+# Segundos que un lote reclamado queda reservado para un despachador
+RESERVA_LOTE = 120
+
+# Respuestas de la Ticketera que no tiene sentido reintentar
+ESTADOS_RECHAZO = (400, 401, 403, 422)
+
+# ==========================================
+# ENCOLADO
+# ==========================================
+
+def encolar_ticket(conn, ticket):
+    """
+    Agregar un ticket al outbox dentro de la transacción abierta en `conn`
+
+    Un segundo ticket con el mismo numero se ignora (idempotente).
+
+    RETORNA:
+    - True si el ticket se encoló, False si ya estaba
+    """
+    cursor = conn.execute(
+        "INSERT OR IGNORE INTO outbox_tickets (numero, payload, proximo_intento) VALUES (?, ?, ?)",
+        (ticket['numero'], json.dumps(ticket, ensure_ascii=False), time.time()))
+    return cursor.rowcount == 1
+
+def construir_ticket(numero_pedido, usuario, carrito_items, total, metodo_pago, direccion, notas, datos_catalogo):
+    """
+    Armar el ticket que recibe la Ticketera a partir del pedido
+
+    PARÁMETROS:
+    - usuario: datos del usuario que hizo el pedido
+    - carrito_items: líneas cotizadas del carrito (ver precios.py)
+    - datos_catalogo: negocios, sucursales y categorías para los nombres
+
+    RETORNA:
+    - Diccionario del ticket (con 'numero' = numero_pedido)
+    """
+    nombre_completo = f"{usuario.get('nombre', '')} {usuario.get('apellido', '')}".strip()
+    if not nombre_completo:
+        nombre_completo = usuario.get('email', 'Cliente')
+
+    productos_lista = []
+    for item in carrito_items:
+        producto = item['producto']
+
+        negocio_nombre = "Negocio no especificado"
+        if producto.get('negocio'):
+            negocio_data = datos_catalogo.get('negocios', {}).get(producto['negocio'])
+            if negocio_data:
+                negocio_nombre = negocio_data.get('nombre', producto['negocio'])
+
+        # Sucursal: la primera disponible del producto
+        sucursal_nombre = "Sucursal no especificada"
+        if producto.get('sucursales'):
+            sucursal_id = producto['sucursales'][0]
+            sucursal_data = datos_catalogo.get('sucursales', {}).get(producto.get('negocio'), {}).get(sucursal_id)
+            if sucursal_data:
+                sucursal_nombre = sucursal_data.get('nombre', sucursal_id)
+
+        categoria_nombre = "Sin categoría"
+        if producto.get('categoria'):
+            categoria_data = datos_catalogo.get('categorias', {}).get(producto['categoria'])
+            if categoria_data:
+                categoria_nombre = categoria_data.get('nombre', producto['categoria'])
+
+        productos_lista.append({
+            'id': producto.get('id', 'N/A'),
+            'nombre': producto.get('nombre', 'Producto sin nombre'),
+            'precio': float(item.get('precio_unitario', producto.get('precio', 0))),
+            'cantidad': int(item['cantidad']),
+            'subtotal': float(item['subtotal']),
+            'sucursal': sucursal_nombre,
+            'negocio': negocio_nombre,
+            'categoria': categoria_nombre,
+            'descripcion': producto.get('descripcion', 'Sin descripción'),
+            'stock': producto.get('stock', 0),
+            'destacado': producto.get('destacado', False)
+        })
+
+    return {
+        "numero": numero_pedido,
+        "cliente_nombre": nombre_completo,
+        "cliente_direccion": direccion or "Dirección no especificada",
+        "cliente_telefono": usuario.get('telefono', ''),
+        "cliente_email": usuario['email'],
+        "productos": productos_lista,
+        "total": float(total),
+        "metodo_pago": metodo_pago,
+        "indicaciones": notas or 'Sin indicaciones especiales',
+        "estado": "pendiente",
+        "prioridad": "normal",
+        "tipo_cliente": "cliente",
+        "fecha_creacion": datetime.now().isoformat(),
+        "origen": "belgrano_ahorro"
+    }
+
+def resumen_outbox(conn):
+    """Cantidad de tickets por estado {estado: cantidad}"""
+    return dict(conn.execute("SELECT estado, COUNT(*) FROM outbox_tickets GROUP BY estado").fetchall())
+
+# ==========================================
+# DESPACHADOR
+# ==========================================
+
+class DespachadorTickets:
+    """
+    Entrega en segundo plano los tickets del outbox a la Ticketera
+
+    Cada vuelta reclama un lote de tickets vencidos (reservándolos por
+    RESERVA_LOTE segundos, así varios procesos pueden despachar sin
+    repetirse y un lote de un proceso caído vuelve a quedar disponible),
+    los envía con hasta `concurrencia` requests simultáneos y registra todos
+    los resultados en una sola transacción.
+    """
+
+    def __init__(self, pool=conexiones.pool, url=None, api_key=None,
+                 concurrencia=CONCURRENCIA, tamano_lote=TAMANO_LOTE):
+        url = url or os.environ.get('TICKETERA_URL', '')
+        # Sin URL configurada el despachador no arranca
+        self.url = (url if url.endswith('/api/tickets') else f"{url.rstrip('/')}/api/tickets") if url else None
+        self.api_key = api_key or os.environ.get('BELGRANO_AHORRO_API_KEY', 'belgrano_ahorro_api_key_2025')
+        self.pool = pool
+        self.concurrencia = concurrencia
+        self.tamano_lote = tamano_lote
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._ejecutor = None
+        self._detenido = False
+        # Una sesión HTTP por hilo de envío (conexiones keep-alive)
+        self._local = threading.local()
+
+    # ------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------
+
+    def iniciar(self):
+        """Arrancar el hilo despachador (si no está corriendo y hay TICKETERA_URL)"""
+        if not self.url:
+            logger.warning("TICKETERA_URL no está configurada: los tickets quedan en el outbox sin despachar")
+            return
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._detenido = False
+            self._ejecutor = ThreadPoolExecutor(max_workers=self.concurrencia, thread_name_prefix='ticketera')
+            self._hilo = threading.Thread(target=self._bucle, name='despacho_tickets', daemon=True)
+            self._hilo.start()
+        logger.info(f"Despachador de tickets iniciado ({self.url}, concurrencia {self.concurrencia})")
+
+    def detener(self, espera=None):
+        """Detener el despachador después de la vuelta en curso"""
+        self._detenido = True
+        self._evento.set()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+        if self._ejecutor is not None:
+            self._ejecutor.shutdown(wait=False)
+
+    def despertar(self):
+        """Avisar que hay tickets nuevos (después del commit del pedido)"""
+        self._evento.set()
+
+    def _bucle(self):
+        while not self._detenido:
+            try:
+                procesados, espera = self.procesar_lote()
+            except Exception as e:
+                logger.error(f"Error en el despachador de tickets: {e}")
+                procesados, espera = 0, ESPERA_SONDEO
+            if procesados >= self.tamano_lote:
+                # Puede haber más trabajo vencido
+                continue
+            self._evento.wait(espera)
+            self._evento.clear()
+
+    # ------------------------------------------
+    # Lotes
+    # ------------------------------------------
+
+    def procesar_lote(self):
+        """
+        Reclamar, enviar y registrar un lote de tickets vencidos
+
+        RETORNA:
+        - (tickets procesados, segundos hasta el próximo ticket vencido)
+        """
+        filas, espera = self._reclamar()
+        if not filas:
+            return 0, espera
+        if self._ejecutor is not None:
+            resultados = list(self._ejecutor.map(self._enviar, filas))
+        else:
+            resultados = [self._enviar(fila) for fila in filas]
+        self._registrar(resultados)
+        return len(filas), 0
+
+    def _reclamar(self):
+        ahora = time.time()
+        with self.pool.transaccion() as conn:
+            filas = conn.execute('''
+                SELECT id, numero, payload, intentos FROM outbox_tickets
+                WHERE estado = 'pendiente' AND proximo_intento <= ?
+                ORDER BY proximo_intento, id LIMIT ?
+            ''', (ahora, self.tamano_lote)).fetchall()
+            if filas:
+                conn.executemany("UPDATE outbox_tickets SET proximo_intento = ? WHERE id = ?",
+                                 [(ahora + RESERVA_LOTE, fila[0]) for fila in filas])
+                espera = 0
+            else:
+                proximo = conn.execute(
+                    "SELECT MIN(proximo_intento) FROM outbox_tickets WHERE estado = 'pendiente'").fetchone()[0]
+                espera = ESPERA_SONDEO if proximo is None else min(max(proximo - ahora, 0.05), ESPERA_SONDEO)
+        return filas, espera
+
+    def _sesion(self):
+        sesion = getattr(self._local, 'sesion', None)
+        if sesion is None:
+            sesion = self._local.sesion = requests.Session()
+        return sesion
+
+    def _enviar(self, fila):
+        """Enviar un ticket; devuelve (id, numero, intentos, estado, detalle)"""
+        id_fila, numero, payload, intentos = fila
+        headers = {
+            'Content-Type': 'application/json',
+            'X-API-Key': self.api_key,
+            'User-Agent': 'BelgranoAhorro/1.0.0',
+            # Estables entre reintentos: la Ticketera deduplica por numero
+            'X-Request-ID': numero,
+            'Idempotency-Key': numero,
+            'X-Origin': 'belgrano_ahorro'
+        }
+        try:
+            respuesta = self._sesion().post(self.url, data=payload.encode('utf-8'), headers=headers,
+                                            timeout=TIMEOUT_ENVIO)
+        except requests.exceptions.RequestException as e:
+            return id_fila, numero, intentos, 'reintentar', f"{type(e).__name__}: {e}"
+
+        if respuesta.status_code in (200, 201):
+            try:
+                datos = respuesta.json()
+            except ValueError:
+                datos = {}
+            return id_fila, numero, intentos, 'enviado', datos
+        texto = respuesta.text[:500]
+        if respuesta.status_code in ESTADOS_RECHAZO:
+            return id_fila, numero, intentos, 'fallido', f"Status {respuesta.status_code}: {texto}"
+        return id_fila, numero, intentos, 'reintentar', f"Status {respuesta.status_code}: {texto}"
+
+    def _registrar(self, resultados):
+        ahora = time.time()
+        enviados = reintentos = fallidos = 0
+        with self.pool.transaccion() as conn:
+            for id_fila, numero, intentos, estado, detalle in resultados:
+                intentos += 1
+                if estado == 'enviado':
+                    enviados += 1
+                    conn.execute('''
+                        UPDATE outbox_tickets
+                        SET estado = 'enviado', intentos = ?, ticket_id = ?, ultimo_error = NULL,
+                            fecha_envio = CURRENT_TIMESTAMP
+                        WHERE id = ?
+                    ''', (intentos, detalle.get('ticket_id'), id_fila))
+                    self._confirmar_pedido(conn, numero, detalle)
+                    continue
+
+                if estado == 'reintentar' and intentos < MAX_INTENTOS:
+                    reintentos += 1
+                    espera = min(BACKOFF_MAXIMO, BACKOFF_BASE * 2 ** (intentos - 1)) * random.uniform(0.8, 1.2)
+                    conn.execute('''
+                        UPDATE outbox_tickets SET intentos = ?, proximo_intento = ?, ultimo_error = ?
+                        WHERE id = ?
+                    ''', (intentos, ahora + espera, detalle, id_fila))
+                else:
+                    fallidos += 1
+                    conn.execute('''
+                        UPDATE outbox_tickets SET estado = 'fallido', intentos = ?, ultimo_error = ?
+                        WHERE id = ?
+                    ''', (intentos, detalle, id_fila))
+                    logger.error(f"Ticket {numero} no entregado después de {intentos} intentos: {detalle}")
+        logger.info(f"Tickets despachados: {enviados} enviados, {reintentos} a reintentar, {fallidos} fallidos")
+
+    @staticmethod
+    def _confirmar_pedido(conn, numero, respuesta):
+        """Marcar el pedido con el estado del ticket (bases sin las columnas de ticket se ignoran)"""
+        try:
+            conn.execute('''
+                UPDATE pedidos SET ticket_confirmado = 1, ticket_estado = ?, fecha_confirmacion = CURRENT_TIMESTAMP
+                WHERE numero_pedido = ?
+            ''', (respuesta.get('estado', 'pendiente'), numero))
+        except sqlite3.OperationalError as e:
+            logger.debug(f"Pedido {numero} sin columnas de ticket: {e}")
+
+# Instancia global del proceso (la inicia app.iniciar_servicios() al arrancar el servidor)
+despachador_tickets = DespachadorTickets()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    with conexiones.conexion() as conn:
+        esquema.migrar(conn)
+        if len(sys.argv) > 1 and sys.argv[1] == 'resumen':
+            print(json.dumps(resumen_outbox(conn), ensure_ascii=False))
+            sys.exit(0)
+
+    if not despachador_tickets.url:
+        print("TICKETERA_URL no está configurada")
+        sys.exit(1)
+
+    total = 0
+    while True:
+        procesados, _ = despachador_tickets.procesar_lote()
+        if not procesados:
+            break
+        total += procesados
+    print(f"Tickets procesados: {total}")
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Migraciones del esquema de la base de Belgrano Ahorro
+La versión del esquema se guarda en PRAGMA user_version y los cambios viven
+en el directorio migraciones/, un archivo por versión:
+
+- NNNN_descripcion.sql: sentencias SQL
+- NNNN_descripcion.py: una función aplicar(conn)
+
+Cada migración pendiente se aplica en su propia transacción (BEGIN
+IMMEDIATE) junto con el nuevo user_version: o se aplica entera o no se
+aplica. Con la base al día, migrar() es una sola lectura de user_version
+y no ejecuta DDL.
+
+USO:
+    python esquema.py            # aplicar las migraciones pendientes
+    python esquema.py estado     # versión de la base y migraciones pendientes
+
+MANTENIMIENTO:
+- Las migraciones ya publicadas no se editan: los cambios van en un archivo
+  nuevo con el número siguiente
+- Las migraciones .py no deben hacer commit (ni `with conn:` ni
+  executescript); para scripts SQL usar conexiones.ejecutar_script
+"""
+
+import importlib.util
+import json
+import logging
+import os
+import re
+import sys
+import threading
+
+import conexiones
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO_MIGRACIONES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migraciones')
+PATRON_MIGRACION = re.compile(r'^(\d+)_(\w+)\.(sql|py)$')
+
+_lock = threading.Lock()
+_listados = {}
+
+def listar_migraciones(directorio=DIRECTORIO_MIGRACIONES):
+    """
+    Migraciones del directorio ordenadas por versión
+
+    RETORNA:
+    - Lista de (version, nombre, ruta); se lee una vez por proceso
+    """
+    with _lock:
+        if directorio in _listados:
+            return _listados[directorio]
+    migraciones = []
+    for archivo in os.listdir(directorio):
+        coincidencia = PATRON_MIGRACION.match(archivo)
+        if coincidencia:
+            migraciones.append((int(coincidencia.group(1)), coincidencia.group(2),
+                                os.path.join(directorio, archivo)))
+    migraciones.sort()
+    versiones = [version for version, _nombre, _ruta in migraciones]
+    if len(set(versiones)) != len(versiones) or 0 in versiones:
+        raise ValueError(f"Números de migración repetidos o en cero en {directorio}")
+    with _lock:
+        _listados[directorio] = migraciones
+    return migraciones
+
+def version_actual(conn):
+    """Versión del esquema de la base (0 si nunca se migró)"""
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+def _aplicar(conn, ruta):
+    if ruta.endswith('.sql'):
+        with open(ruta, encoding='utf-8') as f:
+            conexiones.ejecutar_script(conn, f.read())
+        return
+    spec = importlib.util.spec_from_file_location(f"migracion_{os.path.basename(ruta)[:-3]}", ruta)
+    modulo = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(modulo)
+    modulo.aplicar(conn)
+
+def migrar(conn=None, directorio=DIRECTORIO_MIGRACIONES):
+    """
+    Llevar la base a la última versión del esquema
+
+    PARÁMETROS:
+    - conn: conexión a migrar (por defecto una del pool de conexiones.py)
+    - directorio: directorio de las migraciones
+
+    RETORNA:
+    - Lista de (version, nombre) de las migraciones aplicadas ([] si estaba al día)
+    """
+    migraciones = listar_migraciones(directorio)
+    if conn is None:
+        with conexiones.conexion() as conn:
+            return migrar(conn, directorio)
+    if not migraciones or version_actual(conn) >= migraciones[-1][0]:
+        return []
+
+    aplicadas = []
+    nivel_aislamiento = conn.isolation_level
+    # Transacciones explícitas: el módulo sqlite3 no debe abrir ni cerrar ninguna por su cuenta
+    conn.isolation_level = None
+    try:
+        for version, nombre, ruta in migraciones:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # Otro proceso pudo aplicarla mientras se esperaba el lock
+                if version_actual(conn) >= version:
+                    conn.execute('COMMIT')
+                    continue
+                _aplicar(conn, ruta)
+                conn.execute(f'PRAGMA user_version = {version}')
+                conn.execute('COMMIT')
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+                raise
+            logger.info(f"Migración {version:04d} aplicada: {nombre}")
+            aplicadas.append((version, nombre))
+    finally:
+        conn.isolation_level = nivel_aislamiento
+    return aplicadas
+
+def estado(conn=None, directorio=DIRECTORIO_MIGRACIONES):
+    """Versión de la base, última versión disponible y migraciones pendientes"""
+    if conn is None:
+        with conexiones.conexion() as conn:
+            return estado(conn, directorio)
+    migraciones = listar_migraciones(directorio)
+    version = version_actual(conn)
+    return {
+        'version': version,
+        'ultima': migraciones[-1][0] if migraciones else 0,
+        'pendientes': [f"{v:04d}_{nombre}" for v, nombre, _ruta in migraciones if v > version]
+    }
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    if len(sys.argv) > 1 and sys.argv[1] == 'estado':
+        print(json.dumps(estado(), ensure_ascii=False))
+    else:
+        aplicadas = migrar()
+        print(f"✅ Esquema al día (versión {estado()['version']}, {len(aplicadas)} migraciones aplicadas)")
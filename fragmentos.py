@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de fragmentos renderizados para Belgrano Ahorro
+Guarda el HTML de las secciones del catálogo (grillas de productos, ofertas,
+categorías) por versión del catálogo y parámetros de la ruta
+"""
+
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+from flask import has_request_context, request
+from markupsafe import Markup
+
+from ofertas import ofertas_vigentes
+
+logger = logging.getLogger(__name__)
+
+# ==========================================
+# CACHE LRU DE FRAGMENTOS
+# ==========================================
+
+class CacheFragmentos:
+    """
+    Cache LRU de HTML renderizado
+
+    PARÁMETROS:
+    - capacidad: cantidad máxima de fragmentos guardados
+    """
+
+    def __init__(self, capacidad=256):
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        self._fragmentos = OrderedDict()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave):
+        with self._lock:
+            html = self._fragmentos.get(clave)
+            if html is None:
+                self.fallos += 1
+                return None
+            self._fragmentos.move_to_end(clave)
+            self.aciertos += 1
+            return html
+
+    def guardar(self, clave, html):
+        with self._lock:
+            self._fragmentos[clave] = html
+            self._fragmentos.move_to_end(clave)
+            while len(self._fragmentos) > self.capacidad:
+                self._fragmentos.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._fragmentos.clear()
+
+    def estadisticas(self):
+        with self._lock:
+            return {
+                'fragmentos': len(self._fragmentos),
+                'capacidad': self.capacidad,
+                'aciertos': self.aciertos,
+                'fallos': self.fallos
+            }
+
+# Instancia global de la cache
+cache_fragmentos = CacheFragmentos(int(os.environ.get('FRAGMENTOS_CACHE_CAPACIDAD', '256')))
+
+def clave_contenido():
+    """Versión del contenido del catálogo (productos.json + ofertas vigentes)"""
+    # La vista de ofertas se reconstruye con cada versión nueva del catálogo
+    vista = ofertas_vigentes.obtener()
+    return (vista.version_catalogo, vista.generacion)
+
+def parametros_ruta():
+    """Parámetros de la ruta actual (ej: negocio_id) como tupla ordenada"""
+    if not has_request_context() or not request.view_args:
+        return ()
+    return tuple(sorted((k, str(v)) for k, v in request.view_args.items()))
+
+def fragmento_cacheado(nombre, *parametros, caller=None):
+    """
+    Renderizar (o reutilizar) un bloque de template
+
+    La clave incluye el nombre del fragmento, los parámetros de la ruta,
+    los parámetros extra recibidos y la versión del catálogo. El stock no
+    forma parte de la clave (cambia con cada pedido): las tarjetas lo
+    marcan con data-stock-producto y partials/stock_vigente.html, fuera
+    del bloque, lo actualiza en cada request.
+
+    USO EN TEMPLATES:
+        {% call fragmento_cacheado('negocio') %}
+            ... HTML que sólo depende del catálogo ...
+        {% endcall %}
+
+    MANTENIMIENTO:
+    - Dentro del bloque no debe haber datos del usuario (sesión, carrito, flash):
+      el HTML se comparte entre todos los visitantes
+    - Tampoco datos que cambian con los pedidos (stock): van fuera del bloque
+    """
+    clave = (nombre, parametros_ruta(), tuple(str(p) for p in parametros)) + clave_contenido()
+    html = cache_fragmentos.obtener(clave)
+    if html is None:
+        html = Markup(caller())
+        cache_fragmentos.guardar(clave, html)
+    return html
+
+def register_fragment_cache(app):
+    """Registrar la cache de fragmentos en el entorno de Jinja"""
+    app.jinja_env.globals['fragmento_cacheado'] = fragmento_cacheado
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Claves de idempotencia de Belgrano Ahorro
+Un formulario que crea algo (el checkout) lleva una clave aleatoria; el primer
+envío la reclama y guarda su resultado, y los reenvíos (doble clic,
+reintento del navegador) reciben ese mismo resultado sin volver a ejecutar
+la operación
+
+Estados de una clave:
+- en_curso: el primer envío todavía se está procesando
+- completada: la operación terminó y `resultado` tiene su respuesta
+Si la operación falla la clave se borra, así el mismo formulario puede
+reenviarse. Las claves vencen a las DURACION_CLAVE segundos.
+"""
+
+import json
+import logging
+import secrets
+import time
+
+import conexiones
+
+logger = logging.getLogger(__name__)
+
+# Segundos que se recuerda una clave
+DURACION_CLAVE = 24 * 60 * 60
+# Claves vencidas que se borran por reclamo
+LOTE_VENCIDAS = 500
+
+def nueva_clave():
+    """Clave aleatoria para un formulario"""
+    return secrets.token_urlsafe(24)
+
+class ClavesIdempotencia:
+    """
+    Registro de claves de idempotencia en la base
+
+    Uso típico:
+        previa = claves.reclamar('checkout', clave, usuario_id)
+        if previa is not None:
+            ...  # reenvío: responder con previa['resultado']
+        try operación:
+            claves.completar('checkout', clave, resultado)
+        si falla:
+            claves.liberar('checkout', clave)
+
+    PARÁMETROS:
+    - pool: pool de la base (conexiones.pool)
+    """
+
+    def __init__(self, pool=conexiones.pool, duracion=DURACION_CLAVE):
+        self.pool = pool
+        self.duracion = duracion
+
+    def reclamar(self, ambito, clave, usuario_id=None):
+        """
+        Reclamar una clave para ejecutar la operación
+
+        RETORNA:
+        - None si la clave es nueva (la operación debe ejecutarse)
+        - {'estado', 'resultado', 'usuario_id'} si la clave ya se usó
+        """
+        ahora = time.time()
+        with self.pool.transaccion() as conn:
+            conn.execute('''
+                DELETE FROM claves_idempotencia WHERE rowid IN (
+                    SELECT rowid FROM claves_idempotencia WHERE vence < ? LIMIT ?)
+            ''', (ahora, LOTE_VENCIDAS))
+            cursor = conn.execute('''
+                INSERT OR IGNORE INTO claves_idempotencia (ambito, clave, usuario_id, vence)
+                VALUES (?, ?, ?, ?)
+            ''', (ambito, clave, usuario_id, ahora + self.duracion))
+            if cursor.rowcount == 1:
+                return None
+            fila = conn.execute('''
+                SELECT estado, resultado, usuario_id FROM claves_idempotencia
+                WHERE ambito = ? AND clave = ?
+            ''', (ambito, clave)).fetchone()
+        return {
+            'estado': fila[0],
+            'resultado': json.loads(fila[1]) if fila[1] else None,
+            'usuario_id': fila[2]
+        }
+
+    def consultar(self, ambito, clave):
+        """Estado actual de una clave ({'estado', 'resultado', 'usuario_id'} o None)"""
+        with self.pool.conexion() as conn:
+            fila = conn.execute('''
+                SELECT estado, resultado, usuario_id FROM claves_idempotencia
+                WHERE ambito = ? AND clave = ? AND vence >= ?
+            ''', (ambito, clave, time.time())).fetchone()
+        if not fila:
+            return None
+        return {'estado': fila[0], 'resultado': json.loads(fila[1]) if fila[1] else None, 'usuario_id': fila[2]}
+
+    def esperar(self, ambito, clave, espera_maxima=5.0, intervalo=0.1):
+        """
+        Esperar a que termine el envío que tiene la clave en curso
+
+        RETORNA:
+        - El estado de la clave (completada, todavía en curso, o None si se liberó)
+        """
+        limite = time.monotonic() + espera_maxima
+        while True:
+            estado = self.consultar(ambito, clave)
+            if estado is None or estado['estado'] != 'en_curso' or time.monotonic() >= limite:
+                return estado
+            time.sleep(intervalo)
+
+    def completar(self, ambito, clave, resultado):
+        """Guardar el resultado de la operación para los reenvíos"""
+        with self.pool.transaccion() as conn:
+            conn.execute('''
+                UPDATE claves_idempotencia SET estado = 'completada', resultado = ?
+                WHERE ambito = ? AND clave = ?
+            ''', (json.dumps(resultado), ambito, clave))
+
+    def liberar(self, ambito, clave):
+        """Borrar una clave en curso cuya operación falló (el formulario puede reenviarse)"""
+        with self.pool.transaccion() as conn:
+            conn.execute('''
+                DELETE FROM claves_idempotencia
+                WHERE ambito = ? AND clave = ? AND estado = 'en_curso'
+            ''', (ambito, clave))
+
+# Instancia global del proceso
+claves_idempotencia = ClavesIdempotencia()
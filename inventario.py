@@ -0,0 +1,391 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Inventario de Belgrano Ahorro
+Stock por producto y sucursal con reservas atómicas en el checkout y un
+libro de movimientos de solo inserción
+
+- stock_sucursal: unidades disponibles por (producto, sucursal)
+- reservas_stock: unidades apartadas por un pedido (activa -> confirmada o liberada)
+- movimientos_stock: cada cambio de stock disponible (inicial, reserva,
+  liberacion, ajuste); la suma de los movimientos de un producto es su stock
+
+Cada reserva es una transacción corta con decremento condicional
+(disponible >= cantidad), así dos compras simultáneas nunca venden la misma
+unidad. Las reservas que no se confirman a tiempo se liberan solas.
+
+USO:
+    python inventario.py stock <producto_id>
+    python inventario.py ajustar <producto_id> <sucursal_id> <cantidad> [motivo]
+
+MANTENIMIENTO:
+- El stock de productos.json solo se usa para inicializar un producto la
+  primera vez que se reserva; después manda el libro de movimientos y los
+  cambios se cargan con `ajustar`
+- Las lecturas (tarjetas de la tienda, faceta en_stock, búsqueda y API)
+  muestran las unidades de la vista de stock: stock_disponible() en las
+  plantillas (stock_vigente() sobre los fragmentos cacheados, ver
+  fragmentos.py), disponibles()/con_stock() en las respuestas y
+  foto_stock() en las listas cacheadas de la API
+"""
+
+import logging
+import sqlite3
+import sys
+import threading
+import time
+
+import conexiones
+
+logger = logging.getLogger(__name__)
+
+# Segundos que una reserva espera su confirmación antes de liberarse
+DURACION_RESERVA = 15 * 60
+# Reservas vencidas que se liberan por llamada
+LOTE_VENCIDAS = 100
+# Antigüedad máxima de la vista de stock antes de leer movimientos nuevos
+INTERVALO_VISTA = 1.0
+
+def confirmar_reservas(conn, referencia):
+    """
+    Confirmar las reservas de un pedido dentro de la transacción abierta en
+    `conn` (la que guarda el pedido, ver db.crear_pedido_con_items)
+
+    RETORNA:
+    - Cantidad de reservas confirmadas
+    """
+    return conn.execute('''
+        UPDATE reservas_stock SET estado = 'confirmada'
+        WHERE referencia = ? AND estado = 'activa'
+    ''', (referencia,)).rowcount
+
+def stock_inicial_por_sucursal(producto):
+    """
+    Repartir el stock del catálogo entre las sucursales del producto
+
+    RETORNA:
+    - [(sucursal_id, unidades)]; el resto de la división va a las primeras
+      sucursales. Un producto sin sucursales usa sucursal_id ''.
+    """
+    sucursales = list(producto.get('sucursales') or ['']) or ['']
+    stock = max(int(producto.get('stock') or 0), 0)
+    base, resto = divmod(stock, len(sucursales))
+    return [(sucursal_id, base + (1 if posicion < resto else 0))
+            for posicion, sucursal_id in enumerate(sucursales)]
+
+# ==========================================
+# VISTA DE STOCK
+# ==========================================
+
+class VistaStock:
+    """
+    Stock disponible por producto para las lecturas
+
+    Se arma una vez desde stock_sucursal y después se actualiza de a poco
+    sumando los movimientos nuevos del libro (id > último leído), como mucho
+    cada INTERVALO_VISTA segundos o enseguida después de un cambio local.
+    """
+
+    def __init__(self, pool=conexiones.pool):
+        self.pool = pool
+        self._lock = threading.Lock()
+        self._stock = None
+        self._ultimo_movimiento = 0
+        # (último movimiento, stock) de la misma lectura
+        self._foto = (0, {})
+        self._leida = 0
+        self._vencida = True
+
+    def invalidar(self):
+        self._vencida = True
+
+    def obtener(self):
+        """{producto_id: unidades disponibles} de los productos con inventario"""
+        if self._vencida or time.time() - self._leida >= INTERVALO_VISTA:
+            self._actualizar()
+        return self._stock
+
+    def foto(self):
+        """
+        (versión, {producto_id: unidades disponibles}) leídos juntos
+
+        La versión es el último movimiento del libro incluido: cambia
+        cuando cambia algún stock.
+        """
+        self.obtener()
+        return self._foto
+
+    def _actualizar(self):
+        with self._lock:
+            if not self._vencida and time.time() - self._leida < INTERVALO_VISTA:
+                return
+            try:
+                stock, ultimo = self._leer()
+            except sqlite3.Error as e:
+                # Se sigue sirviendo la última vista leída
+                logger.error(f"Error actualizando la vista de stock: {e}")
+                self._leida = time.time()
+                if self._stock is None:
+                    self._stock = {}
+                return
+            # Se reemplaza el diccionario entero: los lectores nunca ven uno a medio actualizar
+            self._stock = stock
+            self._ultimo_movimiento = ultimo
+            self._foto = (ultimo, stock)
+            self._leida = time.time()
+            self._vencida = False
+
+    def _leer(self):
+        # Stock y último movimiento en la misma lectura
+        with self.pool.lectura() as conn:
+            if self._stock is None:
+                stock = dict(conn.execute(
+                    "SELECT producto_id, SUM(disponible) FROM stock_sucursal GROUP BY producto_id"))
+                ultimo = conn.execute("SELECT COALESCE(MAX(id), 0) FROM movimientos_stock").fetchone()[0]
+            else:
+                stock = dict(self._stock)
+                ultimo = self._ultimo_movimiento
+                for producto_id, cantidad, maximo in conn.execute('''
+                    SELECT producto_id, SUM(cantidad), MAX(id) FROM movimientos_stock
+                    WHERE id > ? GROUP BY producto_id
+                ''', (self._ultimo_movimiento,)):
+                    stock[producto_id] = stock.get(producto_id, 0) + cantidad
+                    ultimo = max(ultimo, maximo)
+        return stock, ultimo
+
+# ==========================================
+# INVENTARIO
+# ==========================================
+
+class Inventario:
+    """
+    Reservas de stock para los pedidos
+
+    Flujo del checkout:
+    1. reservar(numero_pedido, lineas): aparta las unidades o no aparta nada
+    2. confirmar_reservas(conn, numero_pedido): en la transacción que guarda el pedido
+    3. liberar(numero_pedido): si el pedido falla o se cancela
+    Las reservas activas vencidas (proceso caído entre 1 y 2) se liberan
+    en la siguiente reserva.
+
+    PARÁMETROS:
+    - pool: pool de la base (conexiones.pool)
+    """
+
+    def __init__(self, pool=conexiones.pool, duracion_reserva=DURACION_RESERVA):
+        self.pool = pool
+        self.duracion_reserva = duracion_reserva
+        self.vista = VistaStock(pool)
+
+    # ------------------------------------------
+    # Lecturas
+    # ------------------------------------------
+
+    def disponible(self, producto):
+        """Unidades disponibles de un producto (del catálogo si todavía no tiene inventario)"""
+        stock = self.vista.obtener().get(producto.get('id'))
+        return stock if stock is not None else producto.get('stock')
+
+    def disponibles(self, productos):
+        """{producto_id: unidades disponibles} para varios productos con una sola lectura de la vista"""
+        stock = self.vista.obtener()
+        return {producto.get('id'): stock.get(producto.get('id'), producto.get('stock')) for producto in productos}
+
+    def stock_por_producto(self):
+        """{producto_id: unidades disponibles} de los productos con inventario (ver consultas.py)"""
+        return self.vista.obtener()
+
+    def foto_stock(self):
+        """(versión, stock_por_producto()) para respuestas cacheadas por versión del stock"""
+        return self.vista.foto()
+
+    def con_stock(self, productos):
+        """Copias de los productos con 'stock' reemplazado por las unidades disponibles"""
+        stock = self.disponibles(productos)
+        return [dict(producto, stock=stock[producto.get('id')]) for producto in productos]
+
+    # ------------------------------------------
+    # Reservas
+    # ------------------------------------------
+
+    def reservar(self, referencia, lineas):
+        """
+        Reservar el stock de un pedido (todas las líneas o ninguna)
+
+        PARÁMETROS:
+        - referencia: número de pedido
+        - lineas: [(producto, cantidad)] con productos del catálogo; los
+          productos sin 'stock' en el catálogo no llevan inventario
+
+        RETORNA:
+        - {'exito': True, 'mensaje', 'reservas': cantidad de filas}
+        - {'exito': False, 'mensaje', 'faltantes': [{producto_id, nombre, pedido, disponible}]}
+        """
+        ahora = time.time()
+        self._liberar_vencidas(ahora)
+        with self.pool.transaccion() as conn:
+            reservas = []
+            faltantes = []
+            for producto, cantidad in lineas:
+                if producto.get('stock') is None or cantidad <= 0:
+                    continue
+                producto_id = producto['id']
+                self._inicializar_producto(conn, producto)
+                restante = cantidad
+                filas = conn.execute('''
+                    SELECT sucursal_id, disponible FROM stock_sucursal
+                    WHERE producto_id = ? AND disponible > 0
+                ''', (producto_id,)).fetchall()
+                # Primero las sucursales en el orden del producto
+                orden = {sucursal_id: posicion for posicion, sucursal_id in enumerate(producto.get('sucursales') or [])}
+                filas.sort(key=lambda fila: orden.get(fila[0], len(orden)))
+                for sucursal_id, disponible in filas:
+                    tomar = min(disponible, restante)
+                    # Decremento condicional: nunca deja stock negativo
+                    cursor = conn.execute('''
+                        UPDATE stock_sucursal SET disponible = disponible - ?
+                        WHERE producto_id = ? AND sucursal_id = ? AND disponible >= ?
+                    ''', (tomar, producto_id, sucursal_id, tomar))
+                    if cursor.rowcount != 1:
+                        continue
+                    reservas.append((producto_id, sucursal_id, tomar))
+                    restante -= tomar
+                    if not restante:
+                        break
+                if restante:
+                    faltantes.append({
+                        'producto_id': producto_id,
+                        'nombre': producto.get('nombre'),
+                        'pedido': cantidad,
+                        'disponible': cantidad - restante
+                    })
+
+            if faltantes:
+                conn.rollback()
+                nombres = ', '.join(str(f['nombre']) for f in faltantes)
+                return {'exito': False, 'mensaje': f'Sin stock suficiente: {nombres}', 'faltantes': faltantes}
+
+            conn.executemany('''
+                INSERT INTO reservas_stock (referencia, producto_id, sucursal_id, cantidad, vence)
+                VALUES (?, ?, ?, ?, ?)
+            ''', [(referencia, producto_id, sucursal_id, tomar, ahora + self.duracion_reserva)
+                  for producto_id, sucursal_id, tomar in reservas])
+            conn.executemany('''
+                INSERT INTO movimientos_stock (producto_id, sucursal_id, cantidad, tipo, referencia)
+                VALUES (?, ?, ?, 'reserva', ?)
+            ''', [(producto_id, sucursal_id, -tomar, referencia) for producto_id, sucursal_id, tomar in reservas])
+        self.vista.invalidar()
+        return {'exito': True, 'mensaje': 'Stock reservado', 'reservas': len(reservas)}
+
+    def _inicializar_producto(self, conn, producto):
+        """Crear el stock por sucursal de un producto que todavía no tiene inventario"""
+        if conn.execute("SELECT 1 FROM stock_sucursal WHERE producto_id = ? LIMIT 1", (producto['id'],)).fetchone():
+            return
+        filas = stock_inicial_por_sucursal(producto)
+        conn.executemany("INSERT INTO stock_sucursal (producto_id, sucursal_id, disponible) VALUES (?, ?, ?)",
+                         [(producto['id'], sucursal_id, unidades) for sucursal_id, unidades in filas])
+        conn.executemany('''
+            INSERT INTO movimientos_stock (producto_id, sucursal_id, cantidad, tipo, referencia)
+            VALUES (?, ?, ?, 'inicial', 'catalogo')
+        ''', [(producto['id'], sucursal_id, unidades) for sucursal_id, unidades in filas])
+
+    def liberar(self, referencia, motivo='liberacion'):
+        """
+        Devolver al stock las reservas de un pedido (fallido o cancelado)
+
+        RETORNA:
+        - Unidades devueltas
+        """
+        with self.pool.transaccion() as conn:
+            filas = conn.execute('''
+                SELECT id, producto_id, sucursal_id, cantidad FROM reservas_stock
+                WHERE referencia = ? AND estado IN ('activa', 'confirmada')
+            ''', (referencia,)).fetchall()
+            self._devolver(conn, filas, motivo)
+        self.vista.invalidar()
+        return sum(fila[3] for fila in filas)
+
+    def _liberar_vencidas(self, ahora):
+        """Liberar reservas activas cuyo plazo de confirmación venció"""
+        with self.pool.conexion() as conn:
+            if not conn.execute("SELECT 1 FROM reservas_stock WHERE estado = 'activa' AND vence < ? LIMIT 1",
+                                (ahora,)).fetchone():
+                return 0
+        with self.pool.transaccion() as conn:
+            filas = conn.execute('''
+                SELECT id, producto_id, sucursal_id, cantidad, referencia FROM reservas_stock
+                WHERE estado = 'activa' AND vence < ? LIMIT ?
+            ''', (ahora, LOTE_VENCIDAS)).fetchall()
+            self._devolver(conn, [fila[:4] for fila in filas], 'vencimiento', [fila[4] for fila in filas])
+        if filas:
+            logger.info(f"Reservas de stock vencidas liberadas: {len(filas)}")
+        return len(filas)
+
+    @staticmethod
+    def _devolver(conn, filas, tipo, referencias=None):
+        for posicion, (reserva_id, producto_id, sucursal_id, cantidad) in enumerate(filas):
+            conn.execute("UPDATE reservas_stock SET estado = 'liberada' WHERE id = ?", (reserva_id,))
+            conn.execute('''
+                UPDATE stock_sucursal SET disponible = disponible + ?
+                WHERE producto_id = ? AND sucursal_id = ?
+            ''', (cantidad, producto_id, sucursal_id))
+            referencia = referencias[posicion] if referencias else None
+            conn.execute('''
+                INSERT INTO movimientos_stock (producto_id, sucursal_id, cantidad, tipo, referencia)
+                VALUES (?, ?, ?, ?, COALESCE(?, (SELECT referencia FROM reservas_stock WHERE id = ?)))
+            ''', (producto_id, sucursal_id, cantidad, tipo, referencia, reserva_id))
+
+    # ------------------------------------------
+    # Ajustes
+    # ------------------------------------------
+
+    def ajustar(self, producto, sucursal_id, cantidad, motivo='ajuste'):
+        """
+        Sumar (o restar, con cantidad negativa) stock de una sucursal
+
+        RETORNA:
+        - {'exito', 'mensaje', 'disponible'}
+        """
+        with self.pool.transaccion() as conn:
+            self._inicializar_producto(conn, producto)
+            conn.execute('''
+                INSERT OR IGNORE INTO stock_sucursal (producto_id, sucursal_id, disponible) VALUES (?, ?, 0)
+            ''', (producto['id'], sucursal_id))
+            cursor = conn.execute('''
+                UPDATE stock_sucursal SET disponible = disponible + ?
+                WHERE producto_id = ? AND sucursal_id = ? AND disponible + ? >= 0
+            ''', (cantidad, producto['id'], sucursal_id, cantidad))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                return {'exito': False, 'mensaje': 'El ajuste dejaría stock negativo'}
+            conn.execute('''
+                INSERT INTO movimientos_stock (producto_id, sucursal_id, cantidad, tipo, referencia)
+                VALUES (?, ?, ?, 'ajuste', ?)
+            ''', (producto['id'], sucursal_id, cantidad, motivo))
+            disponible = conn.execute('''
+                SELECT disponible FROM stock_sucursal WHERE producto_id = ? AND sucursal_id = ?
+            ''', (producto['id'], sucursal_id)).fetchone()[0]
+        self.vista.invalidar()
+        return {'exito': True, 'mensaje': 'Stock ajustado', 'disponible': disponible}
+
+# Instancia global del proceso
+inventario = Inventario()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    from catalogo import catalogo
+
+    if len(sys.argv) < 3 or sys.argv[1] not in ('stock', 'ajustar'):
+        print(__doc__)
+        sys.exit(1)
+
+    producto = catalogo.obtener().producto(sys.argv[2])
+    if not producto:
+        print(f"Producto {sys.argv[2]} no encontrado")
+        sys.exit(1)
+
+    if sys.argv[1] == 'ajustar':
+        motivo = sys.argv[5] if len(sys.argv) > 5 else 'ajuste'
+        print(inventario.ajustar(producto, sys.argv[3], int(sys.argv[4]), motivo))
+    else:
+        print(f"{producto['nombre']}: {inventario.disponible(producto)} unidades disponibles")
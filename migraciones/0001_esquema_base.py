@@ -0,0 +1,373 @@
+# -*- coding: utf-8 -*-
+"""
+Esquema base de Belgrano Ahorro
+Reúne lo que antes creaban db.crear_base_datos, db.crear_tabla_tickets,
+/api/actualizar-db y cada módulo (catálogo, carritos, outbox de tickets,
+inventario, idempotencia) en cada arranque. Es idempotente: sobre una base
+creada con esas funciones solo agrega lo que falte.
+
+MANTENIMIENTO:
+- El DDL es una copia fija: no importar los módulos de la aplicación, así
+  un cambio en ellos no cambia lo que hace esta migración
+"""
+
+import logging
+
+import conexiones
+
+logger = logging.getLogger(__name__)
+
+ESQUEMA_BASE = '''
+CREATE TABLE IF NOT EXISTS usuarios (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    nombre VARCHAR(50) NOT NULL,
+    apellido VARCHAR(50) NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL,
+    telefono VARCHAR(20),
+    direccion TEXT,
+    fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP,
+    password VARCHAR(100) NOT NULL,
+    rol VARCHAR(20) DEFAULT 'cliente'
+);
+
+CREATE TABLE IF NOT EXISTS pedidos (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    usuario_id INTEGER NOT NULL,
+    numero_pedido VARCHAR(50) UNIQUE NOT NULL,
+    fecha DATETIME DEFAULT CURRENT_TIMESTAMP,
+    total DECIMAL(10,2) NOT NULL,
+    estado VARCHAR(20) DEFAULT 'pendiente',
+    metodo_pago VARCHAR(50),
+    direccion_entrega TEXT,
+    notas TEXT,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+);
+
+CREATE TABLE IF NOT EXISTS pedido_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    pedido_id INTEGER NOT NULL,
+    producto_id INTEGER NOT NULL,
+    cantidad INTEGER NOT NULL,
+    precio_unitario DECIMAL(10,2) NOT NULL,
+    subtotal DECIMAL(10,2) NOT NULL,
+    FOREIGN KEY (pedido_id) REFERENCES pedidos (id),
+    FOREIGN KEY (producto_id) REFERENCES productos (id)
+);
+
+CREATE TABLE IF NOT EXISTS comerciantes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    usuario_id INTEGER NOT NULL,
+    nombre_negocio VARCHAR(100) NOT NULL,
+    cuit VARCHAR(20),
+    direccion_comercial TEXT,
+    telefono_comercial VARCHAR(20),
+    tipo_negocio VARCHAR(50),
+    fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP,
+    activo BOOLEAN DEFAULT 1,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+);
+
+CREATE TABLE IF NOT EXISTS paquetes_comerciantes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    comerciante_id INTEGER NOT NULL,
+    nombre_paquete VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    activo BOOLEAN DEFAULT 1,
+    frecuencia VARCHAR(20) DEFAULT 'mensual',
+    proximo_pedido DATE,
+    FOREIGN KEY (comerciante_id) REFERENCES comerciantes (id)
+);
+
+CREATE TABLE IF NOT EXISTS paquete_items (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    paquete_id INTEGER NOT NULL,
+    producto_id VARCHAR(50) NOT NULL,
+    cantidad INTEGER NOT NULL,
+    FOREIGN KEY (paquete_id) REFERENCES paquetes_comerciantes (id)
+);
+
+CREATE TABLE IF NOT EXISTS tokens_recuperacion (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    usuario_id INTEGER NOT NULL,
+    token VARCHAR(100) UNIQUE NOT NULL,
+    expiracion DATETIME NOT NULL,
+    usado BOOLEAN DEFAULT 0,
+    FOREIGN KEY (usuario_id) REFERENCES usuarios (id)
+);
+
+CREATE TABLE IF NOT EXISTS tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero VARCHAR(50) UNIQUE NOT NULL,
+    cliente_nombre VARCHAR(100) NOT NULL,
+    cliente_direccion TEXT,
+    cliente_telefono VARCHAR(20),
+    cliente_email VARCHAR(100),
+    productos TEXT NOT NULL,
+    total DECIMAL(10,2) NOT NULL DEFAULT 0.00,
+    estado VARCHAR(20) DEFAULT 'pendiente',
+    estado_envio VARCHAR(20) DEFAULT 'pendiente',
+    prioridad VARCHAR(20) DEFAULT 'normal',
+    indicaciones TEXT,
+    repartidor VARCHAR(50),
+    fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    fecha_actualizacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    fecha_envio DATETIME,
+    fecha_entrega DATETIME
+);
+
+CREATE TABLE IF NOT EXISTS registro_tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ticket_id INTEGER NOT NULL,
+    numero VARCHAR(50) NOT NULL,
+    cliente_nombre VARCHAR(100) NOT NULL,
+    cliente_direccion TEXT,
+    cliente_telefono VARCHAR(20),
+    cliente_email VARCHAR(100),
+    productos TEXT NOT NULL,
+    total DECIMAL(10,2) NOT NULL,
+    estado_final VARCHAR(20) NOT NULL,
+    estado_envio_final VARCHAR(20) NOT NULL,
+    prioridad VARCHAR(20),
+    indicaciones TEXT,
+    repartidor VARCHAR(50),
+    fecha_creacion DATETIME,
+    fecha_envio DATETIME,
+    fecha_entrega DATETIME,
+    fecha_registro DATETIME DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (ticket_id) REFERENCES tickets (id)
+);
+'''
+
+# Tablas del catálogo (antes catalogo_db.crear_tablas_catalogo)
+ESQUEMA_CATALOGO = '''
+CREATE TABLE IF NOT EXISTS negocios (
+    id VARCHAR(50) PRIMARY KEY,
+    numero INTEGER,
+    nombre VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    logo VARCHAR(255),
+    color VARCHAR(20),
+    activo BOOLEAN,
+    orden INTEGER NOT NULL,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS sucursales (
+    negocio_id VARCHAR(50) NOT NULL,
+    id VARCHAR(50) NOT NULL,
+    numero INTEGER,
+    nombre VARCHAR(100),
+    direccion TEXT,
+    telefono VARCHAR(30),
+    horarios TEXT,
+    activo BOOLEAN,
+    orden INTEGER NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (negocio_id, id),
+    FOREIGN KEY (negocio_id) REFERENCES negocios (id)
+);
+
+CREATE TABLE IF NOT EXISTS categorias (
+    id VARCHAR(50) PRIMARY KEY,
+    numero INTEGER,
+    nombre VARCHAR(100) NOT NULL,
+    descripcion TEXT,
+    icono VARCHAR(20),
+    orden INTEGER NOT NULL,
+    extra TEXT
+);
+
+CREATE TABLE IF NOT EXISTS productos (
+    id INTEGER PRIMARY KEY,
+    nombre VARCHAR(100) NOT NULL,
+    precio NUMERIC NOT NULL,
+    precio_original NUMERIC,
+    imagen VARCHAR(255),
+    negocio_id VARCHAR(50),
+    categoria_id VARCHAR(50),
+    stock INTEGER,
+    destacado BOOLEAN,
+    activo BOOLEAN,
+    orden INTEGER NOT NULL,
+    extra TEXT,
+    FOREIGN KEY (negocio_id) REFERENCES negocios (id),
+    FOREIGN KEY (categoria_id) REFERENCES categorias (id)
+);
+
+CREATE TABLE IF NOT EXISTS producto_sucursal (
+    producto_id INTEGER NOT NULL,
+    negocio_id VARCHAR(50),
+    sucursal_id VARCHAR(50) NOT NULL,
+    orden INTEGER NOT NULL,
+    PRIMARY KEY (producto_id, sucursal_id),
+    FOREIGN KEY (producto_id) REFERENCES productos (id)
+);
+
+CREATE TABLE IF NOT EXISTS ofertas (
+    negocio_id VARCHAR(50) NOT NULL,
+    id VARCHAR(50) NOT NULL,
+    titulo VARCHAR(100),
+    descripcion TEXT,
+    descuento NUMERIC,
+    fecha_inicio DATE,
+    fecha_fin DATE,
+    activa BOOLEAN,
+    orden INTEGER NOT NULL,
+    extra TEXT,
+    PRIMARY KEY (negocio_id, id)
+);
+
+CREATE TABLE IF NOT EXISTS oferta_productos (
+    negocio_id VARCHAR(50) NOT NULL,
+    oferta_id VARCHAR(50) NOT NULL,
+    producto_id INTEGER NOT NULL,
+    orden INTEGER NOT NULL,
+    PRIMARY KEY (negocio_id, oferta_id, orden)
+);
+
+CREATE TABLE IF NOT EXISTS catalogo_meta (
+    clave VARCHAR(50) PRIMARY KEY,
+    valor TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_productos_negocio ON productos (negocio_id, activo, orden);
+CREATE INDEX IF NOT EXISTS idx_productos_categoria ON productos (categoria_id, activo, orden);
+CREATE INDEX IF NOT EXISTS idx_productos_destacado ON productos (orden) WHERE destacado = 1;
+CREATE INDEX IF NOT EXISTS idx_productos_orden ON productos (orden);
+CREATE INDEX IF NOT EXISTS idx_producto_sucursal_sucursal ON producto_sucursal (negocio_id, sucursal_id);
+CREATE INDEX IF NOT EXISTS idx_ofertas_fechas ON ofertas (fecha_inicio, fecha_fin);
+CREATE INDEX IF NOT EXISTS idx_oferta_productos_producto ON oferta_productos (producto_id);
+'''
+
+# Carritos guardados (antes carritos.crear_tablas_carrito)
+ESQUEMA_CARRITO = '''
+CREATE TABLE IF NOT EXISTS carrito (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    usuario_id INTEGER NOT NULL,
+    producto_id INTEGER NOT NULL,
+    cantidad INTEGER NOT NULL,
+    fecha_agregado DATETIME DEFAULT CURRENT_TIMESTAMP,
+    sesion_id VARCHAR(64) NOT NULL DEFAULT '',
+    FOREIGN KEY (usuario_id) REFERENCES usuarios (id),
+    FOREIGN KEY (producto_id) REFERENCES productos (id)
+);
+'''
+
+# Outbox de tickets para la Ticketera (antes despacho_tickets.crear_tablas_outbox)
+ESQUEMA_OUTBOX = '''
+CREATE TABLE IF NOT EXISTS outbox_tickets (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero VARCHAR(50) UNIQUE NOT NULL,
+    payload TEXT NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'pendiente',
+    intentos INTEGER NOT NULL DEFAULT 0,
+    proximo_intento REAL NOT NULL DEFAULT 0,
+    ultimo_error TEXT,
+    ticket_id INTEGER,
+    fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    fecha_envio DATETIME
+);
+CREATE INDEX IF NOT EXISTS idx_outbox_tickets_pendientes ON outbox_tickets (estado, proximo_intento);
+'''
+
+# Reservas y movimientos de stock (antes inventario.crear_tablas_inventario)
+ESQUEMA_INVENTARIO = '''
+CREATE TABLE IF NOT EXISTS stock_sucursal (
+    producto_id INTEGER NOT NULL,
+    sucursal_id VARCHAR(50) NOT NULL DEFAULT '',
+    disponible INTEGER NOT NULL CHECK (disponible >= 0),
+    PRIMARY KEY (producto_id, sucursal_id)
+);
+
+CREATE TABLE IF NOT EXISTS reservas_stock (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    referencia VARCHAR(50) NOT NULL,
+    producto_id INTEGER NOT NULL,
+    sucursal_id VARCHAR(50) NOT NULL,
+    cantidad INTEGER NOT NULL,
+    estado VARCHAR(20) NOT NULL DEFAULT 'activa',
+    vence REAL NOT NULL,
+    fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+CREATE INDEX IF NOT EXISTS idx_reservas_stock_referencia ON reservas_stock (referencia);
+CREATE INDEX IF NOT EXISTS idx_reservas_stock_activas ON reservas_stock (estado, vence);
+
+CREATE TABLE IF NOT EXISTS movimientos_stock (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    producto_id INTEGER NOT NULL,
+    sucursal_id VARCHAR(50) NOT NULL,
+    cantidad INTEGER NOT NULL,
+    tipo VARCHAR(20) NOT NULL,
+    referencia VARCHAR(50),
+    fecha DATETIME DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS movimientos_stock_sin_update BEFORE UPDATE ON movimientos_stock
+BEGIN
+    SELECT RAISE(ABORT, 'movimientos_stock es de solo inserción');
+END;
+
+CREATE TRIGGER IF NOT EXISTS movimientos_stock_sin_delete BEFORE DELETE ON movimientos_stock
+BEGIN
+    SELECT RAISE(ABORT, 'movimientos_stock es de solo inserción');
+END;
+'''
+
+# Claves de idempotencia (antes idempotencia.crear_tablas_idempotencia)
+ESQUEMA_IDEMPOTENCIA = '''
+CREATE TABLE IF NOT EXISTS claves_idempotencia (
+    ambito VARCHAR(30) NOT NULL,
+    clave VARCHAR(64) NOT NULL,
+    usuario_id INTEGER,
+    estado VARCHAR(20) NOT NULL DEFAULT 'en_curso',
+    resultado TEXT,
+    vence REAL NOT NULL,
+    fecha_creacion DATETIME DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (ambito, clave)
+);
+CREATE INDEX IF NOT EXISTS idx_claves_idempotencia_vence ON claves_idempotencia (vence);
+'''
+
+# Columnas que las bases creadas con versiones anteriores pueden no tener
+COLUMNAS_AGREGADAS = (
+    ('pedidos', 'ticket_confirmado', 'INTEGER DEFAULT 0'),
+    ('pedidos', 'ticket_estado', "VARCHAR(20) DEFAULT 'pendiente'"),
+    ('pedidos', 'fecha_confirmacion', 'DATETIME'),
+    ('tickets', 'total', 'DECIMAL(10,2) DEFAULT 0.00'),
+    ('tickets', 'estado_envio', "VARCHAR(20) DEFAULT 'pendiente'"),
+    ('tickets', 'fecha_envio', 'DATETIME'),
+    ('tickets', 'fecha_entrega', 'DATETIME'),
+    # Carritos anónimos: usuario_id 0 y el sesion_id del visitante
+    ('carrito', 'sesion_id', "VARCHAR(64) NOT NULL DEFAULT ''"),
+)
+
+def aplicar(conn):
+    # La tabla productos original (store, original_price, discount) nunca se usó:
+    # se conserva como productos_legacy y se crea la del catálogo
+    columnas = [fila[1] for fila in conn.execute("PRAGMA table_info(productos)")]
+    if 'store' in columnas:
+        # legacy_alter_table evita reescribir las FOREIGN KEY de carrito y pedido_items
+        conn.execute("PRAGMA legacy_alter_table = ON")
+        conn.execute("ALTER TABLE productos RENAME TO productos_legacy")
+        conn.execute("PRAGMA legacy_alter_table = OFF")
+
+    for script in (ESQUEMA_BASE, ESQUEMA_CATALOGO, ESQUEMA_CARRITO, ESQUEMA_OUTBOX,
+                   ESQUEMA_INVENTARIO, ESQUEMA_IDEMPOTENCIA):
+        conexiones.ejecutar_script(conn, script)
+    for tabla, columna, tipo in COLUMNAS_AGREGADAS:
+        columnas = [fila[1] for fila in conn.execute(f"PRAGMA table_info({tabla})")]
+        if columna not in columnas:
+            conn.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {tipo}")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_carrito_duenio ON carrito (usuario_id, sesion_id)")
+
+    # Pedidos que quedaron en pedidos_pendientes (reintentos del envío
+    # sincrónico anterior, que nunca se procesaban): pasan al outbox
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'pedidos_pendientes'").fetchone():
+        cursor = conn.execute('''
+            INSERT OR IGNORE INTO outbox_tickets (numero, payload, intentos, ultimo_error, fecha_creacion)
+            SELECT numero_pedido, datos_ticket, intentos, error_ultimo_intento, fecha_creacion
+            FROM pedidos_pendientes
+        ''')
+        conn.execute("DROP TABLE pedidos_pendientes")
+        logger.info(f"Pedidos pendientes migrados al outbox de tickets: {cursor.rowcount}")
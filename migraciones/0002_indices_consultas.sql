@@ -0,0 +1,14 @@
+-- Índices para las consultas por usuario, pedido, paquete y repartidor
+-- tokens_recuperacion(token) ya tiene el índice de su restricción UNIQUE
+
+-- Historial de pedidos de un usuario (más recientes primero)
+CREATE INDEX IF NOT EXISTS idx_pedidos_usuario_fecha ON pedidos (usuario_id, fecha);
+
+-- Items de un pedido
+CREATE INDEX IF NOT EXISTS idx_pedido_items_pedido ON pedido_items (pedido_id);
+
+-- Tickets de un repartidor por fecha
+CREATE INDEX IF NOT EXISTS idx_tickets_repartidor_fecha ON tickets (repartidor, fecha_creacion);
+
+-- Items de un paquete de comerciante
+CREATE INDEX IF NOT EXISTS idx_paquete_items_paquete ON paquete_items (paquete_id);
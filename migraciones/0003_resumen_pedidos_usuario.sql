@@ -0,0 +1,46 @@
+-- Resumen de pedidos por usuario (cantidad, total gastado, último pedido)
+-- Los triggers lo actualizan en la misma transacción que escribe el pedido,
+-- así el perfil lee una fila en vez de sumar todo el historial
+
+CREATE TABLE IF NOT EXISTS resumen_pedidos_usuario (
+    usuario_id INTEGER PRIMARY KEY,
+    cantidad_pedidos INTEGER NOT NULL DEFAULT 0,
+    total_gastado REAL NOT NULL DEFAULT 0,
+    ultimo_pedido DATETIME
+);
+
+INSERT OR REPLACE INTO resumen_pedidos_usuario (usuario_id, cantidad_pedidos, total_gastado, ultimo_pedido)
+SELECT usuario_id, COUNT(*), COALESCE(SUM(total), 0), MAX(fecha)
+FROM pedidos
+GROUP BY usuario_id;
+
+CREATE TRIGGER IF NOT EXISTS resumen_pedidos_alta AFTER INSERT ON pedidos
+BEGIN
+    INSERT INTO resumen_pedidos_usuario (usuario_id, cantidad_pedidos, total_gastado, ultimo_pedido)
+    VALUES (NEW.usuario_id, 1, COALESCE(NEW.total, 0), NEW.fecha)
+    ON CONFLICT (usuario_id) DO UPDATE SET
+        cantidad_pedidos = cantidad_pedidos + 1,
+        total_gastado = total_gastado + excluded.total_gastado,
+        ultimo_pedido = MAX(COALESCE(ultimo_pedido, excluded.ultimo_pedido),
+                            COALESCE(excluded.ultimo_pedido, ultimo_pedido));
+END;
+
+CREATE TRIGGER IF NOT EXISTS resumen_pedidos_baja AFTER DELETE ON pedidos
+BEGIN
+    UPDATE resumen_pedidos_usuario SET
+        cantidad_pedidos = cantidad_pedidos - 1,
+        total_gastado = total_gastado - COALESCE(OLD.total, 0),
+        ultimo_pedido = (SELECT MAX(fecha) FROM pedidos WHERE usuario_id = OLD.usuario_id)
+    WHERE usuario_id = OLD.usuario_id;
+END;
+
+-- Cambios de dueño, total o fecha (poco frecuentes): recalcular los usuarios afectados
+CREATE TRIGGER IF NOT EXISTS resumen_pedidos_cambio AFTER UPDATE OF usuario_id, total, fecha ON pedidos
+BEGIN
+    DELETE FROM resumen_pedidos_usuario WHERE usuario_id IN (OLD.usuario_id, NEW.usuario_id);
+    INSERT INTO resumen_pedidos_usuario (usuario_id, cantidad_pedidos, total_gastado, ultimo_pedido)
+    SELECT usuario_id, COUNT(*), COALESCE(SUM(total), 0), MAX(fecha)
+    FROM pedidos
+    WHERE usuario_id IN (OLD.usuario_id, NEW.usuario_id)
+    GROUP BY usuario_id;
+END;
@@ -0,0 +1,12 @@
+-- Nombre del producto guardado en cada item al momento de la compra
+-- El detalle de un pedido toma nombre e imagen del catálogo vigente
+-- (productos.json); si el producto ya no está, muestra este nombre y el
+-- precio_unitario con que se compró
+
+ALTER TABLE pedido_items ADD COLUMN nombre_producto VARCHAR(100);
+
+-- Pedidos anteriores: el nombre que tenga la copia del catálogo en la base
+UPDATE pedido_items SET nombre_producto = (
+    SELECT p.nombre FROM productos p WHERE p.id = pedido_items.producto_id
+)
+WHERE nombre_producto IS NULL;
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Nombre de producto de los items guardados antes de la migración 0004
+La 0004 lo copiaba de la tabla productos del catálogo, que al migrar
+todavía está vacía (el catálogo se importa después, ver catalogo.py).
+Esta migración lo toma, en orden de preferencia, de:
+- la tabla productos del catálogo (si ya se importó)
+- productos.json
+- productos_legacy (la tabla productos original)
+
+Solo completa los items sin nombre; los productos que no aparecen en
+ninguna fuente quedan en NULL.
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+RUTA_PRODUCTOS_JSON = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'productos.json')
+
+def _tabla_existe(conn, tabla):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla,)).fetchone() is not None
+
+def _nombres_json(ruta):
+    try:
+        with open(ruta, encoding='utf-8') as f:
+            datos = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No se pudieron leer los nombres de {ruta}: {e}")
+        return {}
+    return {str(producto['id']): producto['nombre'] for producto in datos.get('productos', [])
+            if producto.get('id') is not None and producto.get('nombre')}
+
+def aplicar(conn):
+    # De menor a mayor preferencia: cada fuente pisa a la anterior
+    nombres = {}
+    if _tabla_existe(conn, 'productos_legacy'):
+        nombres.update((str(producto_id), nombre) for producto_id, nombre in
+                       conn.execute("SELECT id, nombre FROM productos_legacy WHERE nombre IS NOT NULL"))
+    nombres.update(_nombres_json(RUTA_PRODUCTOS_JSON))
+    nombres.update((str(producto_id), nombre) for producto_id, nombre in
+                   conn.execute("SELECT id, nombre FROM productos WHERE nombre IS NOT NULL"))
+
+    sin_nombre = [fila[0] for fila in
+                  conn.execute("SELECT DISTINCT producto_id FROM pedido_items WHERE nombre_producto IS NULL")]
+    cursor = conn.executemany("UPDATE pedido_items SET nombre_producto = ? WHERE producto_id = ? AND nombre_producto IS NULL",
+                              [(nombres[str(producto_id)], producto_id) for producto_id in sin_nombre
+                               if str(producto_id) in nombres])
+    logger.info(f"Nombres de producto completados en items anteriores: {cursor.rowcount}")
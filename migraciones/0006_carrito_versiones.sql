@@ -0,0 +1,30 @@
+-- Carritos escritos por producto desde cualquier proceso (ver carritos.py)
+-- Cada cambio actualiza solo las filas de los productos que cambiaron
+-- (INSERT ... ON CONFLICT) y sube la versión del carrito, que los procesos
+-- comparan con la de su caché antes de usarla
+
+-- Filas repetidas de un mismo producto: quedan en la primera, con la suma
+UPDATE carrito SET cantidad = (
+    SELECT SUM(c.cantidad) FROM carrito c
+    WHERE c.usuario_id = carrito.usuario_id AND c.sesion_id = carrito.sesion_id
+      AND c.producto_id = carrito.producto_id
+)
+WHERE id IN (
+    SELECT MIN(id) FROM carrito GROUP BY usuario_id, sesion_id, producto_id HAVING COUNT(*) > 1
+);
+
+DELETE FROM carrito WHERE id NOT IN (
+    SELECT MIN(id) FROM carrito GROUP BY usuario_id, sesion_id, producto_id
+);
+
+-- Una fila por producto; también cubre las búsquedas por dueño del carrito
+CREATE UNIQUE INDEX IF NOT EXISTS idx_carrito_producto ON carrito (usuario_id, sesion_id, producto_id);
+DROP INDEX IF EXISTS idx_carrito_duenio;
+
+-- Versión de cada carrito: sube con cada cambio escrito
+CREATE TABLE IF NOT EXISTS carrito_versiones (
+    usuario_id INTEGER NOT NULL,
+    sesion_id VARCHAR(64) NOT NULL DEFAULT '',
+    version INTEGER NOT NULL,
+    PRIMARY KEY (usuario_id, sesion_id)
+);
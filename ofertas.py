@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vista materializada de ofertas para Belgrano Ahorro
+Resuelve productos y precios con descuento una sola vez por versión del catálogo
+y activa/desactiva las ofertas en los límites de fecha_inicio / fecha_fin
+"""
+
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from catalogo import catalogo
+
+logger = logging.getLogger(__name__)
+
+# Máxima espera del programador antes de volver a verificar la próxima frontera
+ESPERA_MAXIMA_PROGRAMADOR = 3600
+
+def _parsear_fecha(valor):
+    """Convertir 'YYYY-MM-DD' en datetime (None si falta o es inválida)"""
+    if not valor:
+        return None
+    try:
+        return datetime.strptime(str(valor)[:10], '%Y-%m-%d')
+    except ValueError:
+        logger.warning(f"Fecha de oferta inválida: {valor}")
+        return None
+
+def calcular_precio_oferta(precio, descuento):
+    """Precio final aplicando un descuento porcentual"""
+    return round(float(precio) * (100 - float(descuento or 0)) / 100, 2)
+
+# ==========================================
+# VISTA MATERIALIZADA
+# ==========================================
+
+class VistaOfertas:
+    """
+    Ofertas vigentes en un instante para un snapshot del catálogo
+
+    ATRIBUTOS:
+    - por_negocio: {negocio_id: [oferta con productos_info]} (un negocio sin ofertas
+      vigentes queda con lista vacía)
+    - por_producto: {producto_id (str): mejor oferta vigente del producto}
+    - proxima_frontera: timestamp en el que alguna oferta empieza o termina
+    - generacion: contador que cambia en cada reconstrucción de la vista
+    """
+
+    def __init__(self, indice, ahora=None, generacion=0):
+        ahora = ahora or datetime.now()
+        self.version_catalogo = indice.version
+        self.generacion = generacion
+        self.por_negocio = {}
+        self.por_producto = {}
+        fronteras = []
+
+        for negocio_id, ofertas_negocio in indice.ofertas.items():
+            self.por_negocio[negocio_id] = []
+            for oferta in ofertas_negocio:
+                inicio = _parsear_fecha(oferta.get('fecha_inicio'))
+                # fecha_fin es inclusiva: la oferta vence al terminar ese día
+                fin = _parsear_fecha(oferta.get('fecha_fin'))
+                if fin is not None:
+                    fin += timedelta(days=1)
+
+                for frontera in (inicio, fin):
+                    if frontera is not None and frontera > ahora:
+                        fronteras.append(frontera)
+
+                if not oferta.get('activa', True):
+                    continue
+                if (inicio is not None and ahora < inicio) or (fin is not None and ahora >= fin):
+                    continue
+
+                self.por_negocio[negocio_id].append(self._materializar(indice, oferta))
+
+        self.proxima_frontera = min(fronteras).timestamp() if fronteras else float('inf')
+
+    def _materializar(self, indice, oferta):
+        descuento = oferta.get('descuento', 0)
+        productos_info = []
+        for producto_id in oferta.get('productos', []):
+            producto = indice.producto(producto_id)
+            if not producto:
+                continue
+            precio_oferta = calcular_precio_oferta(producto.get('precio', 0), descuento)
+            productos_info.append(dict(producto, precio_oferta=precio_oferta))
+
+            clave = str(producto_id)
+            actual = self.por_producto.get(clave)
+            if actual is None or precio_oferta < actual['precio_oferta']:
+                self.por_producto[clave] = {
+                    'oferta_id': oferta.get('id'),
+                    'titulo': oferta.get('titulo'),
+                    'descuento': descuento,
+                    'precio_oferta': precio_oferta
+                }
+
+        return dict(oferta, productos_info=productos_info)
+
+# ==========================================
+# OFERTAS VIGENTES CON PROGRAMADOR
+# ==========================================
+
+class OfertasVigentes:
+    """
+    Mantiene la vista de ofertas al día
+
+    La vista se reconstruye cuando cambia la versión del catálogo o cuando se
+    alcanza la próxima frontera de fechas. Un temporizador en segundo plano hace
+    la reconstrucción en la frontera para que los requests solo lean la vista.
+    """
+
+    def __init__(self, catalogo):
+        self.catalogo = catalogo
+        self._lock = threading.Lock()
+        self._vista = None
+        self._temporizador = None
+        self._generacion = 0
+
+    def obtener(self):
+        """Devolver la vista vigente (reconstruyendo solo si quedó desactualizada)"""
+        indice = self.catalogo.obtener()
+        vista = self._vista
+        if vista is None or vista.version_catalogo != indice.version or time.time() >= vista.proxima_frontera:
+            vista = self._reconstruir(indice)
+        return vista
+
+    def _reconstruir(self, indice):
+        with self._lock:
+            vista = self._vista
+            if vista is not None and vista.version_catalogo == indice.version and time.time() < vista.proxima_frontera:
+                return vista
+            self._generacion += 1
+            vista = VistaOfertas(indice, generacion=self._generacion)
+            self._vista = vista
+            self._programar(vista.proxima_frontera)
+            activas = sum(len(ofertas) for ofertas in vista.por_negocio.values())
+            logger.info(f"Vista de ofertas reconstruida (catálogo v{indice.version}): {activas} ofertas vigentes")
+            return vista
+
+    def _programar(self, frontera):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+        if frontera == float('inf'):
+            return
+        espera = min(max(frontera - time.time(), 0), ESPERA_MAXIMA_PROGRAMADOR)
+        self._temporizador = threading.Timer(espera, self._al_vencer_temporizador)
+        self._temporizador.daemon = True
+        self._temporizador.start()
+
+    def _al_vencer_temporizador(self):
+        try:
+            vista = self._vista
+            if vista is not None and time.time() < vista.proxima_frontera:
+                with self._lock:
+                    self._programar(vista.proxima_frontera)
+                return
+            self._reconstruir(self.catalogo.obtener())
+        except Exception as e:
+            logger.error(f"Error actualizando ofertas programadas: {e}")
+
+# Instancia global asociada al catálogo del proceso
+ofertas_vigentes = OfertasVigentes(catalogo)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Motor de precios del carrito de Belgrano Ahorro
+Cotiza un carrito completo en una sola pasada sobre el índice del catálogo,
+aplicando las ofertas vigentes y el precio_original de cada producto, y
+memoiza el resultado por (versión del carrito, versión del catálogo,
+generación de ofertas) para que carrito, checkout y pago compartan el cálculo
+"""
+
+import logging
+import threading
+from collections import OrderedDict
+
+from catalogo import catalogo
+from ofertas import ofertas_vigentes
+
+logger = logging.getLogger(__name__)
+
+# Cotizaciones memoizadas (una por carrito)
+CAPACIDAD_MEMO = 5000
+
+def _redondear(valor):
+    """Redondear a centavos solo los importes con decimales (los enteros quedan igual)"""
+    return round(valor, 2) if isinstance(valor, float) else valor
+
+# ==========================================
+# COTIZACIÓN
+# ==========================================
+
+def cotizar_items(items, indice, ofertas_por_producto):
+    """
+    Cotizar un carrito
+
+    PARÁMETROS:
+    - items: {producto_id: cantidad}
+    - indice: IndiceCatalogo vigente
+    - ofertas_por_producto: {producto_id (str): mejor oferta vigente} (ver ofertas.py)
+
+    RETORNA:
+    - Diccionario con:
+      - lineas: [{producto, cantidad, precio_unitario, precio_lista, precio_anterior,
+        oferta, ahorro_unitario, subtotal}] en el orden del carrito
+      - subtotal: importe a precio anterior (precio_original o precio de lista)
+      - descuento_ofertas: importe descontado por ofertas
+      - ahorro: subtotal - total
+      - total: importe a pagar
+      - unidades: cantidad total de unidades
+      - no_disponibles: ids del carrito que ya no están en el catálogo
+    """
+    lineas = []
+    no_disponibles = []
+    subtotal = total = descuento_ofertas = 0
+    unidades = 0
+
+    for producto_id, cantidad in items.items():
+        producto = indice.producto(producto_id)
+        if not producto:
+            no_disponibles.append(producto_id)
+            continue
+
+        precio_lista = producto['precio']
+        oferta = ofertas_por_producto.get(str(producto['id']))
+        if oferta is not None and oferta['precio_oferta'] < precio_lista:
+            precio_unitario = oferta['precio_oferta']
+        else:
+            oferta = None
+            precio_unitario = precio_lista
+        precio_anterior = max(producto.get('precio_original') or 0, precio_lista)
+
+        importe = _redondear(precio_unitario * cantidad)
+        lineas.append({
+            'producto': producto,
+            'cantidad': cantidad,
+            'precio_unitario': precio_unitario,
+            'precio_lista': precio_lista,
+            'precio_anterior': precio_anterior,
+            'oferta': oferta,
+            'ahorro_unitario': _redondear(precio_anterior - precio_unitario),
+            'subtotal': importe
+        })
+        subtotal += precio_anterior * cantidad
+        descuento_ofertas += (precio_lista - precio_unitario) * cantidad
+        total += importe
+        unidades += cantidad
+
+    total = _redondear(total)
+    subtotal = _redondear(subtotal)
+    return {
+        'lineas': lineas,
+        'subtotal': subtotal,
+        'descuento_ofertas': _redondear(descuento_ofertas),
+        'ahorro': _redondear(subtotal - total),
+        'total': total,
+        'unidades': unidades,
+        'no_disponibles': no_disponibles
+    }
+
+def resumen_cotizacion(cotizacion):
+    """
+    Cotización en formato JSON (para las respuestas de la API del carrito)
+    """
+    return {
+        'lineas': [{
+            'producto_id': linea['producto']['id'],
+            'nombre': linea['producto'].get('nombre'),
+            'imagen': linea['producto'].get('imagen'),
+            'cantidad': linea['cantidad'],
+            'precio_unitario': linea['precio_unitario'],
+            'precio_anterior': linea['precio_anterior'],
+            'oferta': {'titulo': linea['oferta']['titulo'], 'descuento': linea['oferta']['descuento']}
+                      if linea['oferta'] else None,
+            'subtotal': linea['subtotal']
+        } for linea in cotizacion['lineas']],
+        'subtotal': cotizacion['subtotal'],
+        'descuento_ofertas': cotizacion['descuento_ofertas'],
+        'ahorro': cotizacion['ahorro'],
+        'total': cotizacion['total'],
+        'unidades': cotizacion['unidades'],
+        'no_disponibles': cotizacion['no_disponibles']
+    }
+
+# ==========================================
+# COTIZADOR CON MEMOIZACIÓN
+# ==========================================
+
+class CotizadorCarritos:
+    """
+    Cotizaciones memoizadas por carrito
+
+    La cotización de un carrito se reutiliza mientras no cambien el carrito
+    (versión de carritos.AlmacenCarritos), el catálogo ni las ofertas vigentes.
+    Las cotizaciones se comparten entre requests: no modificarlas.
+    """
+
+    def __init__(self, catalogo, ofertas_vigentes, capacidad=CAPACIDAD_MEMO):
+        self.catalogo = catalogo
+        self.ofertas_vigentes = ofertas_vigentes
+        self.capacidad = capacidad
+        self._lock = threading.Lock()
+        self._memo = OrderedDict()
+
+    def cotizar(self, clave, items, version_carrito):
+        """
+        Cotización del carrito `clave` con contenido `items` en `version_carrito`
+        """
+        indice = self.catalogo.obtener()
+        vista = self.ofertas_vigentes.obtener()
+        firma = (version_carrito, indice.version, vista.version_catalogo, vista.generacion)
+
+        with self._lock:
+            memo = self._memo.get(clave)
+            if memo is not None and memo[0] == firma:
+                self._memo.move_to_end(clave)
+                return memo[1]
+
+        cotizacion = cotizar_items(items, indice, vista.por_producto)
+        with self._lock:
+            self._memo[clave] = (firma, cotizacion)
+            self._memo.move_to_end(clave)
+            while len(self._memo) > self.capacidad:
+                self._memo.popitem(last=False)
+        return cotizacion
+
+# Instancia global asociada al catálogo y las ofertas del proceso
+cotizador = CotizadorCarritos(catalogo, ofertas_vigentes)
@@ -0,0 +1,246 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lecturas de reportes aisladas de las escrituras de Belgrano Ahorro
+Las estadísticas y los conteos de administración leen con conexiones de
+solo lectura (mode=ro, query_only) en una transacción de lectura: ven una
+foto consistente de la base y, con WAL, nunca demoran a guardar_pedido ni
+al outbox de tickets, por largas que sean las agregaciones.
+
+Opcionalmente los reportes leen una réplica: una copia de la base que se
+rehace cada INTERVALO_REPLICA segundos con la API de backup de SQLite y
+se publica con os.replace. La réplica nunca cambia una vez publicada, así
+que se abre como inmutable (sin locks ni WAL).
+
+El mantenimiento en segundo plano también administra el WAL:
+- cada INTERVALO_CHECKPOINT segundos un checkpoint PASSIVE (copia lo que
+  puede sin esperar a nadie)
+- si el archivo -wal supera WAL_MAXIMO_BYTES y el checkpoint alcanzó el
+  final, un checkpoint TRUNCATE sin espera (busy_timeout=0): si hay
+  lectores o escritores activos se reintenta en la vuelta siguiente en vez
+  de bloquearlos
+El auto-checkpoint de SQLite (cada 1000 páginas) queda como respaldo.
+
+USO:
+    with reportes.lectura() as conn:
+        conn.execute('SELECT COUNT(*) FROM pedidos')
+
+    python reportes.py estado        # tamaño del WAL y de la réplica
+    python reportes.py checkpoint    # una vuelta de la política de checkpoint
+    python reportes.py replica       # rehacer la réplica
+
+MANTENIMIENTO:
+- AHORRO_DB_REPLICA: ruta de la réplica (vacío: los reportes leen la base
+  en vivo con conexiones de solo lectura)
+- AHORRO_DB_REPLICA_INTERVALO: segundos entre copias de la réplica
+- Los datos de la réplica pueden tener hasta INTERVALO_REPLICA segundos de
+  atraso: no usarla para nada que se vuelva a escribir
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import conexiones
+
+logger = logging.getLogger(__name__)
+
+RUTA_REPLICA = os.environ.get('AHORRO_DB_REPLICA', '')
+INTERVALO_REPLICA = float(os.environ.get('AHORRO_DB_REPLICA_INTERVALO', '300'))
+INTERVALO_CHECKPOINT = 60
+# Tamaño del -wal a partir del cual se intenta truncarlo
+WAL_MAXIMO_BYTES = 64 * 1024 * 1024
+# Conexiones de lectura que se conservan abiertas
+POOL_REPORTES = 4
+
+def tamano_archivo(ruta):
+    """Tamaño en bytes (0 si no existe)"""
+    try:
+        return os.path.getsize(ruta)
+    except OSError:
+        return 0
+
+class AccesoReportes:
+    """
+    Conexiones de solo lectura para reportes, réplica y checkpoints del WAL
+
+    PARÁMETROS:
+    - pool: pool de escritura de la base (conexiones.pool)
+    - ruta_replica: archivo de la réplica ('' o None: sin réplica)
+    """
+
+    def __init__(self, pool=conexiones.pool, ruta_replica=RUTA_REPLICA, intervalo_replica=INTERVALO_REPLICA,
+                 intervalo_checkpoint=INTERVALO_CHECKPOINT, wal_maximo=WAL_MAXIMO_BYTES):
+        self.pool = pool
+        self.ruta_replica = ruta_replica or None
+        self.intervalo_replica = intervalo_replica
+        self.intervalo_checkpoint = intervalo_checkpoint
+        self.wal_maximo = wal_maximo
+        self.pool_vivo = conexiones.PoolConexiones(pool.ruta_db, POOL_REPORTES, solo_lectura=True)
+        self.pool_replica = (conexiones.PoolConexiones(self.ruta_replica, POOL_REPORTES, inmutable=True)
+                             if self.ruta_replica else None)
+        self.ultima_replica = 0.0
+        self._lock_replica = threading.Lock()
+        self._evento = threading.Event()
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._detenido = False
+
+    # ------------------------------------------
+    # Lecturas
+    # ------------------------------------------
+
+    @contextmanager
+    def lectura(self, replica=True):
+        """
+        Conexión de solo lectura con una foto consistente de la base
+
+        PARÁMETROS:
+        - replica: leer la réplica si está configurada (False: la base en vivo)
+        """
+        pool = self.pool_vivo
+        if replica and self.pool_replica is not None:
+            # Sin réplica todavía (y sin poder crearla) se lee la base en vivo
+            if os.path.exists(self.ruta_replica) or self.refrescar_replica():
+                pool = self.pool_replica
+        with pool.lectura() as conn:
+            yield conn
+
+    # ------------------------------------------
+    # Réplica
+    # ------------------------------------------
+
+    def refrescar_replica(self):
+        """
+        Rehacer la réplica con una copia de la base
+
+        La copia se hace en un solo paso dentro de una transacción de lectura
+        (no bloquea escrituras) a un archivo temporal que después reemplaza
+        a la réplica; los reportes en curso terminan sobre la copia anterior.
+
+        RETORNA:
+        - True si se publicó una réplica nueva
+        """
+        if self.pool_replica is None:
+            return False
+        with self._lock_replica:
+            temporal = f"{self.ruta_replica}.tmp"
+            inicio = time.monotonic()
+            try:
+                destino = sqlite3.connect(temporal)
+                try:
+                    with self.pool.conexion() as origen:
+                        origen.backup(destino)
+                    # Un solo archivo, sin -wal ni -shm
+                    destino.execute('PRAGMA journal_mode=DELETE')
+                finally:
+                    destino.close()
+                os.replace(temporal, self.ruta_replica)
+            except (sqlite3.Error, OSError) as e:
+                logger.error(f"No se pudo rehacer la réplica de reportes: {e}")
+                if os.path.exists(temporal):
+                    os.remove(temporal)
+                return False
+            self.pool_replica.renovar()
+            self.ultima_replica = time.time()
+        logger.info(f"Réplica de reportes actualizada en {time.monotonic() - inicio:.2f}s")
+        return True
+
+    # ------------------------------------------
+    # Checkpoints
+    # ------------------------------------------
+
+    def checkpoint(self):
+        """
+        Una vuelta de la política de checkpoint del WAL
+
+        RETORNA:
+        - {'modo', 'ocupada', 'paginas_wal', 'paginas_copiadas', 'wal_bytes'}
+        """
+        ruta_wal = f"{self.pool.ruta_db}-wal"
+        with self.pool.conexion() as conn:
+            ocupada, paginas_wal, copiadas = conn.execute('PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+            modo = 'PASSIVE'
+            if (tamano_archivo(ruta_wal) > self.wal_maximo and not ocupada and paginas_wal == copiadas):
+                # TRUNCATE espera a lectores y escritores: sin busy_timeout falla
+                # enseguida en vez de demorarlos
+                conn.execute('PRAGMA busy_timeout=0')
+                try:
+                    ocupada, paginas_wal, copiadas = conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchone()
+                    modo = 'TRUNCATE'
+                finally:
+                    conn.execute(f'PRAGMA busy_timeout={conexiones.BUSY_TIMEOUT_MS}')
+        return {'modo': modo, 'ocupada': bool(ocupada), 'paginas_wal': paginas_wal,
+                'paginas_copiadas': copiadas, 'wal_bytes': tamano_archivo(ruta_wal)}
+
+    def estado(self):
+        """Tamaños del WAL y de la réplica"""
+        return {
+            'base': self.pool.ruta_db,
+            'wal_bytes': tamano_archivo(f"{self.pool.ruta_db}-wal"),
+            'replica': self.ruta_replica,
+            'replica_bytes': tamano_archivo(self.ruta_replica) if self.ruta_replica else 0,
+            'ultima_replica': self.ultima_replica
+        }
+
+    # ------------------------------------------
+    # Ciclo de vida
+    # ------------------------------------------
+
+    def iniciar(self):
+        """Arrancar el hilo de mantenimiento (si no está corriendo)"""
+        with self._lock:
+            if self._hilo is not None and self._hilo.is_alive():
+                return
+            self._detenido = False
+            self._hilo = threading.Thread(target=self._bucle, name='mantenimiento_reportes', daemon=True)
+            self._hilo.start()
+        logger.info(f"Mantenimiento de reportes iniciado (réplica: {self.ruta_replica or 'no'})")
+
+    def detener(self, espera=None):
+        """Detener el mantenimiento después de la vuelta en curso"""
+        self._detenido = True
+        self._evento.set()
+        if self._hilo is not None:
+            self._hilo.join(espera)
+
+    def _bucle(self):
+        proximo_checkpoint = time.monotonic() + self.intervalo_checkpoint
+        proxima_replica = time.monotonic()
+        while not self._detenido:
+            ahora = time.monotonic()
+            if self.pool_replica is not None and ahora >= proxima_replica:
+                self.refrescar_replica()
+                proxima_replica = ahora + self.intervalo_replica
+            if ahora >= proximo_checkpoint:
+                try:
+                    resultado = self.checkpoint()
+                    if resultado['ocupada']:
+                        logger.debug(f"Checkpoint {resultado['modo']} incompleto: {resultado}")
+                except sqlite3.Error as e:
+                    logger.error(f"Error en el checkpoint del WAL: {e}")
+                proximo_checkpoint = ahora + self.intervalo_checkpoint
+            espera = proximo_checkpoint - time.monotonic()
+            if self.pool_replica is not None:
+                espera = min(espera, proxima_replica - time.monotonic())
+            self._evento.wait(max(espera, 0))
+
+# Instancia global del proceso (app.iniciar_servicios() inicia el mantenimiento al arrancar el servidor)
+reportes = AccesoReportes()
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    accion = sys.argv[1] if len(sys.argv) > 1 else 'estado'
+    if accion == 'checkpoint':
+        print(json.dumps(reportes.checkpoint(), ensure_ascii=False))
+    elif accion == 'replica':
+        if not reportes.ruta_replica:
+            print("AHORRO_DB_REPLICA no está configurada")
+            sys.exit(1)
+        reportes.refrescar_replica()
+    print(json.dumps(reportes.estado(), ensure_ascii=False))
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de las rutas calientes del catálogo de Belgrano Ahorro
+Genera catálogos sintéticos (ver generar_catalogo.py), levanta la aplicación
+sobre cada uno con el cliente de pruebas de Flask y mide latencia p50/p95/p99,
+throughput y memoria pico por ruta. Los resultados se guardan en JSON para
+comparar entre commits.
+
+USO:
+    python scripts/benchmark_catalogo.py                       # 1k, 10k y 100k productos
+    python scripts/benchmark_catalogo.py --tamanos 1000,10000 --repeticiones 50
+    python scripts/benchmark_catalogo.py --comparar benchmark_catalogo_abc1234.json
+
+Cada tamaño corre en un proceso aparte con su propio directorio temporal
+(productos.json, base SQLite y snapshot), así las mediciones no se mezclan.
+"""
+
+import argparse
+import json
+import logging
+import math
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:
+    # Windows: sin RSS máximo del proceso
+    resource = None
+
+DIRECTORIO_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_PROYECTO = os.path.dirname(DIRECTORIO_SCRIPTS)
+sys.path.insert(0, DIRECTORIO_SCRIPTS)
+
+from generar_catalogo import generar_catalogo, guardar_catalogo
+
+TAMANOS = (1000, 10000, 100000)
+REPETICIONES = 100
+CALENTAMIENTO = 5
+# Requests medidos con tracemalloc (más lentos) para la memoria pico
+REPETICIONES_MEMORIA = 10
+
+BUSQUEDAS = ('leche', 'arroz integral', 'cafe', 'galletas chocolate', 'jabon', 'yerba', 'papas')
+API_KEY = os.environ.get('BELGRANO_AHORRO_API_KEY', 'belgrano_ahorro_api_key_2025')
+MARCA_RESULTADO = 'RESULTADO_BENCHMARK '
+
+# ==========================================
+# RUTAS MEDIDAS
+# ==========================================
+# Cada ruta recibe el catálogo y el número de request y devuelve (url, headers):
+# los parámetros rotan para no medir siempre la misma página
+
+def _elegir(valores, numero):
+    return valores[numero % len(valores)]
+
+def _sucursales(datos):
+    return [(negocio_id, sucursal_id)
+            for negocio_id, sucursales in datos['sucursales'].items()
+            for sucursal_id in sucursales]
+
+RUTAS = {
+    'index': lambda datos, n: ('/', {}),
+    'index_busqueda': lambda datos, n: (f'/?busqueda={_elegir(BUSQUEDAS, n)}', {}),
+    'ver_negocio': lambda datos, n: (f'/negocio/{_elegir(list(datos["negocios"]), n)}', {}),
+    'ver_categoria': lambda datos, n: (f'/categoria/{_elegir(list(datos["categorias"]), n)}', {}),
+    'api_search': lambda datos, n: (f'/api/v1/search?q={_elegir(BUSQUEDAS, n)}', {}),
+    'productos_por_sucursal': lambda datos, n: (
+        '/api/productos_por_sucursal?negocio_id={}&sucursal_id={}'.format(*_elegir(_sucursales(datos), n)), {}),
+    'api_v1_productos': lambda datos, n: ('/api/v1/productos', {'X-API-Key': API_KEY}),
+}
+
+# ==========================================
+# MEDICIÓN (PROCESO HIJO)
+# ==========================================
+
+def percentil(valores_ordenados, porcentaje):
+    """Percentil por rango más cercano sobre una lista ordenada"""
+    if not valores_ordenados:
+        return None
+    posicion = max(0, math.ceil(porcentaje / 100 * len(valores_ordenados)) - 1)
+    return valores_ordenados[posicion]
+
+def medir_ruta(cliente, datos, armar, repeticiones, calentamiento):
+    """Latencias, throughput y memoria pico de una ruta"""
+    errores = 0
+    for numero in range(calentamiento):
+        url, headers = armar(datos, numero)
+        cliente.get(url, headers=headers)
+
+    tiempos = []
+    for numero in range(repeticiones):
+        url, headers = armar(datos, numero)
+        inicio = time.perf_counter()
+        respuesta = cliente.get(url, headers=headers)
+        tiempos.append(time.perf_counter() - inicio)
+        if respuesta.status_code >= 400:
+            errores += 1
+
+    tracemalloc.start()
+    pico = 0
+    for numero in range(REPETICIONES_MEMORIA):
+        url, headers = armar(datos, numero)
+        actual, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        cliente.get(url, headers=headers)
+        pico = max(pico, tracemalloc.get_traced_memory()[1] - actual)
+    tracemalloc.stop()
+
+    ordenados = sorted(tiempos)
+    total = sum(tiempos)
+    return {
+        'requests': repeticiones,
+        'errores': errores,
+        'p50_ms': round(percentil(ordenados, 50) * 1000, 3),
+        'p95_ms': round(percentil(ordenados, 95) * 1000, 3),
+        'p99_ms': round(percentil(ordenados, 99) * 1000, 3),
+        'max_ms': round(ordenados[-1] * 1000, 3),
+        'throughput_rps': round(repeticiones / total, 1) if total else None,
+        'memoria_pico_kb': round(pico / 1024, 1)
+    }
+
+def ejecutar_tamano(directorio, repeticiones, calentamiento, rutas):
+    """Medir todas las rutas sobre el catálogo de `directorio` (corre en el proceso hijo)"""
+    os.chdir(directorio)
+    sys.path.insert(0, DIRECTORIO_PROYECTO)
+    with open('productos.json', encoding='utf-8') as f:
+        datos = json.load(f)
+
+    inicio = time.perf_counter()
+    import app as aplicacion
+    aplicacion.catalogo.obtener()
+    arranque = time.perf_counter() - inicio
+    logging.disable(logging.INFO)
+
+    cliente = aplicacion.app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['usuario_id'] = 1
+        sesion['usuario_nombre'] = 'Benchmark'
+
+    resultados = {}
+    for nombre in rutas:
+        resultados[nombre] = medir_ruta(cliente, datos, RUTAS[nombre], repeticiones, calentamiento)
+
+    return {
+        'productos': len(datos['productos']),
+        'arranque_s': round(arranque, 3),
+        'rss_maximo_mb': round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None,
+        'rutas': resultados
+    }
+
+# ==========================================
+# ORQUESTACIÓN Y COMPARACIÓN
+# ==========================================
+
+def commit_actual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=DIRECTORIO_PROYECTO,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def correr_benchmark(tamanos, repeticiones, calentamiento, rutas, semilla):
+    resultados = {}
+    for tamano in tamanos:
+        with tempfile.TemporaryDirectory(prefix=f'benchmark_{tamano}_') as directorio:
+            print(f"📦 Generando catálogo de {tamano} productos...")
+            guardar_catalogo(generar_catalogo(tamano, semilla), os.path.join(directorio, 'productos.json'))
+
+            print(f"⏱️  Midiendo rutas con {tamano} productos...")
+            proceso = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), '--interno', directorio,
+                 '--repeticiones', str(repeticiones), '--calentamiento', str(calentamiento),
+                 '--rutas', ','.join(rutas)],
+                capture_output=True, text=True)
+            lineas = [l for l in proceso.stdout.splitlines() if l.startswith(MARCA_RESULTADO)]
+            if proceso.returncode != 0 or not lineas:
+                print(f"❌ Error midiendo {tamano} productos:\n{proceso.stderr[-2000:]}")
+                continue
+            resultados[str(tamano)] = json.loads(lineas[-1][len(MARCA_RESULTADO):])
+            imprimir_tamano(resultados[str(tamano)])
+    return resultados
+
+def imprimir_tamano(resultado):
+    print(f"   Arranque: {resultado['arranque_s']}s | RSS máximo: {resultado['rss_maximo_mb']} MB")
+    print(f"   {'ruta':<24}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'mem KB':>10}{'errores':>9}")
+    for nombre, medida in resultado['rutas'].items():
+        print(f"   {nombre:<24}{medida['p50_ms']:>10}{medida['p95_ms']:>10}{medida['p99_ms']:>10}"
+              f"{medida['throughput_rps']:>10}{medida['memoria_pico_kb']:>10}{medida['errores']:>9}")
+
+def comparar(anterior, actual):
+    """Imprimir la variación de p50/p95/p99 respecto de un resultado anterior"""
+    print(f"\n📊 Comparación con {anterior['meta'].get('commit')} ({anterior['meta'].get('fecha')})")
+    for tamano, resultado in actual['resultados'].items():
+        previo = anterior['resultados'].get(tamano)
+        if not previo:
+            continue
+        print(f"   {tamano} productos")
+        for nombre, medida in resultado['rutas'].items():
+            base = previo['rutas'].get(nombre)
+            if not base:
+                continue
+            variaciones = []
+            for metrica in ('p50_ms', 'p95_ms', 'p99_ms'):
+                cambio = (medida[metrica] - base[metrica]) / base[metrica] * 100 if base[metrica] else 0
+                variaciones.append(f"{metrica[:3]} {base[metrica]:.2f}→{medida[metrica]:.2f} ({cambio:+.0f}%)")
+            print(f"     {nombre:<24}" + '  '.join(variaciones))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark de rutas del catálogo')
+    parser.add_argument('--tamanos', default=','.join(str(t) for t in TAMANOS),
+                        help='cantidades de productos separadas por coma')
+    parser.add_argument('--repeticiones', type=int, default=REPETICIONES)
+    parser.add_argument('--calentamiento', type=int, default=CALENTAMIENTO)
+    parser.add_argument('--rutas', default=','.join(RUTAS), help='rutas a medir separadas por coma')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help='archivo JSON de resultados')
+    parser.add_argument('--comparar', help='resultado anterior para comparar')
+    parser.add_argument('--interno', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    rutas = [r for r in args.rutas.split(',') if r]
+    desconocidas = [r for r in rutas if r not in RUTAS]
+    if desconocidas:
+        parser.error(f"rutas desconocidas: {', '.join(desconocidas)}")
+
+    if args.interno:
+        resultado = ejecutar_tamano(args.interno, args.repeticiones, args.calentamiento, rutas)
+        print(MARCA_RESULTADO + json.dumps(resultado))
+        sys.exit(0)
+
+    commit = commit_actual()
+    salida = {
+        'meta': {
+            'commit': commit,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'repeticiones': args.repeticiones,
+            'semilla': args.semilla
+        },
+        'resultados': correr_benchmark([int(t) for t in args.tamanos.split(',')], args.repeticiones,
+                                       args.calentamiento, rutas, args.semilla)
+    }
+
+    ruta_salida = args.salida or f"benchmark_catalogo_{commit or datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(ruta_salida, 'w', encoding='utf-8') as f:
+        json.dump(salida, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Resultados guardados en {ruta_salida}")
+
+    if args.comparar:
+        with open(args.comparar, encoding='utf-8') as f:
+            comparar(json.load(f), salida)
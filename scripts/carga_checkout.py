@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prueba de carga de punta a punta del checkout de Belgrano Ahorro
+Levanta app.py sobre una base temporal y un reemplazo local del endpoint
+/api/tickets de la Ticketera (latencia y tasa de fallos configurables),
+registra usuarios sintéticos y repite sesiones concurrentes
+catálogo → agregar al carrito → checkout → pago → confirmación.
+
+Reporta throughput, latencia p50/p95/p99 por paso y la demora entre la
+confirmación del pedido y la entrega de su ticket (leída del outbox de la
+base temporal, así sirve igual con el reemplazo o con la Ticketera real).
+
+USO:
+    python scripts/carga_checkout.py                              # 20 usuarios, 60 s
+    python scripts/carga_checkout.py --usuarios 50 --duracion 120 --latencia-ms 200 --tasa-fallos 0.1
+    python scripts/carga_checkout.py --catalogo 10000             # catálogo sintético
+    python scripts/carga_checkout.py --ticketera-url http://localhost:5001
+
+Con --ticketera-url no se levanta el reemplazo: los tickets van a esa
+Ticketera (por ejemplo belgrano_tickets/app.py corriendo aparte, con la
+misma BELGRANO_AHORRO_API_KEY) y se mide el circuito completo sin red externa.
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+DIRECTORIO_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+DIRECTORIO_PROYECTO = os.path.dirname(DIRECTORIO_SCRIPTS)
+sys.path.insert(0, DIRECTORIO_SCRIPTS)
+
+from benchmark_catalogo import BUSQUEDAS, commit_actual, percentil
+from generar_catalogo import generar_catalogo, guardar_catalogo
+
+API_KEY = os.environ.get('BELGRANO_AHORRO_API_KEY', 'belgrano_ahorro_api_key_2025')
+PASOS = ('catalogo', 'agregar', 'checkout', 'pago', 'confirmacion')
+PASSWORD = 'carga123'
+
+# Segundos máximos para que la aplicación responda al arrancar
+ESPERA_ARRANQUE = 60
+# Intervalo de lectura del outbox para medir la entrega de tickets
+INTERVALO_OUTBOX = 0.05
+
+# Servidor de la aplicación: app.py sin el reloader de debug, con hilos
+SERVIDOR_APP = '''
+import sys
+sys.path.insert(0, {proyecto!r})
+import db
+db.crear_base_datos()
+import app
+app.iniciar_servicios()
+app.app.run(host='127.0.0.1', port={puerto}, threaded=True, debug=False, use_reloader=False)
+'''
+
+def puerto_libre():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+# ==========================================
+# REEMPLAZO LOCAL DE LA TICKETERA
+# ==========================================
+
+class TicketeraLocal:
+    """
+    Servidor HTTP que imita POST /api/tickets y /api/tickets/recibir
+
+    Cada request espera latencia ± jitter y falla con 503 con probabilidad
+    tasa_fallos. Es idempotente por numero, como la Ticketera real.
+    """
+
+    def __init__(self, latencia, jitter, tasa_fallos, semilla=None):
+        self.latencia = latencia
+        self.jitter = jitter
+        self.tasa_fallos = tasa_fallos
+        self.azar = random.Random(semilla)
+        self.lock = threading.Lock()
+        self.tickets = {}
+        self.requests = 0
+        self.fallos = 0
+        self.repetidos = 0
+        self.servidor = None
+
+    def iniciar(self):
+        ticketera = self
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                largo = int(self.headers.get('Content-Length') or 0)
+                cuerpo = self.rfile.read(largo)
+                if self.path not in ('/api/tickets', '/api/tickets/recibir'):
+                    return self._responder(404, {'error': 'No encontrado'})
+                if self.headers.get('X-API-Key') != API_KEY:
+                    return self._responder(401, {'error': 'API key inválida'})
+                with ticketera.lock:
+                    ticketera.requests += 1
+                    espera = max(0.0, ticketera.latencia + ticketera.azar.uniform(-ticketera.jitter, ticketera.jitter))
+                    falla = ticketera.azar.random() < ticketera.tasa_fallos
+                time.sleep(espera)
+                if falla:
+                    with ticketera.lock:
+                        ticketera.fallos += 1
+                    return self._responder(503, {'error': 'Falla simulada'})
+                try:
+                    numero = json.loads(cuerpo or b'{}').get('numero')
+                except ValueError:
+                    return self._responder(400, {'error': 'JSON inválido'})
+                if not numero:
+                    return self._responder(400, {'error': 'Campos requeridos faltantes: numero'})
+                with ticketera.lock:
+                    repetido = numero in ticketera.tickets
+                    if repetido:
+                        ticketera.repetidos += 1
+                    else:
+                        ticketera.tickets[numero] = len(ticketera.tickets) + 1
+                    ticket_id = ticketera.tickets[numero]
+                respuesta = {'exito': True, 'ticket_id': ticket_id, 'numero': numero, 'estado': 'pendiente'}
+                if repetido:
+                    respuesta['idempotent'] = True
+                self._responder(200, respuesta)
+
+            def _responder(self, estado, datos):
+                cuerpo = json.dumps(datos).encode('utf-8')
+                self.send_response(estado)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def log_message(self, formato, *args):
+                pass
+
+        self.servidor = ThreadingHTTPServer(('127.0.0.1', puerto_libre()), Manejador)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+        return f"http://127.0.0.1:{self.servidor.server_address[1]}"
+
+    def detener(self):
+        if self.servidor:
+            self.servidor.shutdown()
+
+    def resumen(self):
+        return {'requests': self.requests, 'fallos_simulados': self.fallos,
+                'tickets': len(self.tickets), 'repetidos': self.repetidos}
+
+# ==========================================
+# APLICACIÓN BAJO PRUEBA
+# ==========================================
+
+def preparar_directorio(directorio, catalogo, semilla):
+    """productos.json del proyecto o uno sintético; la base se crea vacía al arrancar"""
+    destino = os.path.join(directorio, 'productos.json')
+    if catalogo:
+        guardar_catalogo(generar_catalogo(catalogo, semilla), destino)
+    else:
+        shutil.copy(os.path.join(DIRECTORIO_PROYECTO, 'productos.json'), destino)
+    with open(destino, encoding='utf-8') as f:
+        return json.load(f)
+
+def iniciar_aplicacion(directorio, url_ticketera):
+    """Levantar app.py en un proceso aparte; RETORNA (proceso, url base, archivo de log)"""
+    puerto = puerto_libre()
+    entorno = dict(os.environ, TICKETERA_URL=url_ticketera, BELGRANO_AHORRO_API_KEY=API_KEY,
+                   RATE_LIMIT='0', PYTHONUNBUFFERED='1')
+    log = open(os.path.join(directorio, 'app.log'), 'w', encoding='utf-8')
+    proceso = subprocess.Popen(
+        [sys.executable, '-c', SERVIDOR_APP.format(proyecto=DIRECTORIO_PROYECTO, puerto=puerto)],
+        cwd=directorio, env=entorno, stdout=log, stderr=subprocess.STDOUT)
+    url = f"http://127.0.0.1:{puerto}"
+
+    limite = time.monotonic() + ESPERA_ARRANQUE
+    while time.monotonic() < limite:
+        if proceso.poll() is not None:
+            break
+        try:
+            if requests.get(url + '/', timeout=5).status_code == 200:
+                return proceso, url, log
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    proceso.kill()
+    log.close()
+    with open(log.name, encoding='utf-8') as f:
+        raise RuntimeError(f"La aplicación no arrancó:\n{f.read()[-3000:]}")
+
+def registrar_usuarios(url, cantidad):
+    """Crear usuarios sintéticos con /register; RETORNA la lista de emails"""
+    sufijo = datetime.now().strftime('%H%M%S')
+    emails = []
+    sesion = requests.Session()
+    for numero in range(cantidad):
+        email = f"carga{numero}_{sufijo}@belgrano.test"
+        sesion.post(url + '/register', data={
+            'nombre': f'Carga{numero}', 'apellido': 'Sintetico', 'email': email,
+            'password': PASSWORD, 'confirmar_password': PASSWORD,
+            'telefono': '1100000000', 'direccion': f'Calle Falsa {numero}', 'terminos': 'on'
+        }, allow_redirects=False)
+        emails.append(email)
+    return emails
+
+# ==========================================
+# SESIONES SINTÉTICAS
+# ==========================================
+
+class Resultados:
+    """Mediciones compartidas entre los hilos de usuarios"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tiempos = defaultdict(list)
+        self.errores = defaultdict(int)
+        self.resultados_pago = defaultdict(int)
+        self.confirmados = {}
+        self.sesiones = 0
+
+    def medir(self, paso, funcion):
+        inicio = time.perf_counter()
+        try:
+            respuesta = funcion()
+        except requests.RequestException:
+            respuesta = None
+        duracion = time.perf_counter() - inicio
+        with self.lock:
+            self.tiempos[paso].append(duracion)
+            if respuesta is None or respuesta.status_code >= 400:
+                self.errores[paso] += 1
+        return respuesta
+
+def usuario_sintetico(url, email, datos, fin, resultados, azar, productos_por_sesion):
+    """Repetir sesiones de compra hasta el instante `fin`"""
+    sesion = requests.Session()
+    respuesta = sesion.post(url + '/login', data={'email': email, 'password': PASSWORD}, allow_redirects=False)
+    if respuesta.status_code != 302:
+        with resultados.lock:
+            resultados.errores['login'] += 1
+        return
+
+    productos = [p for p in datos['productos'] if p.get('activo', True) and p.get('stock')]
+    categorias = list(datos.get('categorias') or {})
+    while time.monotonic() < fin:
+        # Catálogo: portada y una categoría o una búsqueda
+        if categorias and azar.random() < 0.5:
+            destino = f"/categoria/{azar.choice(categorias)}"
+        else:
+            destino = f"/?busqueda={azar.choice(BUSQUEDAS)}"
+        resultados.medir('catalogo', lambda: sesion.get(url + destino))
+
+        for producto in azar.sample(productos, min(productos_por_sesion, len(productos))):
+            formulario = {'producto_id': producto['id'], 'cantidad': azar.randint(1, 3)}
+            resultados.medir('agregar', lambda: sesion.post(url + '/agregar_al_carrito', data=formulario,
+                                                            allow_redirects=False))
+
+        respuesta = resultados.medir('checkout', lambda: sesion.get(url + '/checkout'))
+        coincidencia = re.search(r'name="idempotency_key" value="([^"]+)"', respuesta.text) if respuesta is not None else None
+        formulario = {'metodo_pago': 'efectivo', 'direccion': 'Calle Falsa 123', 'notas': 'prueba de carga',
+                      'idempotency_key': coincidencia.group(1) if coincidencia else ''}
+        respuesta = resultados.medir('pago', lambda: sesion.post(url + '/procesar_pago', data=formulario,
+                                                                 allow_redirects=False))
+        confirmado = time.time()
+        destino = respuesta.headers.get('Location', '') if respuesta is not None else ''
+
+        if '/confirmacion/' in destino:
+            numero = destino.rsplit('/', 1)[-1]
+            with resultados.lock:
+                resultados.confirmados[numero] = confirmado
+                resultados.resultados_pago['confirmado'] += 1
+            resultados.medir('confirmacion', lambda: sesion.get(url + destino))
+        else:
+            motivo = 'sin_stock' if destino.endswith('/carrito') else 'error'
+            with resultados.lock:
+                resultados.resultados_pago[motivo] += 1
+            # Carrito sin stock: vaciarlo para la próxima sesión
+            sesion.get(url + '/vaciar_carrito', allow_redirects=False)
+        with resultados.lock:
+            resultados.sesiones += 1
+
+class LectorOutbox:
+    """Registra cuándo aparece cada ticket como enviado en el outbox de la base temporal"""
+
+    def __init__(self, ruta_db):
+        self.ruta_db = ruta_db
+        self.entregados = {}
+        self._detenido = threading.Event()
+        self._hilo = threading.Thread(target=self._bucle, daemon=True)
+
+    def iniciar(self):
+        self._hilo.start()
+
+    def detener(self):
+        self._detenido.set()
+        self._hilo.join()
+
+    def pendientes(self):
+        conn = sqlite3.connect(self.ruta_db, timeout=10)
+        try:
+            return conn.execute("SELECT COUNT(*) FROM outbox_tickets WHERE estado = 'pendiente'").fetchone()[0]
+        finally:
+            conn.close()
+
+    def _bucle(self):
+        # Las filas anteriores al primer ticket pendiente ya no cambian: no se releen
+        desde = 0
+        while not self._detenido.is_set():
+            try:
+                conn = sqlite3.connect(self.ruta_db, timeout=10)
+                try:
+                    filas = conn.execute(
+                        "SELECT id, numero, estado FROM outbox_tickets WHERE id >= ? ORDER BY id", (desde,)).fetchall()
+                finally:
+                    conn.close()
+            except sqlite3.Error:
+                filas = []
+            ahora = time.time()
+            pendientes = [id_fila for id_fila, _, estado in filas if estado == 'pendiente']
+            for _, numero, estado in filas:
+                if estado != 'pendiente' and numero not in self.entregados:
+                    self.entregados[numero] = (ahora, estado)
+            if pendientes:
+                desde = pendientes[0]
+            elif filas:
+                desde = filas[-1][0] + 1
+            self._detenido.wait(INTERVALO_OUTBOX)
+
+# ==========================================
+# ORQUESTACIÓN Y REPORTE
+# ==========================================
+
+def resumir_tiempos(tiempos):
+    ordenados = sorted(tiempos)
+    if not ordenados:
+        return {'requests': 0}
+    return {
+        'requests': len(ordenados),
+        'p50_ms': round(percentil(ordenados, 50) * 1000, 2),
+        'p95_ms': round(percentil(ordenados, 95) * 1000, 2),
+        'p99_ms': round(percentil(ordenados, 99) * 1000, 2),
+        'max_ms': round(ordenados[-1] * 1000, 2)
+    }
+
+def correr_prueba(args):
+    ticketera = None
+    with tempfile.TemporaryDirectory(prefix='carga_checkout_') as directorio:
+        datos = preparar_directorio(directorio, args.catalogo, args.semilla)
+        if args.ticketera_url:
+            url_ticketera = args.ticketera_url
+        else:
+            ticketera = TicketeraLocal(args.latencia_ms / 1000, args.jitter_ms / 1000, args.tasa_fallos, args.semilla)
+            url_ticketera = ticketera.iniciar()
+        print(f"🎫 Ticketera: {url_ticketera}{'' if args.ticketera_url else ' (reemplazo local)'}")
+
+        proceso, url, log = iniciar_aplicacion(directorio, url_ticketera)
+        lector = LectorOutbox(os.path.join(directorio, 'belgrano_ahorro.db'))
+        try:
+            print(f"🚀 Aplicación en {url}, registrando {args.usuarios} usuarios...")
+            emails = registrar_usuarios(url, args.usuarios)
+            lector.iniciar()
+
+            print(f"⏱️  {args.usuarios} usuarios concurrentes durante {args.duracion}s...")
+            resultados = Resultados()
+            inicio = time.monotonic()
+            fin = inicio + args.duracion
+            hilos = [threading.Thread(target=usuario_sintetico, args=(
+                url, email, datos, fin, resultados, random.Random(args.semilla + numero), args.productos))
+                for numero, email in enumerate(emails)]
+            for hilo in hilos:
+                hilo.start()
+            for hilo in hilos:
+                hilo.join()
+            transcurrido = time.monotonic() - inicio
+
+            # Esperar a que el despachador entregue los tickets pendientes
+            limite = time.monotonic() + args.espera_tickets
+            while time.monotonic() < limite and lector.pendientes():
+                time.sleep(0.2)
+            sin_entregar = lector.pendientes()
+        finally:
+            lector.detener()
+            proceso.terminate()
+            try:
+                proceso.wait(10)
+            except subprocess.TimeoutExpired:
+                proceso.kill()
+            log.close()
+            if ticketera:
+                ticketera.detener()
+
+    demoras = sorted(lector.entregados[numero][0] - confirmado
+                     for numero, confirmado in resultados.confirmados.items()
+                     if numero in lector.entregados and lector.entregados[numero][1] == 'enviado')
+    confirmados = resultados.resultados_pago['confirmado']
+    return {
+        'duracion_s': round(transcurrido, 2),
+        'sesiones': resultados.sesiones,
+        'sesiones_por_s': round(resultados.sesiones / transcurrido, 2),
+        'checkouts_por_s': round(confirmados / transcurrido, 2),
+        'pagos': dict(resultados.resultados_pago),
+        'errores': dict(resultados.errores),
+        'pasos': {paso: resumir_tiempos(resultados.tiempos[paso]) for paso in PASOS},
+        'entrega_tickets': dict(resumir_tiempos(demoras), sin_entregar=sin_entregar,
+                                fallidos=sum(1 for _, estado in lector.entregados.values() if estado == 'fallido')),
+        'ticketera': ticketera.resumen() if ticketera else None
+    }
+
+def imprimir_resultado(resultado):
+    print(f"\n📊 {resultado['sesiones']} sesiones en {resultado['duracion_s']}s: "
+          f"{resultado['sesiones_por_s']} sesiones/s, {resultado['checkouts_por_s']} checkouts/s")
+    print(f"   Pagos: {resultado['pagos']} | Errores: {resultado['errores'] or 'ninguno'}")
+    print(f"   {'paso':<16}{'requests':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    filas = list(resultado['pasos'].items()) + [('pedido→ticket', resultado['entrega_tickets'])]
+    for nombre, medida in filas:
+        if not medida.get('requests'):
+            continue
+        print(f"   {nombre:<16}{medida['requests']:>10}{medida['p50_ms']:>10}{medida['p95_ms']:>10}"
+              f"{medida['p99_ms']:>10}{medida['max_ms']:>10}")
+    entrega = resultado['entrega_tickets']
+    print(f"   Tickets sin entregar: {entrega['sin_entregar']} | fallidos: {entrega['fallidos']}")
+    if resultado['ticketera']:
+        print(f"   Ticketera local: {resultado['ticketera']}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Prueba de carga del checkout con Ticketera local')
+    parser.add_argument('--usuarios', type=int, default=20, help='usuarios concurrentes')
+    parser.add_argument('--duracion', type=float, default=60, help='segundos de carga')
+    parser.add_argument('--productos', type=int, default=3, help='productos agregados por sesión')
+    parser.add_argument('--catalogo', type=int, help='usar un catálogo sintético de N productos')
+    parser.add_argument('--latencia-ms', type=float, default=50, help='latencia de la Ticketera local')
+    parser.add_argument('--jitter-ms', type=float, default=20, help='variación de la latencia (±)')
+    parser.add_argument('--tasa-fallos', type=float, default=0.0, help='probabilidad de 503 en la Ticketera local')
+    parser.add_argument('--ticketera-url', help='usar esta Ticketera (ej: la real) en lugar del reemplazo local')
+    parser.add_argument('--espera-tickets', type=float, default=30,
+                        help='segundos máximos para esperar la entrega de los tickets al final')
+    parser.add_argument('--semilla', type=int, default=42)
+    parser.add_argument('--salida', help='archivo JSON de resultados')
+    args = parser.parse_args()
+
+    resultado = correr_prueba(args)
+    imprimir_resultado(resultado)
+
+    commit = commit_actual()
+    salida = {
+        'meta': {
+            'commit': commit,
+            'fecha': datetime.now().isoformat(timespec='seconds'),
+            'python': platform.python_version(),
+            'plataforma': platform.platform(),
+            'parametros': vars(args)
+        },
+        'resultado': resultado
+    }
+    ruta_salida = args.salida or f"carga_checkout_{commit or datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    with open(ruta_salida, 'w', encoding='utf-8') as f:
+        json.dump(salida, f, ensure_ascii=False, indent=2)
+    print(f"\n✅ Resultados guardados en {ruta_salida}")
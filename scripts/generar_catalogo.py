@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generador de catálogos sintéticos para Belgrano Ahorro
+Arma un productos.json con la misma estructura que el real (negocios,
+sucursales, categorías, ofertas y productos) del tamaño pedido, para medir
+el rendimiento de la tienda con catálogos grandes
+
+USO:
+    python scripts/generar_catalogo.py 10000 productos_10k.json [--semilla 42]
+"""
+
+import argparse
+import json
+import random
+from datetime import date, timedelta
+
+# ==========================================
+# VOCABULARIO
+# ==========================================
+
+CATEGORIAS = {
+    'granos_cereales': ('Granos y Cereales', '🌾', ['Arroz', 'Fideos', 'Harina', 'Avena', 'Lentejas', 'Garbanzos', 'Polenta']),
+    'lacteos': ('Lácteos', '🥛', ['Leche', 'Yogur', 'Queso', 'Manteca', 'Crema', 'Dulce de Leche']),
+    'condimentos': ('Condimentos', '🧂', ['Aceite', 'Sal', 'Azúcar', 'Vinagre', 'Pimienta', 'Orégano', 'Mayonesa']),
+    'bebidas': ('Bebidas', '🥤', ['Agua', 'Gaseosa', 'Jugo', 'Cerveza', 'Vino', 'Soda']),
+    'frutas_verduras': ('Frutas y Verduras', '🥬', ['Manzanas', 'Bananas', 'Papas', 'Tomates', 'Cebollas', 'Zanahorias']),
+    'carnes': ('Carnes', '🥩', ['Carne Picada', 'Pollo', 'Milanesas', 'Chorizo', 'Bondiola']),
+    'panaderia': ('Panadería', '🍞', ['Pan Lactal', 'Galletas', 'Facturas', 'Tostadas', 'Bizcochos']),
+    'limpieza': ('Limpieza', '🧽', ['Detergente', 'Lavandina', 'Jabón en Polvo', 'Suavizante', 'Limpiador']),
+    'higiene': ('Higiene Personal', '🧴', ['Shampoo', 'Jabón', 'Pasta Dental', 'Desodorante', 'Papel Higiénico']),
+    'almacen': ('Almacén', '🥫', ['Atún', 'Arvejas', 'Tomate Triturado', 'Mermelada', 'Café', 'Yerba', 'Té']),
+    'congelados': ('Congelados', '🧊', ['Hamburguesas', 'Papas Fritas', 'Helado', 'Vegetales', 'Pizza']),
+    'snacks': ('Snacks', '🍿', ['Papas Chips', 'Maní', 'Chocolate', 'Alfajor', 'Turrón']),
+}
+
+VARIANTES = ['', 'Integral', 'Light', 'Orgánico', 'Clásico', 'Premium', 'Sin TACC', 'Familiar', 'Descremado', 'Natural']
+MARCAS = ['La Serenísima', 'Arcor', 'Molinos', 'Marolio', 'Ledesma', 'Cañuelas', 'Knorr', 'Natura', 'Sancor',
+          'Ilolay', 'Terrabusi', 'Bagley', 'Cif', 'Ala', 'Granja del Sol', 'Paty', 'Manaos', 'Quilmes']
+PRESENTACIONES = ['250g', '500g', '1kg', '2kg', '500ml', '1L', '1.5L', '2.25L', '6u', '12u', 'x3', 'x6']
+NEGOCIOS = ['Belgrano Ahorro', 'Maxi Descuento', 'Super Mercado', 'Almacén Don José', 'Mercado Norte',
+            'Autoservicio Sur', 'Distribuidora Central', 'Kiosco 24hs']
+ZONAS = ['Centro', 'Norte', 'Sur', 'Este', 'Oeste', 'Palermo', 'Núñez', 'Colegiales']
+COLORES = ['#28a745', '#dc3545', '#007bff', '#fd7e14', '#6f42c1', '#20c997', '#e83e8c', '#17a2b8']
+
+def _slug(texto):
+    reemplazos = str.maketrans('áéíóúñÁÉÍÓÚÑ ', 'aeiounAEIOUN_')
+    return ''.join(c for c in texto.translate(reemplazos).lower() if c.isalnum() or c == '_')
+
+# ==========================================
+# GENERACIÓN
+# ==========================================
+
+def generar_catalogo(cantidad, semilla=42, hoy=None):
+    """
+    Generar un catálogo sintético
+
+    PARÁMETROS:
+    - cantidad: cantidad de productos
+    - semilla: semilla del generador (mismo valor = mismo catálogo)
+    - hoy: fecha de referencia para las ofertas (por defecto, la actual)
+
+    RETORNA:
+    - Diccionario con la estructura de productos.json
+    """
+    azar = random.Random(semilla)
+    hoy = hoy or date.today()
+
+    # Más productos -> más negocios y sucursales, como en un catálogo real
+    cantidad_negocios = min(len(NEGOCIOS), 3 + cantidad // 20000)
+    negocios = {}
+    sucursales = {}
+    for numero, nombre in enumerate(NEGOCIOS[:cantidad_negocios], 1):
+        negocio_id = _slug(nombre)
+        negocios[negocio_id] = {
+            'id': numero,
+            'nombre': nombre,
+            'descripcion': f'Sucursales de {nombre} en toda la ciudad',
+            'logo': f'/static/images/logo_{negocio_id}.jpg',
+            'color': COLORES[numero - 1],
+            'activo': True
+        }
+        sucursales[negocio_id] = {}
+        for zona in azar.sample(ZONAS, azar.randint(2, 5)):
+            sucursales[negocio_id][f'sucursal_{_slug(zona)}'] = {
+                'id': sum(len(s) for s in sucursales.values()) + 1,
+                'nombre': f'Sucursal {zona}',
+                'direccion': f'Av. {zona} {azar.randint(100, 9999)}',
+                'telefono': f'011-{azar.randint(1000, 9999)}-{azar.randint(1000, 9999)}',
+                'horarios': 'Lun-Sáb 8:00-22:00, Dom 9:00-21:00',
+                'activo': azar.random() > 0.05
+            }
+
+    categorias = {}
+    for numero, (categoria_id, (nombre, icono, _)) in enumerate(CATEGORIAS.items(), 1):
+        categorias[categoria_id] = {
+            'id': numero,
+            'nombre': nombre,
+            'descripcion': f'Productos de {nombre.lower()}',
+            'icono': icono
+        }
+
+    productos = []
+    for producto_id in range(1, cantidad + 1):
+        negocio_id = azar.choice(list(negocios))
+        categoria_id = azar.choice(list(CATEGORIAS))
+        base = azar.choice(CATEGORIAS[categoria_id][2])
+        nombre = ' '.join(p for p in (base, azar.choice(VARIANTES), azar.choice(MARCAS), azar.choice(PRESENTACIONES)) if p)
+        precio = azar.randint(2, 900) * 50
+        sucursales_negocio = list(sucursales[negocio_id])
+        producto = {'id': producto_id, 'nombre': nombre, 'precio': precio}
+        if azar.random() < 0.15:
+            producto['precio_original'] = precio + azar.randint(1, 10) * 50
+        producto.update({
+            'imagen': f'/static/images/productos/{_slug(base)}.jpg',
+            'negocio': negocio_id,
+            'categoria': categoria_id,
+            'stock': 0 if azar.random() < 0.1 else azar.randint(1, 200),
+            'destacado': azar.random() < 0.05,
+            'activo': azar.random() > 0.03,
+            'sucursales': sorted(azar.sample(sucursales_negocio, azar.randint(1, len(sucursales_negocio))),
+                                 key=sucursales_negocio.index)
+        })
+        productos.append(producto)
+
+    # Ofertas: algunas vigentes, algunas vencidas y algunas futuras
+    ofertas = {}
+    numero_oferta = 0
+    for negocio_id in negocios:
+        ids_negocio = [p['id'] for p in productos if p['negocio'] == negocio_id]
+        ofertas[negocio_id] = []
+        for _ in range(azar.randint(2, 5)):
+            numero_oferta += 1
+            inicio = hoy + timedelta(days=azar.randint(-60, 10))
+            ofertas[negocio_id].append({
+                'id': f'oferta_{numero_oferta}',
+                'titulo': azar.choice(['🔥 OFERTA ESPECIAL', '⚡ DESCUENTO RÁPIDO', '💥 MEGA OFERTA', '🎯 OFERTA SEMANAL']),
+                'descripcion': 'Descuento en productos seleccionados',
+                'descuento': azar.choice([10, 15, 20, 25, 30, 50]),
+                'fecha_inicio': inicio.isoformat(),
+                'fecha_fin': (inicio + timedelta(days=azar.randint(7, 90))).isoformat(),
+                'productos': azar.sample(ids_negocio, min(len(ids_negocio), azar.randint(4, 40)))
+            })
+
+    return {
+        'negocios': negocios,
+        'sucursales': sucursales,
+        'categorias': categorias,
+        'ofertas': ofertas,
+        'productos': productos
+    }
+
+def guardar_catalogo(datos, ruta):
+    """Guardar el catálogo con el mismo formato que productos.json"""
+    with open(ruta, 'w', encoding='utf-8') as f:
+        json.dump(datos, f, ensure_ascii=False, indent=2)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generar un productos.json sintético')
+    parser.add_argument('cantidad', type=int, help='cantidad de productos')
+    parser.add_argument('salida', nargs='?', default='productos_sintetico.json', help='archivo de salida')
+    parser.add_argument('--semilla', type=int, default=42)
+    args = parser.parse_args()
+
+    datos = generar_catalogo(args.cantidad, args.semilla)
+    guardar_catalogo(datos, args.salida)
+    print(f"✅ Catálogo sintético con {args.cantidad} productos guardado en {args.salida}")
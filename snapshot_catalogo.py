@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Snapshot binario del catálogo de Belgrano Ahorro
+Compila el catálogo (columnas de catalogo_compacto.py + negocios, sucursales,
+categorías y ofertas) en un archivo versionado que los procesos de la
+aplicación mapean en memoria de solo lectura: las páginas del archivo se
+comparten entre todos los workers y recargar es abrir el archivo nuevo
+
+USO:
+    python snapshot_catalogo.py [catalogo.snapshot]
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+from collections.abc import Sequence
+from contextlib import contextmanager
+
+import catalogo_db
+from catalogo_compacto import (ATRIBUTOS_ARRAY, ATRIBUTOS_FILAS_POR_CLAVE, ATRIBUTOS_MASCARA,
+                               ATRIBUTOS_MASCARAS_POR_CLAVE, ATRIBUTOS_TEXTO, ATRIBUTOS_VALORES,
+                               ColumnasProductos)
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: sin bloqueo entre procesos (cada proceso puede compilar su snapshot)
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+ARCHIVO_SNAPSHOT = 'catalogo.snapshot'
+
+# Encabezado fijo: marca, posición y largo de la cabecera JSON
+MAGIA = b'BACATSN1'
+_PREFIJO = struct.Struct('<8sQQ')
+FORMATO = 1
+
+SECCIONES = ('negocios', 'sucursales', 'categorias', 'ofertas')
+
+# ==========================================
+# LECTURA
+# ==========================================
+
+class TextosEmpaquetados(Sequence):
+    """Columna de textos UTF-8 contiguos con un array de posiciones de inicio"""
+
+    __slots__ = ('_inicios', '_datos')
+
+    def __init__(self, inicios, datos):
+        self._inicios = inicios
+        self._datos = datos
+
+    def __getitem__(self, posicion):
+        return str(self._datos[self._inicios[posicion]:self._inicios[posicion + 1]], 'utf-8')
+
+    def __len__(self):
+        return len(self._inicios) - 1
+
+def _clave_desde_json(valor):
+    """Las claves compuestas (negocio, sucursal) vuelven como tupla"""
+    return tuple(valor) if isinstance(valor, list) else valor
+
+def abrir_snapshot(ruta=ARCHIVO_SNAPSHOT, version=None, firma=None):
+    """
+    Mapear un snapshot en memoria
+
+    PARÁMETROS:
+    - version, firma: si se indican, el snapshot debe corresponder a esa versión
+
+    RETORNA:
+    - (datos, version, firma) con datos['productos'] como ColumnasProductos
+      sobre el archivo mapeado, o None si no existe, no corresponde o está dañado
+    """
+    try:
+        with open(ruta, 'rb') as f:
+            mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+    try:
+        magia, inicio_cabecera, largo_cabecera = _PREFIJO.unpack_from(mapa, 0)
+        if magia != MAGIA:
+            raise ValueError('marca inválida')
+        cabecera = json.loads(mapa[inicio_cabecera:inicio_cabecera + largo_cabecera].decode('utf-8'))
+        if cabecera['formato'] != FORMATO or cabecera['orden_bytes'] != sys.byteorder:
+            raise ValueError('formato incompatible')
+    except (struct.error, ValueError, KeyError) as e:
+        logger.warning(f"Snapshot del catálogo {ruta} inválido: {e}")
+        mapa.close()
+        return None
+
+    if (version is not None and cabecera['version'] != version) or \
+       (firma is not None and cabecera['firma'] != firma):
+        mapa.close()
+        return None
+
+    memoria = memoryview(mapa)
+
+    def vista(ubicacion):
+        posicion, tipo, cantidad = ubicacion
+        return memoria[posicion:posicion + cantidad * struct.calcsize(tipo)].cast(tipo)
+
+    def mascara(posicion):
+        return int.from_bytes(memoria[posicion:posicion + cabecera['bytes_mascara']], 'little')
+
+    atributos = dict(cabecera['valores'])
+    atributos['extra'] = {int(fila): campos for fila, campos in atributos['extra'].items()}
+    atributos['tipos_forma'] = [tuple(tuple(par) for par in tipos) for tipos in atributos['tipos_forma']]
+    atributos['combinaciones_sucursales'] = [tuple(c) for c in atributos['combinaciones_sucursales']]
+    for nombre, ubicacion in cabecera['arrays'].items():
+        atributos[nombre] = vista(ubicacion)
+    for nombre, (inicios, datos) in cabecera['textos'].items():
+        atributos[nombre] = TextosEmpaquetados(vista(inicios), memoria[datos[0]:datos[0] + datos[1]])
+    for nombre, claves in cabecera['filas_por_clave'].items():
+        atributos[nombre] = {_clave_desde_json(clave): vista(ubicacion) for clave, ubicacion in claves}
+    for nombre, posicion in cabecera['mascaras'].items():
+        atributos[nombre] = mascara(posicion)
+    for nombre, claves in cabecera['mascaras_por_clave'].items():
+        atributos[nombre] = {_clave_desde_json(clave): mascara(posicion) for clave, posicion in claves}
+    # Referencia al mapa para que viva mientras se use el snapshot
+    atributos['_mapa'] = mapa
+
+    datos = dict(cabecera['secciones'])
+    datos['productos'] = ColumnasProductos.desde_atributos(atributos)
+    return datos, cabecera['version'], cabecera['firma']
+
+# ==========================================
+# COMPILACIÓN Y PUBLICACIÓN
+# ==========================================
+
+def _escribir_snapshot(f, datos, columnas, version, firma):
+    f.write(_PREFIJO.pack(MAGIA, 0, 0))
+
+    def alinear():
+        relleno = -f.tell() % 8
+        if relleno:
+            f.write(b'\0' * relleno)
+
+    def escribir_array(valores):
+        alinear()
+        posicion = f.tell()
+        f.write(valores.tobytes())
+        # array.array o memoryview (si las columnas vienen de otro snapshot)
+        return [posicion, getattr(valores, 'typecode', None) or valores.format, len(valores)]
+
+    bytes_mascara = (len(columnas) + 7) // 8
+
+    def escribir_mascara(valor):
+        alinear()
+        posicion = f.tell()
+        f.write(valor.to_bytes(bytes_mascara, 'little'))
+        return posicion
+
+    cabecera = {
+        'formato': FORMATO,
+        'orden_bytes': sys.byteorder,
+        'version': version,
+        'firma': firma,
+        'secciones': {seccion: datos.get(seccion, {}) for seccion in SECCIONES},
+        'valores': {nombre: getattr(columnas, nombre) for nombre in ATRIBUTOS_VALORES},
+        'bytes_mascara': bytes_mascara,
+        'arrays': {},
+        'textos': {},
+        'filas_por_clave': {},
+        'mascaras': {},
+        'mascaras_por_clave': {}
+    }
+    cabecera['valores']['extra'] = {str(fila): campos for fila, campos in columnas.extra.items()}
+
+    for nombre in ATRIBUTOS_ARRAY:
+        cabecera['arrays'][nombre] = escribir_array(getattr(columnas, nombre))
+
+    for nombre in ATRIBUTOS_TEXTO:
+        inicios = [0]
+        codificados = []
+        for texto in getattr(columnas, nombre):
+            codificado = texto.encode('utf-8')
+            codificados.append(codificado)
+            inicios.append(inicios[-1] + len(codificado))
+        ubicacion_inicios = escribir_array(array('Q', inicios))
+        posicion = f.tell()
+        for codificado in codificados:
+            f.write(codificado)
+        cabecera['textos'][nombre] = [ubicacion_inicios, [posicion, inicios[-1]]]
+
+    for nombre in ATRIBUTOS_FILAS_POR_CLAVE:
+        cabecera['filas_por_clave'][nombre] = [[clave, escribir_array(filas)]
+                                               for clave, filas in getattr(columnas, nombre).items()]
+    for nombre in ATRIBUTOS_MASCARA:
+        cabecera['mascaras'][nombre] = escribir_mascara(getattr(columnas, nombre))
+    for nombre in ATRIBUTOS_MASCARAS_POR_CLAVE:
+        cabecera['mascaras_por_clave'][nombre] = [[clave, escribir_mascara(valor)]
+                                                  for clave, valor in getattr(columnas, nombre).items()]
+
+    contenido = json.dumps(cabecera, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    inicio_cabecera = f.tell()
+    f.write(contenido)
+    f.seek(0)
+    f.write(_PREFIJO.pack(MAGIA, inicio_cabecera, len(contenido)))
+
+def publicar_snapshot(ruta, datos, columnas, version, firma):
+    """
+    Escribir el snapshot y reemplazar el anterior de forma atómica
+
+    PARÁMETROS:
+    - datos: diccionario con negocios, sucursales, categorías y ofertas
+    - columnas: ColumnasProductos con los productos
+
+    Se escribe a un archivo temporal y se renombra: los procesos que ya
+    tienen mapeado el snapshot anterior lo siguen leyendo sin problemas.
+    """
+    temporal = f"{ruta}.{os.getpid()}.tmp"
+    try:
+        with open(temporal, 'wb') as f:
+            _escribir_snapshot(f, datos, columnas, version, firma)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta)
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    logger.info(f"Snapshot del catálogo publicado en {ruta} (versión {version}): {len(columnas)} productos")
+
+@contextmanager
+def bloqueo_publicacion(ruta=ARCHIVO_SNAPSHOT):
+    """Bloqueo entre procesos para que un solo worker compile cada versión"""
+    if fcntl is None:
+        yield
+        return
+    with open(f"{ruta}.lock", 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def compilar_desde_base(conn, ruta=ARCHIVO_SNAPSHOT):
+    """Compilar y publicar el snapshot de la versión del catálogo guardada en la base"""
+    version = int(catalogo_db.leer_meta(conn, 'version') or 0)
+    firma = catalogo_db.leer_meta(conn, 'firma') or ''
+    datos = catalogo_db.leer_secciones(conn)
+    columnas = ColumnasProductos(catalogo_db.iterar_productos(conn))
+    publicar_snapshot(ruta, datos, columnas, version, firma)
+    return version
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    ruta = sys.argv[1] if len(sys.argv) > 1 else ARCHIVO_SNAPSHOT
+    conn = catalogo_db.conectar()
+    try:
+        catalogo_db.crear_tablas_catalogo(conn)
+        if catalogo_db.leer_meta(conn, 'version') is None:
+            catalogo_db.importar_json(catalogo_db.ARCHIVO_JSON, catalogo_db.ARCHIVO_DB)
+        with bloqueo_publicacion(ruta):
+            version = compilar_desde_base(conn, ruta)
+        print(f"Snapshot versión {version} escrito en {ruta}")
+    finally:
+        conn.close()
@@ -0,0 +1,69 @@
+// Carga incremental de productos del catálogo (scroll infinito)
+// Los contenedores con data-catalogo-cursor piden la página siguiente a
+// /api/v1/catalogo cuando el final de la lista se acerca a la vista.
+function iniciarCargaCatalogo(contenedor) {
+    const horizontal = contenedor.classList.contains('carrusel-productos');
+    const centinela = document.createElement('div');
+    centinela.className = 'catalogo-centinela';
+    centinela.style.cssText = horizontal ? 'flex: 0 0 1px; align-self: stretch;' : 'width: 100%; height: 1px;';
+    contenedor.appendChild(centinela);
+
+    let cargando = false;
+
+    function terminar(observador) {
+        observador.disconnect();
+        centinela.remove();
+    }
+
+    const observador = new IntersectionObserver(function(entradas) {
+        if (cargando || !entradas.some(entrada => entrada.isIntersecting)) {
+            return;
+        }
+        const cursor = contenedor.dataset.catalogoCursor;
+        if (!cursor) {
+            terminar(observador);
+            return;
+        }
+
+        cargando = true;
+        const params = new URLSearchParams(contenedor.dataset.catalogoFiltros || '');
+        params.set('cursor', cursor);
+        params.set('formato', 'html');
+        params.set('plantilla', contenedor.dataset.catalogoPlantilla || 'carrusel');
+
+        fetch('/api/v1/catalogo?' + params.toString())
+            .then(response => response.json())
+            .then(data => {
+                if (data.status !== 'success') {
+                    throw new Error(data.error);
+                }
+                centinela.insertAdjacentHTML('beforebegin', data.html);
+                contenedor.dataset.catalogoCursor = data.siguiente || '';
+                if (!data.siguiente) {
+                    terminar(observador);
+                } else {
+                    // Volver a observar por si el centinela sigue visible
+                    observador.unobserve(centinela);
+                    observador.observe(centinela);
+                }
+            })
+            .catch(error => console.error('Error al cargar productos:', error))
+            .finally(() => { cargando = false; });
+    }, {
+        root: horizontal ? contenedor : null,
+        rootMargin: horizontal ? '0px 600px 0px 0px' : '0px 0px 600px 0px'
+    });
+
+    observador.observe(centinela);
+}
+
+document.addEventListener('DOMContentLoaded', function() {
+    if (!('IntersectionObserver' in window)) {
+        return;
+    }
+    document.querySelectorAll('[data-catalogo-cursor]').forEach(contenedor => {
+        if (contenedor.dataset.catalogoCursor) {
+            iniciarCargaCatalogo(contenedor);
+        }
+    });
+});
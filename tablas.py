@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Acceso a datos por columnas declaradas para Belgrano Ahorro
+Cada Tabla declara sus columnas una sola vez. Las consultas arman el SELECT
+con las columnas pedidas (proyección) y guardan el texto SQL ya armado, así
+cada combinación usa siempre la misma sentencia y sqlite3 la toma compilada
+de su caché por conexión.
+
+Las filas se construyen con una fábrica a elección:
+- 'vista': VistaFila, mapeo de solo lectura sobre la tupla de sqlite3. Se usa
+  como los diccionarios que armaban antes las funciones de db.py
+  (fila['estado'], fila.get('estado'), {{ fila.estado }} en los templates)
+  sin crear un dict por fila
+- 'tupla': la tupla de sqlite3 tal cual, sin conversiones (la más liviana)
+- 'nombrada': namedtuple con acceso por atributo (fila.estado)
+- 'dict': diccionario común, para modificarlo o pasarlo a jsonify
+- o una función fabrica(forma) que devuelve el constructor de cada fila
+
+USO:
+    with conexiones.conexion() as conn:
+        filas = tablas.TICKETS.consultar(conn, columnas=('id', 'estado'),
+                                         where='repartidor = ?', parametros=(repartidor,),
+                                         orden='fecha_creacion DESC')
+
+MANTENIMIENTO:
+- where y orden son SQL literal escrito en el código, nunca datos del
+  usuario: los valores van siempre en parametros
+"""
+
+from collections import namedtuple
+from collections.abc import Mapping
+from functools import partial
+
+# ==========================================
+# FILAS
+# ==========================================
+
+class Forma:
+    """Columnas de un resultado: nombres, posiciones y conversiones por posición"""
+
+    __slots__ = ('nombres', 'posiciones', 'conversiones', 'constructores')
+
+    def __init__(self, nombres, conversiones):
+        self.nombres = nombres
+        self.posiciones = {nombre: i for i, nombre in enumerate(nombres)}
+        self.conversiones = tuple(conversiones.get(nombre) for nombre in nombres)
+        # Constructor de filas por fábrica (las clases namedtuple se crean una vez)
+        self.constructores = {}
+
+    def convertir(self, valores):
+        """Valores con las conversiones aplicadas"""
+        return tuple(conversion(valor) if conversion else valor
+                     for conversion, valor in zip(self.conversiones, valores))
+
+class VistaFila(Mapping):
+    """
+    Fila de solo lectura con acceso por nombre de columna
+
+    Guarda la tupla de sqlite3 y la forma compartida por todas las filas del
+    resultado; las conversiones se aplican al leer cada valor.
+    """
+
+    __slots__ = ('_forma', '_valores')
+
+    def __init__(self, forma, valores):
+        self._forma = forma
+        self._valores = valores
+
+    def __getitem__(self, columna):
+        i = self._forma.posiciones[columna]
+        conversion = self._forma.conversiones[i]
+        valor = self._valores[i]
+        return conversion(valor) if conversion else valor
+
+    def __iter__(self):
+        return iter(self._forma.nombres)
+
+    def __len__(self):
+        return len(self._forma.nombres)
+
+    def __repr__(self):
+        return f"VistaFila({dict(self)!r})"
+
+def _fabrica_vista(forma):
+    return partial(VistaFila, forma)
+
+def _fabrica_tupla(forma):
+    # Las tuplas de sqlite3 tal cual
+    return None
+
+def _fabrica_nombrada(forma):
+    clase = namedtuple('Fila', forma.nombres)
+    return lambda valores: clase._make(forma.convertir(valores))
+
+def _fabrica_dict(forma):
+    return lambda valores: dict(zip(forma.nombres, forma.convertir(valores)))
+
+FABRICAS = {
+    'vista': _fabrica_vista,
+    'tupla': _fabrica_tupla,
+    'nombrada': _fabrica_nombrada,
+    'dict': _fabrica_dict,
+}
+
+def constructor_filas(forma, fila):
+    """Constructor de filas de la forma para la fábrica `fila` (nombre o función)"""
+    try:
+        return forma.constructores[fila]
+    except KeyError:
+        pass
+    fabrica = FABRICAS[fila] if isinstance(fila, str) else fila
+    constructor = forma.constructores[fila] = fabrica(forma)
+    return constructor
+
+# ==========================================
+# TABLAS
+# ==========================================
+
+class Tabla:
+    """
+    Columnas declaradas de una tabla (o de un JOIN) y sus SELECT ya armados
+
+    PARÁMETROS:
+    - origen: lo que va en el FROM ('tickets', 'comerciantes c JOIN usuarios u ON ...')
+    - columnas: nombres de columna, o (nombre, expresión) cuando difieren
+      (ej: ('email', 'u.email'))
+    - conversiones: {nombre: función} que se aplica al leer el valor
+    """
+
+    def __init__(self, origen, columnas, conversiones=None):
+        self.origen = origen
+        self.expresiones = {}
+        for columna in columnas:
+            nombre, expresion = (columna, columna) if isinstance(columna, str) else columna
+            self.expresiones[nombre] = expresion
+        self.columnas = tuple(self.expresiones)
+        self.conversiones = conversiones or {}
+        self._sentencias = {}
+
+    def sentencia(self, columnas=None, where='', orden='', limite=False):
+        """
+        SELECT para las columnas pedidas (armado una vez por combinación)
+
+        PARÁMETROS:
+        - limite: terminar con LIMIT ? (el valor va como último parámetro)
+
+        RETORNA:
+        - (sql, forma)
+        """
+        clave = (columnas, where, orden, limite)
+        preparada = self._sentencias.get(clave)
+        if preparada is None:
+            nombres = tuple(columnas) if columnas else self.columnas
+            desconocidas = [nombre for nombre in nombres if nombre not in self.expresiones]
+            if desconocidas:
+                raise ValueError(f"Columnas desconocidas en {self.origen}: {', '.join(desconocidas)}")
+            seleccion = ', '.join(self.expresiones[nombre] if self.expresiones[nombre] == nombre
+                                  else f"{self.expresiones[nombre]} AS {nombre}" for nombre in nombres)
+            sql = f"SELECT {seleccion} FROM {self.origen}"
+            if where:
+                sql += f" WHERE {where}"
+            if orden:
+                sql += f" ORDER BY {orden}"
+            if limite:
+                sql += " LIMIT ?"
+            preparada = self._sentencias[clave] = (sql, Forma(nombres, self.conversiones))
+        return preparada
+
+    def consultar(self, conn, columnas=None, where='', parametros=(), orden='', limite=None, fila='vista'):
+        """
+        Filas de la tabla
+
+        PARÁMETROS:
+        - columnas: tupla de columnas a leer (por defecto todas las declaradas)
+        - where / orden: SQL literal para WHERE y ORDER BY
+        - parametros: valores de los ? de where
+        - limite: cantidad máxima de filas (None: todas)
+        - fila: fábrica de filas ('vista', 'tupla', 'nombrada', 'dict' o función)
+
+        RETORNA:
+        - Lista de filas
+        """
+        sql, forma = self.sentencia(columnas and tuple(columnas), where, orden, limite is not None)
+        if limite is not None:
+            parametros = (*parametros, limite)
+        filas = conn.execute(sql, parametros).fetchall()
+        constructor = constructor_filas(forma, fila)
+        if constructor is None:
+            return filas
+        return [constructor(valores) for valores in filas]
+
+    def obtener(self, conn, columnas=None, where='', parametros=(), fila='vista'):
+        """Primera fila de la consulta, o None"""
+        sql, forma = self.sentencia(columnas and tuple(columnas), where)
+        valores = conn.execute(sql, parametros).fetchone()
+        if valores is None:
+            return None
+        constructor = constructor_filas(forma, fila)
+        return valores if constructor is None else constructor(valores)
+
+# ==========================================
+# COLUMNAS DECLARADAS
+# ==========================================
+
+def _cero_si_nulo(total):
+    return total or 0.00
+
+TICKETS = Tabla('tickets', (
+    'id', 'numero', 'cliente_nombre', 'cliente_direccion', 'cliente_telefono', 'cliente_email',
+    'productos', 'total', 'estado', 'estado_envio', 'prioridad', 'indicaciones', 'repartidor',
+    'fecha_creacion', 'fecha_actualizacion', 'fecha_envio', 'fecha_entrega'
+), conversiones={'total': _cero_si_nulo})
+
+REGISTRO_TICKETS = Tabla('registro_tickets', (
+    'id', 'ticket_id', 'numero', 'cliente_nombre', 'cliente_direccion', 'cliente_telefono',
+    'cliente_email', 'productos', 'total', 'estado_final', 'estado_envio_final', 'prioridad',
+    'indicaciones', 'repartidor', 'fecha_creacion', 'fecha_envio', 'fecha_entrega', 'fecha_registro'
+), conversiones={'total': _cero_si_nulo})
+
+COMERCIANTES = Tabla('comerciantes c JOIN usuarios u ON c.usuario_id = u.id', (
+    ('id', 'c.id'), ('usuario_id', 'c.usuario_id'), ('nombre_negocio', 'c.nombre_negocio'),
+    ('cuit', 'c.cuit'), ('direccion_comercial', 'c.direccion_comercial'),
+    ('telefono_comercial', 'c.telefono_comercial'), ('tipo_negocio', 'c.tipo_negocio'),
+    ('fecha_registro', 'c.fecha_registro'), ('activo', 'c.activo'),
+    ('nombre', 'u.nombre'), ('apellido', 'u.apellido'), ('email', 'u.email'), ('telefono', 'u.telefono')
+))
+
+PEDIDOS = Tabla('pedidos', (
+    'id', 'usuario_id', 'numero_pedido', 'fecha', 'total', 'estado', 'metodo_pago', 'direccion_entrega', 'notas'
+))
+
+PEDIDO_ITEMS = Tabla('pedido_items', (
+    'id', 'pedido_id', 'producto_id', 'cantidad', 'precio_unitario', 'subtotal', 'nombre_producto'
+))
+
+RESUMEN_PEDIDOS = Tabla('resumen_pedidos_usuario', (
+    'usuario_id', 'cantidad_pedidos', 'total_gastado', 'ultimo_pedido'
+))
@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de /api/carrito/lote sobre una copia de la base
+Un lote con más de MAX_OPERACIONES_CARRITO operaciones se rechaza entero
+y el carrito queda como estaba.
+"""
+
+import os
+import shutil
+import tempfile
+
+import conexiones
+
+RUTA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'belgrano_ahorro.db')
+
+def test_lote_excedido_no_modifica_el_carrito():
+    """Más operaciones que el máximo: 400 y ningún cambio aplicado"""
+    with tempfile.TemporaryDirectory() as directorio:
+        ruta = os.path.join(directorio, 'belgrano_ahorro.db')
+        shutil.copyfile(RUTA_BASE, ruta)
+        # La app usa el pool global: apuntarlo a la copia antes de importarla
+        conexiones.pool.renovar(ruta)
+        try:
+            import esquema
+            esquema.migrar()
+            import app as modulo_app
+            from carritos import clave_usuario
+
+            producto_id = modulo_app.catalogo.obtener().activos[0]['id']
+            cliente = modulo_app.app.test_client()
+            with cliente.session_transaction() as sesion:
+                sesion['usuario_id'] = 1
+
+            respuesta = cliente.post('/api/carrito/lote', json={'operaciones': [
+                {'accion': 'fijar', 'producto_id': producto_id, 'cantidad': 2}]})
+            assert respuesta.status_code == 200 and respuesta.get_json()['exito']
+            assert modulo_app.carritos.obtener(clave_usuario(1)) == {str(producto_id): 2}
+
+            operaciones = [{'accion': 'agregar', 'producto_id': producto_id, 'cantidad': 1}
+                           for _ in range(modulo_app.MAX_OPERACIONES_CARRITO + 1)]
+            respuesta = cliente.post('/api/carrito/lote', json={'operaciones': operaciones})
+            assert respuesta.status_code == 400
+            assert not respuesta.get_json()['exito']
+            assert modulo_app.carritos.obtener(clave_usuario(1)) == {str(producto_id): 2}
+        finally:
+            conexiones.pool.renovar(conexiones.RUTA_DB)
+
+if __name__ == "__main__":
+    test_lote_excedido_no_modifica_el_carrito()
+    print("✅ Carrito en lote OK")
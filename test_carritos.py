@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test del almacén de carritos (carritos.py) sobre una copia de la base
+Cada instancia de AlmacenCarritos hace de un worker distinto: lo que
+escribe una tiene que verlo la otra, aunque tenga el carrito en su caché.
+"""
+
+import os
+import shutil
+import tempfile
+
+import conexiones
+import esquema
+from carritos import AlmacenCarritos, clave_anonima, clave_usuario
+
+RUTA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'belgrano_ahorro.db')
+
+def copiar_base(directorio):
+    """Copia migrada de la base distribuida en un directorio temporal, con su pool"""
+    ruta = os.path.join(directorio, 'belgrano_ahorro.db')
+    shutil.copyfile(RUTA_BASE, ruta)
+    pool = conexiones.PoolConexiones(ruta)
+    with pool.conexion() as conn:
+        esquema.migrar(conn)
+    return pool
+
+def test_carrito_sobrevive_a_otra_instancia():
+    """Un carrito guardado por una instancia se lee igual desde una instancia nueva"""
+    with tempfile.TemporaryDirectory() as directorio:
+        pool = copiar_base(directorio)
+        try:
+            clave = clave_usuario(1)
+            AlmacenCarritos(pool).aplicar(clave, [('agregar', 1, 2), ('agregar', 2, 1), ('fijar', 3, 5)])
+            assert AlmacenCarritos(pool).obtener(clave) == {'1': 2, '2': 1, '3': 5}
+        finally:
+            pool.cerrar_todas()
+
+def test_copia_en_cache_no_pisa_cambios_de_otra_instancia():
+    """Un carrito vaciado en un proceso no vuelve desde la caché de otro"""
+    with tempfile.TemporaryDirectory() as directorio:
+        pool = copiar_base(directorio)
+        try:
+            clave = clave_usuario(1)
+            primera, segunda = AlmacenCarritos(pool), AlmacenCarritos(pool)
+            primera.agregar(clave, 1, 2)
+            assert segunda.obtener(clave) == {'1': 2}
+
+            primera.vaciar(clave)
+            assert segunda.obtener(clave) == {}
+            segunda.agregar(clave, 2, 1)
+            assert primera.obtener(clave) == {'2': 1}
+            assert AlmacenCarritos(pool).obtener(clave) == {'2': 1}
+        finally:
+            pool.cerrar_todas()
+
+def test_escritura_diferida_en_un_proceso():
+    """Con escritura diferida los cambios llegan a la base al guardar los pendientes"""
+    with tempfile.TemporaryDirectory() as directorio:
+        pool = copiar_base(directorio)
+        try:
+            clave = clave_anonima('visitante')
+            almacen = AlmacenCarritos(pool, un_proceso=True, demora_escritura=60)
+            almacen.agregar(clave, 1, 3)
+            assert AlmacenCarritos(pool).obtener(clave) == {}
+            assert almacen.guardar_pendientes() == 1
+            assert AlmacenCarritos(pool).obtener(clave) == {'1': 3}
+        finally:
+            pool.cerrar_todas()
+
+if __name__ == "__main__":
+    test_carrito_sobrevive_a_otra_instancia()
+    test_copia_en_cache_no_pisa_cambios_de_otra_instancia()
+    test_escritura_diferida_en_un_proceso()
+    print("✅ Carritos OK")
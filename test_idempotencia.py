@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de las claves de idempotencia del checkout (idempotencia.py)
+Un reenvío del mismo formulario ve la operación en curso o su resultado,
+y una clave liberada tras un fallo puede volver a reclamarse.
+"""
+
+import os
+import shutil
+import tempfile
+
+import conexiones
+import esquema
+from idempotencia import ClavesIdempotencia, nueva_clave
+
+RUTA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'belgrano_ahorro.db')
+
+def copiar_base(directorio):
+    """Copia migrada de la base distribuida en un directorio temporal, con su pool"""
+    ruta = os.path.join(directorio, 'belgrano_ahorro.db')
+    shutil.copyfile(RUTA_BASE, ruta)
+    pool = conexiones.PoolConexiones(ruta)
+    with pool.conexion() as conn:
+        esquema.migrar(conn)
+    return pool
+
+def test_reenvio_repite_el_resultado():
+    """reclamar → en curso → completar → el reenvío recibe el mismo pedido"""
+    with tempfile.TemporaryDirectory() as directorio:
+        pool = copiar_base(directorio)
+        try:
+            claves = ClavesIdempotencia(pool)
+            clave = nueva_clave()
+            assert claves.reclamar('checkout', clave, usuario_id=1) is None
+
+            repetido = claves.reclamar('checkout', clave, usuario_id=1)
+            assert (repetido['estado'], repetido['resultado'], repetido['usuario_id']) == ('en_curso', None, 1)
+
+            claves.completar('checkout', clave, {'numero_pedido': 'PED-PRUEBA-1'})
+            repetido = claves.reclamar('checkout', clave, usuario_id=1)
+            assert repetido['estado'] == 'completada'
+            assert repetido['resultado'] == {'numero_pedido': 'PED-PRUEBA-1'}
+
+            # Una clave completada no se libera
+            claves.liberar('checkout', clave)
+            assert claves.consultar('checkout', clave)['estado'] == 'completada'
+
+            # La misma clave en otro ámbito es otra operación
+            assert claves.reclamar('repetir_pedido', clave, usuario_id=1) is None
+        finally:
+            pool.cerrar_todas()
+
+def test_clave_liberada_puede_reclamarse():
+    """Si la operación falla, liberar deja reenviar el formulario"""
+    with tempfile.TemporaryDirectory() as directorio:
+        pool = copiar_base(directorio)
+        try:
+            claves = ClavesIdempotencia(pool)
+            clave = nueva_clave()
+            assert claves.reclamar('checkout', clave) is None
+            claves.liberar('checkout', clave)
+            assert claves.consultar('checkout', clave) is None
+            assert claves.esperar('checkout', clave, espera_maxima=0) is None
+            assert claves.reclamar('checkout', clave) is None
+        finally:
+            pool.cerrar_todas()
+
+if __name__ == "__main__":
+    test_reenvio_repite_el_resultado()
+    test_clave_liberada_puede_reclamarse()
+    print("✅ Idempotencia OK")
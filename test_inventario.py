@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de las reservas de stock (inventario.py) sobre una copia de la base
+Una reserva aparta todas las líneas del pedido o ninguna.
+"""
+
+import os
+import shutil
+import tempfile
+
+import conexiones
+import esquema
+from inventario import Inventario
+
+RUTA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'belgrano_ahorro.db')
+
+# Productos fuera del catálogo distribuido: arrancan sin inventario
+ARROZ = {'id': 99101, 'nombre': 'Arroz de prueba', 'stock': 5, 'sucursales': ['centro', 'norte']}
+ACEITE = {'id': 99102, 'nombre': 'Aceite de prueba', 'stock': 2, 'sucursales': ['centro']}
+
+def copiar_base(directorio):
+    """Copia migrada de la base distribuida en un directorio temporal, con su pool"""
+    ruta = os.path.join(directorio, 'belgrano_ahorro.db')
+    shutil.copyfile(RUTA_BASE, ruta)
+    pool = conexiones.PoolConexiones(ruta)
+    with pool.conexion() as conn:
+        esquema.migrar(conn)
+    return pool
+
+def contar(pool, tabla, referencia):
+    with pool.conexion() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM {tabla} WHERE referencia = ?", (referencia,)).fetchone()[0]
+
+def test_reserva_sin_stock_en_una_linea_no_aparta_nada():
+    """Si una línea no alcanza, las demás también se deshacen"""
+    with tempfile.TemporaryDirectory() as directorio:
+        pool = copiar_base(directorio)
+        try:
+            inventario = Inventario(pool)
+            resultado = inventario.reservar('PED-PRUEBA-1', [(ARROZ, 3), (ACEITE, 5)])
+            assert not resultado['exito']
+            assert resultado['faltantes'] == [{'producto_id': 99102, 'nombre': 'Aceite de prueba',
+                                               'pedido': 5, 'disponible': 2}]
+            assert contar(pool, 'reservas_stock', 'PED-PRUEBA-1') == 0
+            assert contar(pool, 'movimientos_stock', 'PED-PRUEBA-1') == 0
+            with pool.conexion() as conn:
+                assert conn.execute("SELECT COUNT(*) FROM stock_sucursal WHERE producto_id IN (99101, 99102)").fetchone()[0] == 0
+            assert inventario.disponibles([ARROZ, ACEITE]) == {99101: 5, 99102: 2}
+
+            resultado = inventario.reservar('PED-PRUEBA-2', [(ARROZ, 3), (ACEITE, 2)])
+            assert resultado['exito']
+            assert inventario.disponibles([ARROZ, ACEITE]) == {99101: 2, 99102: 0}
+        finally:
+            pool.cerrar_todas()
+
+def test_liberar_devuelve_el_stock():
+    """Liberar las reservas de un pedido fallido devuelve sus unidades"""
+    with tempfile.TemporaryDirectory() as directorio:
+        pool = copiar_base(directorio)
+        try:
+            inventario = Inventario(pool)
+            assert inventario.reservar('PED-PRUEBA-3', [(ARROZ, 4)])['exito']
+            assert inventario.disponible(ARROZ) == 1
+            assert inventario.liberar('PED-PRUEBA-3', 'pedido_fallido') == 4
+            assert inventario.disponible(ARROZ) == 5
+        finally:
+            pool.cerrar_todas()
+
+if __name__ == "__main__":
+    test_reserva_sin_stock_en_una_linea_no_aparta_nada()
+    test_liberar_devuelve_el_stock()
+    print("✅ Inventario OK")
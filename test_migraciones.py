@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test de las migraciones del esquema sobre una base con pedidos anteriores
+Migra una copia de belgrano_ahorro.db (versión 0, con items sin nombre de
+producto) y verifica que los items existentes quedan con su nombre.
+"""
+
+import os
+import shutil
+import sqlite3
+import tempfile
+
+import esquema
+
+RUTA_BASE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'belgrano_ahorro.db')
+
+def copiar_base(directorio):
+    """Copia de la base distribuida en un directorio temporal"""
+    ruta = os.path.join(directorio, 'belgrano_ahorro.db')
+    shutil.copyfile(RUTA_BASE, ruta)
+    return ruta
+
+def test_items_anteriores_con_nombre():
+    """Todos los items de los pedidos anteriores quedan con nombre_producto"""
+    with tempfile.TemporaryDirectory() as directorio:
+        conn = sqlite3.connect(copiar_base(directorio))
+        try:
+            items = conn.execute('SELECT COUNT(*) FROM pedido_items').fetchone()[0]
+            assert items > 0
+            esquema.migrar(conn)
+            assert esquema.version_actual(conn) == esquema.listar_migraciones()[-1][0]
+            sin_nombre = conn.execute('SELECT COUNT(*) FROM pedido_items WHERE nombre_producto IS NULL').fetchone()[0]
+            print(f"Items migrados: {items}, sin nombre: {sin_nombre}")
+            assert sin_nombre == 0
+        finally:
+            conn.close()
+
+def test_items_de_productos_fuera_del_catalogo():
+    """Un producto que ya no está en productos.json toma el nombre de productos_legacy"""
+    with tempfile.TemporaryDirectory() as directorio:
+        conn = sqlite3.connect(copiar_base(directorio))
+        try:
+            conn.execute("INSERT INTO productos (id, nombre, store, precio) VALUES (99001, 'Producto discontinuado', 'ahorro', 10)")
+            conn.execute("INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal) "
+                         "VALUES (1, 99001, 1, 10, 10)")
+            conn.execute("INSERT INTO pedido_items (pedido_id, producto_id, cantidad, precio_unitario, subtotal) "
+                         "VALUES (1, 99002, 1, 10, 10)")
+            conn.commit()
+            esquema.migrar(conn)
+            nombres = dict(conn.execute('SELECT producto_id, nombre_producto FROM pedido_items WHERE producto_id > 99000'))
+            assert nombres == {99001: 'Producto discontinuado', 99002: None}
+        finally:
+            conn.close()
+
+if __name__ == "__main__":
+    test_items_anteriores_con_nombre()
+    test_items_de_productos_fuera_del_catalogo()
+    print("✅ Migraciones OK")
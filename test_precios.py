@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Test del motor de precios del carrito (precios.py)
+Cotiza un catálogo chico armado en memoria con precio_original, ofertas
+vigentes y productos que ya no están.
+"""
+
+from catalogo import IndiceCatalogo
+from precios import cotizar_items
+
+DATOS = {'productos': [
+    {'id': 1, 'nombre': 'Arroz 1kg', 'precio': 100, 'precio_original': 120, 'stock': 10,
+     'negocio': 'belgrano_ahorro', 'categoria': 'almacen', 'activo': True},
+    {'id': 2, 'nombre': 'Aceite 900ml', 'precio': 50.5, 'stock': 10,
+     'negocio': 'belgrano_ahorro', 'categoria': 'almacen', 'activo': True},
+    {'id': 3, 'nombre': 'Yerba 1kg', 'precio': 80, 'stock': 10,
+     'negocio': 'belgrano_ahorro', 'categoria': 'almacen', 'activo': True},
+]}
+
+OFERTAS = {
+    '2': {'titulo': 'Aceite en oferta', 'descuento': 20, 'precio_oferta': 40.25},
+    # Una oferta más cara que el precio de lista no se aplica
+    '3': {'titulo': 'Yerba', 'descuento': 0, 'precio_oferta': 90},
+}
+
+def test_totales_con_precio_original_y_ofertas():
+    """Subtotal a precio anterior, descuento de ofertas, ahorro y total"""
+    cotizacion = cotizar_items({'1': 2, '2': 3, 3: 1, '99': 1}, IndiceCatalogo(DATOS, 1, ''), OFERTAS)
+
+    lineas = {linea['producto']['id']: linea for linea in cotizacion['lineas']}
+    assert [linea['producto']['id'] for linea in cotizacion['lineas']] == [1, 2, 3]
+    assert (lineas[1]['precio_unitario'], lineas[1]['precio_anterior'], lineas[1]['subtotal']) == (100, 120, 200)
+    assert lineas[1]['oferta'] is None
+    assert (lineas[2]['precio_unitario'], lineas[2]['ahorro_unitario'], lineas[2]['subtotal']) == (40.25, 10.25, 120.75)
+    assert lineas[2]['oferta']['titulo'] == 'Aceite en oferta'
+    assert (lineas[3]['precio_unitario'], lineas[3]['oferta']) == (80, None)
+
+    assert cotizacion['subtotal'] == 120 * 2 + 50.5 * 3 + 80
+    assert cotizacion['descuento_ofertas'] == 30.75
+    assert cotizacion['total'] == 400.75
+    assert cotizacion['ahorro'] == 70.75
+    assert cotizacion['unidades'] == 6
+    assert cotizacion['no_disponibles'] == ['99']
+
+def test_carrito_vacio():
+    """Un carrito vacío cotiza en cero"""
+    cotizacion = cotizar_items({}, IndiceCatalogo(DATOS, 1, ''), OFERTAS)
+    assert (cotizacion['lineas'], cotizacion['total'], cotizacion['ahorro'], cotizacion['unidades']) == ([], 0, 0, 0)
+
+if __name__ == "__main__":
+    test_totales_con_precio_original_y_ofertas()
+    test_carrito_vacio()
+    print("✅ Precios OK")
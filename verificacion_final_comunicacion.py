@@ -63,7 +63,7 @@ def actualizar_base_datos():
         if response.status_code == 200:
             data = response.json()
             print("✅ Base de datos actualizada exitosamente")
-            print(f"📊 Columnas agregadas: {data.get('columnas_agregadas', [])}")
+            print(f"📊 Migraciones aplicadas: {data.get('migraciones_aplicadas', [])}")
             return True
         else:
             print(f"❌ Error actualizando BD: {response.status_code}")